@@ -8,7 +8,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import Base
-from models import User, Book, Tag, Location
+from models import User, Book, Tag, Location, BookTombstone, Edition, BookBand, BookSimilarity, UserTagCount
 
 # this is the Alembic Config object
 config = context.config
@@ -0,0 +1,21 @@
+"""Add cover cache key to books
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('books', sa.Column('cover_cache_key', sa.String(32)))
+
+def downgrade():
+    op.drop_column('books', 'cover_cache_key')
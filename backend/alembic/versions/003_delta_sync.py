@@ -0,0 +1,55 @@
+"""Add change sequence and tombstones for delta sync
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('users', sa.Column('change_seq', sa.BigInteger(), nullable=False, server_default='0'))
+    op.add_column('books', sa.Column('change_seq', sa.BigInteger(), nullable=False, server_default='0'))
+    
+    # Number existing books 1..n per owner, so since=0 returns all of them
+    op.execute("""
+        UPDATE books SET change_seq = numbered.seq
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id) AS seq
+            FROM books
+        ) AS numbered
+        WHERE books.id = numbered.id
+    """)
+    op.execute("""
+        UPDATE users SET change_seq = COALESCE(
+            (SELECT MAX(change_seq) FROM books WHERE books.user_id = users.id), 0
+        )
+    """)
+    
+    op.create_index('ix_books_user_change_seq', 'books', ['user_id', 'change_seq'])
+    
+    op.create_table(
+        'book_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('change_seq', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_book_tombstones_user_change_seq', 'book_tombstones', ['user_id', 'change_seq'])
+
+def downgrade():
+    op.drop_index('ix_book_tombstones_user_change_seq', 'book_tombstones')
+    op.drop_table('book_tombstones')
+    op.drop_index('ix_books_user_change_seq', 'books')
+    op.drop_column('books', 'change_seq')
+    op.drop_column('users', 'change_seq')
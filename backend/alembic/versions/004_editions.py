@@ -0,0 +1,100 @@
+"""Add shared editions catalog and backfill it from books
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+METADATA_COLUMNS = ('title', 'authors', 'cover_url', 'publisher', 'published_year', 'page_count', 'description')
+
+NORMALIZED_ISBN = "UPPER(REPLACE(REPLACE(books.isbn, '-', ''), ' ', ''))"
+
+def upgrade():
+    op.create_table(
+        'editions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('isbn', sa.String(length=13), nullable=False),
+        sa.Column('title', sa.String(length=500), nullable=True),
+        sa.Column('authors', sa.String(length=500), nullable=True),
+        sa.Column('cover_url', sa.String(length=1000), nullable=True),
+        sa.Column('publisher', sa.String(length=255), nullable=True),
+        sa.Column('published_year', sa.Integer(), nullable=True),
+        sa.Column('page_count', sa.Integer(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_editions_id', 'editions', ['id'])
+    op.create_index('ix_editions_isbn', 'editions', ['isbn'], unique=True)
+    
+    op.add_column('books', sa.Column('edition_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('books_edition_id_fkey', 'books', 'editions', ['edition_id'], ['id'], ondelete='SET NULL')
+    op.create_index('ix_books_edition_id', 'books', ['edition_id'])
+    # Metadata columns now hold per-user overrides, NULL = use the edition
+    op.alter_column('books', 'title', existing_type=sa.String(length=500), nullable=True)
+    # Fields the owner emptied, shown empty despite the edition (bit i = METADATA_COLUMNS[i])
+    op.add_column('books', sa.Column('cleared_fields', sa.SmallInteger(), nullable=False, server_default='0'))
+    
+    # One edition per ISBN, taking the metadata of the oldest copy
+    op.execute(f"""
+        INSERT INTO editions (isbn, {', '.join(METADATA_COLUMNS)})
+        SELECT DISTINCT ON ({NORMALIZED_ISBN}) {NORMALIZED_ISBN}, {', '.join(f'books.{c}' for c in METADATA_COLUMNS)}
+        FROM books
+        WHERE books.isbn IS NOT NULL AND {NORMALIZED_ISBN} <> ''
+        ORDER BY {NORMALIZED_ISBN}, books.id
+    """)
+    op.execute(f"""
+        UPDATE books SET edition_id = editions.id
+        FROM editions
+        WHERE editions.isbn = {NORMALIZED_ISBN}
+    """)
+    
+    # Copies without a value must not show the oldest copy's (another user's) one
+    op.execute(f"""
+        UPDATE books SET cleared_fields = {' + '.join(
+            f'CASE WHEN books.{c} IS NULL AND editions.{c} IS NOT NULL THEN {1 << i} ELSE 0 END'
+            for i, c in enumerate(METADATA_COLUMNS) if c != 'title'
+        )}
+        FROM editions
+        WHERE books.edition_id = editions.id
+    """)
+    
+    # Keep only values that differ from the edition
+    op.execute(f"""
+        UPDATE books SET {', '.join(
+            f'{c} = CASE WHEN books.{c} IS NOT DISTINCT FROM editions.{c} THEN NULL ELSE books.{c} END'
+            for c in METADATA_COLUMNS
+        )}
+        FROM editions
+        WHERE books.edition_id = editions.id
+    """)
+
+def downgrade():
+    # Copy inherited metadata back into the books, except cleared fields
+    op.execute(f"""
+        UPDATE books SET {', '.join(
+            f'{c} = CASE WHEN books.cleared_fields & {1 << i} <> 0 THEN books.{c} ELSE COALESCE(books.{c}, editions.{c}) END'
+            for i, c in enumerate(METADATA_COLUMNS)
+        )}
+        FROM editions
+        WHERE books.edition_id = editions.id
+    """)
+    op.drop_column('books', 'cleared_fields')
+    op.execute("UPDATE books SET title = 'Unknown' WHERE title IS NULL")
+    op.alter_column('books', 'title', existing_type=sa.String(length=500), nullable=False)
+    op.drop_index('ix_books_edition_id', 'books')
+    op.drop_constraint('books_edition_id_fkey', 'books', type_='foreignkey')
+    op.drop_column('books', 'edition_id')
+    op.drop_index('ix_editions_isbn', 'editions')
+    op.drop_index('ix_editions_id', 'editions')
+    op.drop_table('editions')
@@ -0,0 +1,61 @@
+"""Add LSH band index for near-duplicate detection
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 2000
+
+def upgrade():
+    from duplicates import band_keys, shingles
+    
+    op.create_table(
+        'book_lsh_bands',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('band', sa.SmallInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id', 'band')
+    )
+    
+    # Signatures are computed in Python, over the edition-resolved metadata
+    bind = op.get_bind()
+    bands = sa.table(
+        'book_lsh_bands',
+        sa.column('book_id'), sa.column('band'), sa.column('user_id'), sa.column('bucket')
+    )
+    result = bind.execute(sa.text("""
+        SELECT books.id, books.user_id,
+               COALESCE(books.title, editions.title) AS title,
+               COALESCE(books.authors, editions.authors) AS authors
+        FROM books LEFT JOIN editions ON editions.id = books.edition_id
+        ORDER BY books.id
+    """))
+    while True:
+        batch = result.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        bind.execute(bands.insert(), [
+            {"book_id": row.id, "band": band, "user_id": row.user_id, "bucket": bucket}
+            for row in batch
+            for band, bucket in band_keys(shingles(row.title, row.authors))
+        ])
+    
+    # Created after the backfill, which is faster than maintaining it row by row
+    op.create_index('ix_book_lsh_bands_lookup', 'book_lsh_bands', ['user_id', 'bucket'])
+
+def downgrade():
+    op.drop_index('ix_book_lsh_bands_lookup', 'book_lsh_bands')
+    op.drop_table('book_lsh_bands')
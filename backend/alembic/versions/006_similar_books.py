@@ -0,0 +1,38 @@
+"""Add precomputed similar-books index
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # similarity_seq = 0 marks every existing library as stale, so running
+    # `python similarity.py` after the upgrade builds all of them
+    op.add_column('users', sa.Column('similarity_seq', sa.BigInteger(), nullable=False, server_default='0'))
+    
+    op.create_table(
+        'book_similarities',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('similar_book_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['similar_book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id', 'similar_book_id')
+    )
+    op.create_index('ix_book_similarities_book_score', 'book_similarities', ['book_id', 'score'])
+    op.create_index('ix_book_similarities_similar_book_id', 'book_similarities', ['similar_book_id'])
+
+def downgrade():
+    op.drop_index('ix_book_similarities_similar_book_id', 'book_similarities')
+    op.drop_index('ix_book_similarities_book_score', 'book_similarities')
+    op.drop_table('book_similarities')
+    op.drop_column('users', 'similarity_seq')
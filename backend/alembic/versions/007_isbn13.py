@@ -0,0 +1,97 @@
+"""Add canonical ISBN-13 column with a unique index per user
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 2000
+
+METADATA_COLUMNS = ('title', 'authors', 'cover_url', 'publisher', 'published_year', 'page_count', 'description')
+
+# Books of a merged edition keep what they showed: its values become overrides
+# where the surviving edition differs, fields it lacked are cleared (bit i =
+# METADATA_COLUMNS[i], see migration 004; the title cannot be cleared)
+KEEP_MERGED_VALUES = f"""
+    UPDATE books SET {', '.join(
+        f'{c} = CASE WHEN books.{c} IS NULL AND books.cleared_fields & {1 << i} = 0 '
+        f'AND merged.{c} IS DISTINCT FROM surviving.{c} THEN merged.{c} ELSE books.{c} END'
+        for i, c in enumerate(METADATA_COLUMNS)
+    )}, cleared_fields = books.cleared_fields | ({' + '.join(
+        f'CASE WHEN books.{c} IS NULL AND merged.{c} IS NULL AND surviving.{c} IS NOT NULL THEN {1 << i} ELSE 0 END'
+        for i, c in enumerate(METADATA_COLUMNS) if c != 'title'
+    )})
+    FROM editions merged, editions surviving
+    WHERE books.edition_id = merged.id AND merged.id = :id AND surviving.id = :existing
+"""
+
+def upgrade():
+    from isbn import to_isbn13
+
+    # Hyphenated ISBN-13s do not fit 13 characters
+    op.alter_column('books', 'isbn', type_=sa.String(length=20), existing_type=sa.String(length=13))
+    op.add_column('books', sa.Column('isbn13', sa.String(length=13), nullable=True))
+
+    # Canonical forms are computed in Python, like new rows get them
+    bind = op.get_bind()
+    books = sa.table('books', sa.column('id'), sa.column('isbn13'))
+    set_isbn13 = books.update().where(books.c.id == sa.bindparam('b_id')).values(isbn13=sa.bindparam('b_isbn13'))
+    result = bind.execute(sa.text("SELECT id, isbn FROM books WHERE isbn IS NOT NULL ORDER BY id"))
+    while True:
+        batch = result.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        rows = [{"b_id": row.id, "b_isbn13": to_isbn13(row.isbn)} for row in batch]
+        rows = [row for row in rows if row["b_isbn13"]]
+        if rows:
+            bind.execute(set_isbn13, rows)
+
+    # Existing duplicates keep their ISBN but only the oldest copy is indexed
+    op.execute("""
+        UPDATE books SET isbn13 = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, isbn13 ORDER BY id) AS copy
+                FROM books WHERE isbn13 IS NOT NULL
+            ) numbered
+            WHERE copy > 1
+        )
+    """)
+
+    # Catalog entries stored under an ISBN-10 move to their ISBN-13
+    editions = bind.execute(sa.text("SELECT id, isbn FROM editions WHERE length(isbn) = 10")).all()
+    for edition in editions:
+        canonical = to_isbn13(edition.isbn)
+        if canonical is None:
+            continue
+        existing = bind.execute(
+            sa.text("SELECT id FROM editions WHERE isbn = :isbn"), {"isbn": canonical}
+        ).scalar()
+        if existing is None:
+            bind.execute(
+                sa.text("UPDATE editions SET isbn = :isbn WHERE id = :id"),
+                {"isbn": canonical, "id": edition.id}
+            )
+        else:
+            bind.execute(sa.text(KEEP_MERGED_VALUES), {"existing": existing, "id": edition.id})
+            bind.execute(
+                sa.text("UPDATE books SET edition_id = :existing WHERE edition_id = :id"),
+                {"existing": existing, "id": edition.id}
+            )
+            bind.execute(sa.text("DELETE FROM editions WHERE id = :id"), {"id": edition.id})
+
+    op.create_index('ux_books_user_isbn13', 'books', ['user_id', 'isbn13'], unique=True)
+
+def downgrade():
+    op.drop_index('ux_books_user_isbn13', 'books')
+    op.drop_column('books', 'isbn13')
+    op.alter_column('books', 'isbn', type_=sa.String(length=13), existing_type=sa.String(length=20))
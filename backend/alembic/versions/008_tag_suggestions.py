@@ -0,0 +1,43 @@
+"""Add tag prefix index and per-user tag usage counts
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'user_tag_counts',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.Column('book_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'tag_id')
+    )
+    op.create_index('ix_user_tag_counts_tag_id', 'user_tag_counts', ['tag_id'])
+    op.execute("""
+        INSERT INTO user_tag_counts (user_id, tag_id, book_count)
+        SELECT books.user_id, book_tags.tag_id, COUNT(*)
+        FROM book_tags JOIN books ON books.id = book_tags.book_id
+        GROUP BY books.user_id, book_tags.tag_id
+    """)
+    
+    # LIKE 'prefix%' can only use an index with pattern operators outside the C locale
+    op.create_index(
+        'ix_tags_name_prefix', 'tags', [sa.text('lower(name) text_pattern_ops')]
+    )
+
+def downgrade():
+    op.drop_index('ix_tags_name_prefix', 'tags')
+    op.drop_index('ix_user_tag_counts_tag_id', 'user_tag_counts')
+    op.drop_table('user_tag_counts')
@@ -0,0 +1,35 @@
+"""Add books.metadata_fetched_at for the background metadata refresh
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('books', sa.Column('metadata_fetched_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Books with complete edition metadata need no refresh; the rest stay NULL
+    # and are looked up first
+    op.execute("""
+        UPDATE books SET metadata_fetched_at = CURRENT_TIMESTAMP
+        WHERE edition_id IN (
+            SELECT id FROM editions WHERE title IS NOT NULL AND cover_url IS NOT NULL
+        )
+    """)
+
+    op.create_index(
+        'ix_books_metadata_fetched_at', 'books', [sa.text('metadata_fetched_at ASC NULLS FIRST')]
+    )
+
+def downgrade():
+    op.drop_index('ix_books_metadata_fetched_at', 'books')
+    op.drop_column('books', 'metadata_fetched_at')
@@ -0,0 +1,41 @@
+"""Add user_id to book_tags and book_similarities; optionally hash-partition the books tables
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # The owner's id is the partition key, and spares queries the join to books
+    for table in ('book_tags', 'book_similarities'):
+        op.add_column(table, sa.Column('user_id', sa.Integer(), nullable=True))
+        op.execute(f"UPDATE {table} SET user_id = (SELECT user_id FROM books WHERE books.id = {table}.book_id)")
+        op.alter_column(table, 'user_id', existing_type=sa.Integer(), nullable=False)
+
+    # Opt-in: rebuilds the tables and moves every row (see partitioning.py)
+    partitions = int(os.getenv("BOOKS_HASH_PARTITIONS", "0"))
+    bind = op.get_bind()
+    if partitions > 0 and bind.dialect.name == "postgresql":
+        from partitioning import rebuild
+        rebuild(bind, partitions)
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        from partitioning import partition_count, rebuild
+        if partition_count(bind):
+            rebuild(bind, 0)
+
+    op.drop_column('book_similarities', 'user_id')
+    op.drop_column('book_tags', 'user_id')
@@ -0,0 +1,37 @@
+"""Replace the metadata refresh index with partial indexes of incomplete books and editions
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+EDITION_INCOMPLETE = "title IS NULL OR cover_url IS NULL"
+BOOK_INCOMPLETE = "edition_id IS NULL AND (title IS NULL OR cover_url IS NULL)"
+
+def upgrade():
+    # Complete books (most of them) filled the front of the old index with NULLs
+    op.drop_index('ix_books_metadata_fetched_at', 'books')
+    op.create_index(
+        'ix_books_metadata_incomplete', 'books', [sa.text('metadata_fetched_at ASC NULLS FIRST')],
+        postgresql_where=sa.text(BOOK_INCOMPLETE)
+    )
+    op.create_index(
+        'ix_editions_incomplete', 'editions', ['id'],
+        postgresql_where=sa.text(EDITION_INCOMPLETE)
+    )
+
+def downgrade():
+    op.drop_index('ix_editions_incomplete', 'editions')
+    op.drop_index('ix_books_metadata_incomplete', 'books')
+    op.create_index(
+        'ix_books_metadata_fetched_at', 'books', [sa.text('metadata_fetched_at ASC NULLS FIRST')]
+    )
@@ -0,0 +1,31 @@
+"""Add trigram indexes for the title search
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # ILIKE '%...%' on the override and the edition title (editions.edition_backed_ilike)
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_books_title_trgm', 'books', ['title'],
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_editions_title_trgm', 'editions', ['title'],
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}
+    )
+
+def downgrade():
+    op.drop_index('ix_editions_title_trgm', 'editions')
+    op.drop_index('ix_books_title_trgm', 'books')
@@ -0,0 +1,397 @@
+"""
+Bulk export and import of a library as JSON Lines or Parquet.
+
+One typed record per book (see BookRecord in schemas.py): authors and tags
+are lists, the location is referenced by name, metadata is the book's own
+or its edition's, and created_at is a timestamp, so a library survives the
+round trip, unlike with CSV. A field the owner cleared (see editions.py) is
+exported empty and filled from the edition again on import.
+
+Exports read the library through a server-side cursor BATCH_SIZE books at a
+time (the tags of a batch in one query) and stream each batch as soon as it
+is encoded: JSON Lines, or one Parquet row group per batch. Imports read the
+upload batch by batch as well and insert each batch with multi-row INSERTs
+in the request's transaction instead of an ORM flush. What the flush
+listeners would do is done here per batch (change_seq from sync.py, LSH
+bands from duplicates.py) or once at the end (tag counts, similar books and
+public snapshot refreshes), so memory does not grow with the library.
+
+Rows that fail validation, have an invalid ISBN or an ISBN already in the
+library are skipped and reported like in the CSV import. There are no Open
+Library lookups: books without a title or cover are left to
+metadata_refresh.py.
+"""
+from datetime import datetime, timezone
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import case, func, insert, null, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from covers import cover_cache, cover_key
+from duplicates import band_keys, shingles
+from editions import redundant_override
+from isbn import to_isbn13
+from models import CLEARED_BITS, EDITION_FIELDS, Book, BookBand, Edition, Location, Tag, book_tags
+from public_snapshots import snapshot_publisher
+from schemas import BookRecord, CSVImportProgress
+from similarity import similarity_refresher
+from sync import allocate_seq
+from tag_counts import recount
+import tracing
+
+BATCH_SIZE = 1000
+# Import errors reported in full; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+_UNKNOWN_TITLE = "Unknown"
+
+
+class InvalidFile(ValueError):
+    """The upload is not a readable file of the expected format"""
+
+
+# pyarrow is imported on first use; it takes a while to load
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("isbn", pa.string()),
+        ("title", pa.string()),
+        ("authors", pa.list_(pa.string())),
+        ("cover_url", pa.string()),
+        ("publisher", pa.string()),
+        ("published_year", pa.int32()),
+        ("page_count", pa.int32()),
+        ("description", pa.string()),
+        ("location", pa.string()),
+        ("condition", pa.string()),
+        ("notes", pa.string()),
+        ("tags", pa.list_(pa.string())),
+        ("is_pinned", pa.bool_()),
+        ("show_in_public", pa.bool_()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def _author_list(authors: Optional[str]) -> List[str]:
+    if not authors:
+        return []
+    try:
+        names = json.loads(authors)
+    except ValueError:
+        return [authors]
+    return [str(name) for name in names] if isinstance(names, list) else [str(names)]
+
+
+# --- Export ---
+
+def export_batches(db: Session, user_id: int) -> Iterator[List[Dict]]:
+    """The user's books as records, BATCH_SIZE at a time, read with a server-side cursor"""
+    books, editions, locations = Book.__table__, Edition.__table__, Location.__table__
+    query = select(
+        books.c.id,
+        books.c.isbn,
+        *(case(
+            (books.c.cleared_fields.op("&")(CLEARED_BITS[name]) != 0, null()),
+            else_=func.coalesce(books.c[name], editions.c[name])
+        ).label(name) for name in EDITION_FIELDS),
+        locations.c.name.label("location"),
+        books.c.condition,
+        books.c.notes,
+        books.c.is_pinned,
+        books.c.show_in_public,
+        books.c.created_at,
+    ).select_from(
+        books.outerjoin(editions, editions.c.id == books.c.edition_id)
+        .outerjoin(locations, locations.c.id == books.c.location_id)
+    ).where(books.c.user_id == user_id).order_by(books.c.id)
+
+    result = db.execute(query, execution_options={"yield_per": BATCH_SIZE})
+    for rows in result.partitions():
+        tags: Dict[int, List[str]] = {}
+        for book_id, name in db.execute(
+            select(book_tags.c.book_id, Tag.name)
+            .join(Tag, Tag.id == book_tags.c.tag_id)
+            .where(book_tags.c.user_id == user_id, book_tags.c.book_id.in_([row.id for row in rows]))
+            .order_by(book_tags.c.book_id, Tag.name)
+        ):
+            tags.setdefault(book_id, []).append(name)
+
+        yield [
+            {
+                "isbn": row.isbn,
+                **{name: getattr(row, name) for name in EDITION_FIELDS},
+                "authors": _author_list(row.authors),
+                "location": row.location,
+                "condition": row.condition,
+                "notes": row.notes,
+                "tags": tags.get(row.id, []),
+                "is_pinned": bool(row.is_pinned),
+                "show_in_public": bool(row.show_in_public),
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ]
+
+
+def jsonl_chunks(batches: Iterator[List[Dict]]) -> Iterator[bytes]:
+    for records in batches:
+        yield b"".join(orjson.dumps(record) + b"\n" for record in records)
+
+
+class _ChunkSink:
+    """Write-only file for pyarrow that hands out what was written since the last take()"""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(batches: Iterator[List[Dict]]) -> Iterator[bytes]:
+    """A Parquet file with one row group per batch, streamed as the row groups are written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd") as writer:
+        for records in batches:
+            writer.write_table(pa.Table.from_pylist(records, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+def stream_export(db: Session, user_id: int, encode: Callable[[Iterator[List[Dict]]], Iterator[bytes]]) -> Iterator[bytes]:
+    """Response body of an export; owns the session, which outlives the request handler"""
+    try:
+        yield from encode(export_batches(db, user_id))
+    finally:
+        db.close()
+
+
+# --- Import ---
+
+def jsonl_batches(file: IO[bytes]) -> Iterator[List[Tuple[int, Any]]]:
+    """(line number, parsed JSON or the error) per non-empty line, BATCH_SIZE at a time"""
+    batch = []
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            batch.append((number, orjson.loads(line)))
+        except orjson.JSONDecodeError as e:
+            batch.append((number, e))
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parquet_batches(file: IO[bytes]) -> Iterator[List[Tuple[int, Any]]]:
+    """(row number, record) per row, read BATCH_SIZE rows at a time"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    number = 0
+    try:
+        for record_batch in pq.ParquetFile(file).iter_batches(batch_size=BATCH_SIZE):
+            rows = record_batch.to_pylist()
+            yield list(enumerate(rows, start=number + 1))
+            number += len(rows)
+    except pa.ArrowException as e:
+        raise InvalidFile(str(e)) from e
+
+
+class BulkImporter:
+    """Inserts batches of records into one user's library within the session's transaction"""
+
+    def __init__(self, db: Session, user_id: int, progress: CSVImportProgress):
+        self.db = db
+        self.user_id = user_id
+        self.progress = progress
+        self.connection = db.connection()
+        dialect = postgresql if self.connection.dialect.name == "postgresql" else sqlite
+        self._insert_tags = dialect.insert(Tag.__table__).on_conflict_do_nothing(index_elements=["name"])
+        self.locations = dict(self.connection.execute(
+            select(Location.name, Location.id).where(Location.user_id == user_id)
+        ).all())
+        # Books whose cover is not in the local cache yet
+        self.cover_book_ids: List[int] = []
+
+    def fail(self, number: int, message: str):
+        self.progress.failed += 1
+        if len(self.progress.errors) < MAX_REPORTED_ERRORS:
+            self.progress.errors.append(f"Row {number}: {message}")
+
+    def _validate(self, batch: List[Tuple[int, Any]]) -> List[Tuple[int, BookRecord, Optional[str]]]:
+        """Valid records with their ISBN-13, without ISBNs already in the library or earlier in the batch"""
+        valid = []
+        for number, raw in batch:
+            self.progress.processed += 1
+            if isinstance(raw, Exception):
+                self.fail(number, f"Invalid JSON: {raw}")
+                continue
+            try:
+                record = BookRecord.model_validate(raw)
+            except ValidationError as e:
+                error = e.errors()[0]
+                self.fail(number, f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}")
+                continue
+            isbn13 = to_isbn13(record.isbn) if record.isbn else None
+            if record.isbn and isbn13 is None:
+                self.fail(number, f"Invalid ISBN {record.isbn}")
+                continue
+            valid.append((number, record, isbn13))
+
+        isbns = {isbn13 for _, _, isbn13 in valid if isbn13}
+        # Earlier batches of this import are visible in the transaction
+        taken = set(self.connection.execute(
+            select(Book.isbn13).where(Book.user_id == self.user_id, Book.isbn13.in_(isbns))
+        ).scalars()) if isbns else set()
+        unique = []
+        for number, record, isbn13 in valid:
+            if isbn13 in taken:
+                self.fail(number, f"Book with ISBN {record.isbn} already exists")
+                continue
+            if isbn13:
+                taken.add(isbn13)
+            unique.append((number, record, isbn13))
+        return unique
+
+    def _location_ids(self, names: List[str]) -> Dict[str, int]:
+        missing = [name for name in dict.fromkeys(names) if name not in self.locations]
+        if missing:
+            ids = self.connection.execute(
+                insert(Location.__table__).returning(Location.id, sort_by_parameter_order=True),
+                [{"user_id": self.user_id, "name": name} for name in missing]
+            ).scalars().all()
+            self.locations.update(zip(missing, ids))
+        return self.locations
+
+    def _tag_ids(self, names: List[str]) -> Dict[str, int]:
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        self.connection.execute(self._insert_tags, [{"name": name} for name in names])
+        return dict(self.connection.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+
+    def add_batch(self, batch: List[Tuple[int, Any]]):
+        entries = self._validate(batch)
+        if not entries:
+            return
+        now = datetime.now(timezone.utc)
+
+        isbns = [isbn13 for _, _, isbn13 in entries if isbn13]
+        editions = {
+            edition.isbn: edition for edition in self.connection.execute(
+                select(Edition.__table__).where(Edition.isbn.in_(isbns))
+            )
+        } if isbns else {}
+        locations = self._location_ids([record.location for _, record, _ in entries if record.location])
+        tag_ids = self._tag_ids([name.strip() for _, record, _ in entries for name in record.tags if name.strip()])
+        seq = allocate_seq(self.db, self.user_id, len(entries))
+
+        rows = []
+        for index, (_, record, isbn13) in enumerate(entries):
+            edition = editions.get(isbn13)
+            values = record.model_dump(include=set(EDITION_FIELDS))
+            values["authors"] = json.dumps(record.authors) if record.authors else None
+            if not values["title"] and (edition is None or not edition.title):
+                values["title"] = _UNKNOWN_TITLE
+            cover_url = values["cover_url"] or (edition.cover_url if edition is not None else None)
+            # Restoring on the same server finds the thumbnails already cached
+            cached_key = cover_key(cover_url) if cover_url else None
+            if cached_key is not None and not cover_cache.is_cached(cached_key):
+                cached_key = None
+            rows.append({
+                "user_id": self.user_id,
+                "isbn": record.isbn or None,
+                "isbn13": isbn13,
+                "edition_id": edition.id if edition is not None else None,
+                # Metadata equal to the edition's is not stored per book
+                **{
+                    name: None if edition is not None and redundant_override(name, value, getattr(edition, name))
+                    else value
+                    for name, value in values.items()
+                },
+                "location_id": locations[record.location] if record.location else None,
+                "condition": record.condition,
+                "notes": record.notes,
+                "is_pinned": record.is_pinned,
+                "show_in_public": record.show_in_public,
+                "created_at": record.created_at or now,
+                "change_seq": seq + index,
+                "cover_cache_key": cached_key,
+            })
+
+        book_ids = self.connection.execute(
+            insert(Book.__table__).returning(Book.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        links, bands = [], []
+        for book_id, row, (_, record, isbn13) in zip(book_ids, rows, entries):
+            links.extend(
+                {"book_id": book_id, "tag_id": tag_id, "user_id": self.user_id}
+                for tag_id in {tag_ids[name.strip()] for name in record.tags if name.strip()}
+            )
+            edition = editions.get(isbn13)
+            title = row["title"] or edition.title
+            authors = row["authors"] or (edition.authors if edition is not None else None)
+            bands.extend(
+                {"book_id": book_id, "user_id": self.user_id, "band": band, "bucket": bucket}
+                for band, bucket in band_keys(shingles(title, authors))
+            )
+            if row["cover_cache_key"] is None and (row["cover_url"] or (edition is not None and edition.cover_url)):
+                self.cover_book_ids.append(book_id)
+        if links:
+            self.connection.execute(insert(book_tags), links)
+        if bands:
+            self.connection.execute(insert(BookBand.__table__), bands)
+        self.progress.successful += len(book_ids)
+
+    def finish(self):
+        """Commit; tag counts and the derived data the flush listeners would have scheduled"""
+        recount(self.connection, self.user_id)
+        self.db.commit()
+        similarity_refresher.schedule(self.user_id)
+        snapshot_publisher.schedule(self.user_id)
+
+
+def import_records(db: Session, user_id: int, batches: Iterator[List[Tuple[int, Any]]]) -> Tuple[CSVImportProgress, List[int]]:
+    """Import batches of (row number, record); returns the result and the ids of books with an uncached cover"""
+    progress = CSVImportProgress(total=0, processed=0, successful=0, failed=0)
+    with tracing.span("bulk_import", {"user_id": user_id}) as import_span:
+        importer = BulkImporter(db, user_id, progress)
+        for batch in batches:
+            with tracing.span("bulk_import.batch", {"rows": len(batch)}):
+                importer.add_batch(batch)
+        importer.finish()
+        progress.total = progress.processed
+        if progress.failed > len(progress.errors):
+            progress.errors.append(f"... and {progress.failed - len(progress.errors)} more")
+        import_span.set_attributes({"successful": progress.successful, "failed": progress.failed})
+    return progress, importer.cover_book_ids
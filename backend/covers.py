@@ -0,0 +1,242 @@
+"""
+Local cover-image cache.
+
+Remote covers are downloaded once to a temporary file and turned into
+small/medium WebP thumbnails in a process pool; only the thumbnails are kept,
+under UPLOAD_DIR/covers/<key>/. The key is derived from the cover URL, so
+books sharing a cover share the files and a changed cover_url gets a new key;
+the files can therefore be served as immutable.
+
+Cover URLs are user input, so only hosts in COVER_HOSTS (and their
+subdomains) are fetched, and only if they resolve to public addresses;
+redirects are followed by hand and every hop is checked the same way. Other
+covers keep their remote URL.
+
+The background task reads and writes the books in short sessions in threads,
+none of them open during the downloads.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+import tempfile
+
+from starlette.staticfiles import StaticFiles
+
+from database import SessionLocal
+from models import Book
+
+if TYPE_CHECKING:
+    import httpx  # imported when the first covers are fetched
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/uploads")
+COVER_DIR = os.path.join(UPLOAD_DIR, "covers")
+COVER_WORKERS = int(os.getenv("COVER_WORKERS", "2"))
+COVER_MAX_BYTES = 10 * 1024 * 1024
+COVER_FETCH_CONCURRENCY = 4
+COVER_MAX_REDIRECTS = 5
+# Hosts covers are downloaded from, including their subdomains (Open Library redirects to archive.org)
+COVER_HOSTS = tuple(
+    host.strip().lower() for host in os.getenv("COVER_HOSTS", "openlibrary.org,archive.org").split(",") if host.strip()
+)
+
+# name -> bounding box (width, height)
+THUMBNAIL_SIZES = {
+    "small": (96, 144),
+    "medium": (240, 360),
+}
+
+
+def cover_key(cover_url: str) -> str:
+    """Cache key for a cover URL; see Book.cover_thumb_url for the served path"""
+    return hashlib.sha256(cover_url.encode("utf-8")).hexdigest()[:32]
+
+
+async def _allowed_url(url: str) -> bool:
+    """http(s) URL on a COVER_HOSTS host whose addresses are all public"""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not any(
+        host == allowed or host.endswith("." + allowed) for allowed in COVER_HOSTS
+    ):
+        return False
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            host, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM
+        )
+    except (OSError, ValueError):
+        return False
+    # Rejects private, loopback, link-local (cloud metadata) and reserved addresses
+    return bool(addresses) and all(
+        ipaddress.ip_address(address[4][0].split("%")[0]).is_global for address in addresses
+    )
+
+
+def _make_thumbnails(source_path: str, target_dir: str) -> None:
+    """Render every THUMBNAIL_SIZES entry as WebP (runs in a worker process)"""
+    from PIL import Image
+
+    # Decoded and resized before anything is written, so undecodable files leave nothing behind
+    with Image.open(source_path) as image:
+        image = image.convert("RGB")
+        thumbs = {}
+        for name, box in THUMBNAIL_SIZES.items():
+            thumbs[name] = image.copy()
+            thumbs[name].thumbnail(box, Image.LANCZOS)
+    os.makedirs(target_dir, exist_ok=True)
+    for name, thumb in thumbs.items():
+        tmp_path = os.path.join(target_dir, f".{name}.webp.tmp")
+        thumb.save(tmp_path, "WEBP", quality=80, method=4)
+        os.replace(tmp_path, os.path.join(target_dir, f"{name}.webp"))
+
+
+def remove_originals() -> int:
+    """Delete downloaded originals left in the served cover directory by older versions"""
+    removed = 0
+    if not os.path.isdir(COVER_DIR):
+        return removed
+    for entry in os.scandir(COVER_DIR):
+        path = os.path.join(entry.path, "original")
+        if entry.is_dir() and os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+class CoverCache:
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=COVER_WORKERS)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def is_cached(self, key: str) -> bool:
+        target_dir = os.path.join(COVER_DIR, key)
+        return all(
+            os.path.exists(os.path.join(target_dir, f"{name}.webp"))
+            for name in THUMBNAIL_SIZES
+        )
+
+    async def fetch(self, cover_url: str, client: "httpx.AsyncClient") -> Optional[str]:
+        """
+        Download a cover and build its thumbnails. Returns the cache key,
+        or None if the image could not be fetched or decoded.
+        """
+        import httpx
+
+        key = cover_key(cover_url)
+        if self.is_cached(key):
+            return key
+
+        source_path = None
+        try:
+            url = cover_url
+            for _ in range(COVER_MAX_REDIRECTS + 1):
+                if not await _allowed_url(url):
+                    logger.warning(f"Cover URL not allowed: {url}")
+                    return None
+                response = await client.get(url)
+                if not response.is_redirect:
+                    break
+                url = str(response.url.join(response.headers["location"]))
+            else:
+                logger.warning(f"Too many redirects: {cover_url}")
+                return None
+            if response.status_code != 200:
+                logger.warning(f"Cover download failed ({response.status_code}): {cover_url}")
+                return None
+            content = response.content
+            # Open Library answers unknown cover IDs with a 1x1 placeholder GIF
+            if len(content) < 1024 or len(content) > COVER_MAX_BYTES:
+                return None
+            # Outside UPLOAD_DIR, which is served as it is
+            fd, source_path = tempfile.mkstemp(prefix="mylibrary-cover-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+
+            target_dir = os.path.join(COVER_DIR, key)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.pool, _make_thumbnails, source_path, target_dir)
+            return key
+        except httpx.HTTPError as e:
+            logger.warning(f"Error downloading cover {cover_url}: {e}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Error creating thumbnails for {cover_url}: {e}")
+        finally:
+            if source_path is not None:
+                os.remove(source_path)
+        return None
+
+    async def cache_books(self, book_ids: Iterable[int]):
+        """Background task: cache the covers of the given books"""
+        import httpx
+
+        try:
+            pending = await asyncio.to_thread(_pending_covers, list(book_ids))
+            if not pending:
+                return
+
+            # Books sharing a cover URL share one download
+            urls = sorted(set(pending.values()))
+            semaphore = asyncio.Semaphore(COVER_FETCH_CONCURRENCY)
+            async with httpx.AsyncClient(timeout=15.0, follow_redirects=False) as client:
+                async def fetch_one(url: str) -> Optional[str]:
+                    async with semaphore:
+                        return await self.fetch(url, client)
+
+                keys = await asyncio.gather(*(fetch_one(url) for url in urls))
+
+            await asyncio.to_thread(_store_keys, pending, dict(zip(urls, keys)))
+        except Exception as e:
+            logger.error(f"Error caching covers: {e}")
+
+
+def _pending_covers(book_ids: List[int]) -> Dict[int, str]:
+    """Remote cover URL of each book whose thumbnails are not cached for it"""
+    with SessionLocal() as db:
+        rows = db.query(Book.id, Book.cover_url.label("cover_url"), Book.cover_cache_key).filter(
+            Book.id.in_(book_ids),
+            Book.cover_url.isnot(None)
+        ).all()
+    return {
+        row.id: row.cover_url for row in rows
+        if row.cover_url.startswith(("http://", "https://"))
+        and row.cover_cache_key != cover_key(row.cover_url)
+    }
+
+
+def _store_keys(pending: Dict[int, str], keys_by_url: Dict[str, Optional[str]]):
+    """Set the cache keys, except on books whose cover changed during the downloads"""
+    with SessionLocal() as db:
+        for book in db.query(Book).filter(Book.id.in_(list(pending))).all():
+            if book.cover_url == pending[book.id]:
+                book.cover_cache_key = keys_by_url[book.cover_url]
+        db.commit()
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles for content-addressed files that never change once written"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# Singleton instance
+cover_cache = CoverCache()
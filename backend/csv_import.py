@@ -0,0 +1,266 @@
+"""
+CSV import (POST /api/books/import/csv) and its live progress feed.
+
+import_csv() imports the rows and updates a CSVImportProgress as it goes.
+Clients asking for `text/event-stream` (or using the WebSocket at
+/api/books/import/ws) get that progress pushed: the import runs as its own
+task and a ProgressFeed turns its updates into events, at most one per
+PROGRESS_INTERVAL, each carrying the current counters and the errors added
+since the previous event. The import never waits for the client, so a slow
+reader receives fewer, larger deltas, and an import whose client goes away
+still finishes and commits. Session work runs in threads (asyncio.to_thread),
+one row at a time, so queries never block the event loop. Editions found by
+lookups are saved in short transactions of their own (editions.save_edition):
+the import's transaction writes nothing before its final commit, so it holds
+no locks while it waits for Open Library.
+"""
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import csv
+import io
+import json
+import logging
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Book, Edition
+from schemas import CSVImportProgress
+from services import openlibrary_service, OpenLibraryUnavailable
+from covers import cover_cache
+from duplicates import find_near_duplicates
+from editions import find_edition, save_edition
+from isbn import to_isbn13
+import tracing
+
+# Minimum seconds between two progress events of one import
+PROGRESS_INTERVAL = 0.25
+# Errors sent per event at most (the newest ones)
+MAX_EVENT_ERRORS = 20
+# Seconds without progress after which a keep-alive is sent
+KEEPALIVE_INTERVAL = 15
+
+logger = logging.getLogger(__name__)
+
+# Detached imports, referenced until they finish
+_running: Set[asyncio.Task] = set()
+
+
+def read_rows(content: bytes) -> List[Dict[str, str]]:
+    return list(csv.DictReader(io.StringIO(content.decode('utf-8'))))
+
+
+async def import_csv(db: Session, user_id: int, rows: List[Dict[str, str]], progress: CSVImportProgress,
+                     on_progress: Optional[Callable[[], None]] = None) -> List[int]:
+    """
+    Import CSV rows (ISBN required, Title and Authors optional) into a
+    user's library in one transaction. Returns the ids of imported books
+    with a cover to cache.
+    """
+    with tracing.span("csv_import", {"user_id": user_id, "rows": len(rows)}) as import_span:
+        cover_book_ids = await _import_rows(db, user_id, rows, progress, on_progress)
+        import_span.set_attributes({"successful": progress.successful, "failed": progress.failed})
+    return cover_book_ids
+
+
+async def _import_rows(db: Session, user_id: int, rows: List[Dict[str, str]], progress: CSVImportProgress,
+                       on_progress: Optional[Callable[[], None]]) -> List[int]:
+    imported_books = []
+    # ISBN-13s added by this import, not yet flushed
+    seen: Set[str] = set()
+
+    for row in rows:
+        progress.processed += 1
+        isbn = row.get('ISBN', '').strip()
+        isbn13 = to_isbn13(isbn)
+
+        if not isbn:
+            progress.failed += 1
+            progress.errors.append(f"Row {progress.processed}: No ISBN provided")
+        elif isbn13 is None:
+            progress.failed += 1
+            progress.errors.append(f"Row {progress.processed}: Invalid ISBN {isbn}")
+        elif isbn13 in seen:
+            progress.failed += 1
+            progress.errors.append(f"Row {progress.processed}: Book with ISBN {isbn} already exists")
+        else:
+            with tracing.span("csv_import.row", {"row": progress.processed, "isbn": isbn13}):
+                book = await _import_row(db, user_id, row, isbn, isbn13, progress)
+            if book is not None:
+                seen.add(isbn13)
+                imported_books.append(book)
+                progress.successful += 1
+
+        if on_progress is not None:
+            on_progress()
+
+    with tracing.span("csv_import.commit", {"books": len(imported_books)}):
+        return await asyncio.to_thread(_commit, db, imported_books)
+
+
+def _commit(db: Session, imported_books: List[Book]) -> List[int]:
+    db.flush()
+    cover_book_ids = [book.id for book in imported_books if book.cover_url]
+    db.commit()
+    return cover_book_ids
+
+
+async def _import_row(db: Session, user_id: int, row: Dict[str, str], isbn: str, isbn13: str,
+                      progress: CSVImportProgress) -> Optional[Book]:
+    try:
+        exists, edition = await asyncio.to_thread(_find_existing, db, user_id, isbn, isbn13)
+        if exists:
+            progress.failed += 1
+            progress.errors.append(f"Row {progress.processed}: Book with ISBN {isbn} already exists")
+            return None
+
+        # Known editions need no Open Library request
+        metadata = None
+        # Books not looked up here are left to metadata_refresh.py
+        fetched_at = None
+        if edition is None:
+            fetched_at = datetime.now(timezone.utc)
+            # Try to fetch metadata; an import waits for a slot instead of being shed
+            try:
+                metadata = await openlibrary_service.lookup_isbn(isbn, queue_timeout=None)
+            except OpenLibraryUnavailable:
+                # Degraded upstream (or open circuit): keep the CSV data
+                fetched_at = None
+            if metadata:
+                edition_id = await asyncio.to_thread(save_edition, isbn, metadata)
+                edition = await asyncio.to_thread(db.get, Edition, edition_id)
+
+        return await asyncio.to_thread(_add_book, db, user_id, row, isbn, edition, fetched_at, progress)
+
+    except Exception as e:
+        progress.failed += 1
+        progress.errors.append(f"Row {progress.processed}: {str(e)}")
+        return None
+
+
+def _find_existing(db: Session, user_id: int, isbn: str, isbn13: str) -> Tuple[bool, Optional[Edition]]:
+    """Whether the library has the ISBN already, and its catalog edition"""
+    existing = db.query(Book.id).filter(
+        Book.user_id == user_id,
+        Book.isbn13 == isbn13
+    ).first()
+    if existing:
+        return True, None
+    return False, find_edition(db, isbn)
+
+
+def _add_book(db: Session, user_id: int, row: Dict[str, str], isbn: str, edition: Optional[Edition],
+              fetched_at: Optional[datetime], progress: CSVImportProgress) -> Optional[Book]:
+    if edition is not None:
+        # Use the shared edition metadata
+        db_book = Book(
+            user_id=user_id,
+            isbn=isbn,
+            edition=edition,
+            metadata_fetched_at=fetched_at
+        )
+        if not edition.title:
+            db_book.title = row.get('Title', 'Unknown')
+    else:
+        # Use CSV data only
+        authors = row.get('Authors', '').strip()
+        authors_str = json.dumps([authors]) if authors else None
+        title = row.get('Title', '').strip()
+        matches = title and find_near_duplicates(db, user_id, title, authors_str)
+        if matches:
+            progress.failed += 1
+            progress.errors.append(
+                f"Row {progress.processed}: Similar to existing book '{matches[0][0].title}'"
+            )
+            return None
+        db_book = Book(
+            user_id=user_id,
+            isbn=isbn,
+            title=row.get('Title', 'Unknown'),
+            authors=authors_str,
+            metadata_fetched_at=fetched_at
+        )
+
+    db.add(db_book)
+    return db_book
+
+
+class ProgressFeed:
+    """Coalesced progress events of one running import"""
+
+    def __init__(self, progress: CSVImportProgress):
+        self.progress = progress
+        self.finished = False
+        self._changed = asyncio.Event()
+        self._errors_sent = 0
+
+    def update(self):
+        self._changed.set()
+
+    def finish(self):
+        self.finished = True
+        self._changed.set()
+
+    def _delta(self) -> Dict:
+        errors = self.progress.errors[self._errors_sent:]
+        self._errors_sent = len(self.progress.errors)
+        return {
+            "total": self.progress.total,
+            "processed": self.progress.processed,
+            "successful": self.progress.successful,
+            "failed": self.progress.failed,
+            "errors": errors[-MAX_EVENT_ERRORS:],
+        }
+
+    async def events(self) -> AsyncIterator[Tuple[str, Optional[Dict]]]:
+        """("progress", delta)..., then ("done", full result); ("keepalive", None) when idle"""
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield "keepalive", None
+                continue
+            self._changed.clear()
+            if self.finished:
+                yield "done", self.progress.model_dump()
+                return
+            yield "progress", self._delta()
+            # Updates arriving meanwhile are folded into the next event
+            await asyncio.sleep(PROGRESS_INTERVAL)
+
+
+def start_import(user_id: int, rows: List[Dict[str, str]]) -> ProgressFeed:
+    """Run an import detached from the request, with its own session"""
+    feed = ProgressFeed(CSVImportProgress(total=len(rows), processed=0, successful=0, failed=0))
+    task = asyncio.create_task(_run_detached(user_id, rows, feed))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return feed
+
+
+async def _run_detached(user_id: int, rows: List[Dict[str, str]], feed: ProgressFeed):
+    cover_book_ids = []
+    db = SessionLocal()
+    try:
+        cover_book_ids = await import_csv(db, user_id, rows, feed.progress, feed.update)
+    except Exception as e:
+        logger.error(f"CSV import of user {user_id} failed: {e}")
+        db.rollback()
+        feed.progress.successful = 0
+        feed.progress.failed = feed.progress.processed
+        feed.progress.errors.append(f"Import failed: {e}")
+    finally:
+        db.close()
+        feed.finish()
+
+    if cover_book_ids:
+        await cover_cache.cache_books(cover_book_ids)
+
+
+async def sse_events(feed: ProgressFeed) -> AsyncIterator[str]:
+    async for event, data in feed.events():
+        if event == "keepalive":
+            yield ": keepalive\n\n"
+        else:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,12 +1,29 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi import Request
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://mylibraryuser:password@db:5432/mylibrary")
 
+# Optional read replica for read-only endpoints
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Clients that wrote are pinned to the primary this long (replication lag budget)
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+PRIMARY_PIN_COOKIE = "mylibrary_primary"
+# Pool connections opened at startup, so the first requests skip the connect
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", "2"))
+
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay loaded after commit: write endpoints serialize what they just
+# wrote (server defaults come back via RETURNING, see eager_defaults in models.py)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+replica_engine = create_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+ReplicaSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    if replica_engine is not None else None
+)
 
 Base = declarative_base()
 
@@ -16,3 +33,30 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def read_session(request: Request):
+    """
+    Session for read-only work: the replica if configured, unless the
+    client wrote recently (see PRIMARY_PIN_COOKIE in main.py).
+    """
+    if ReplicaSessionLocal is None or request.cookies.get(PRIMARY_PIN_COOKIE):
+        return SessionLocal()
+    return ReplicaSessionLocal()
+
+def warm_up_pool(engine, connections: int = DB_WARM_CONNECTIONS):
+    """Open connections and return them to the pool"""
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for conn in opened:
+            conn.close()
+
+def get_read_db(request: Request):
+    """Read session dependency, see read_session()"""
+    db = read_session(request)
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,199 @@
+"""
+Near-duplicate detection for books.
+
+Each book gets a MinHash signature over the character trigrams of its
+normalized title and authors. The signature is cut into LSH bands whose
+hashes (which include the band number) are stored in `book_lsh_bands`, so
+finding candidates for a new title is a handful of index lookups on
+(user_id, bucket) instead of a scan of the library. Candidates are then confirmed with the exact Jaccard
+similarity of their trigram sets.
+
+The band rows are kept current by an after_flush listener, like the change
+tracking in sync.py. Later changes to a shared edition's title or authors
+do not refresh the signatures of books inheriting them.
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import json
+import struct
+import unicodedata
+
+from sqlalchemy import delete, event, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from models import Book, BookBand
+
+BANDS = 8
+ROWS_PER_BAND = 4
+# Jaccard similarity of trigram sets above which books count as duplicates
+THRESHOLD = 0.75
+
+# Each salted 64-byte blake2b digest yields eight independent 64-bit hashes;
+# fixed salts keep signatures stable across processes
+_SALTS = [f"minhash-{i}".encode() for i in range(BANDS * ROWS_PER_BAND // 8)]
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(
+        c if c.isalnum() else " "
+        for c in text if not unicodedata.combining(c)
+    )
+    return " ".join(text.split())
+
+
+def _author_text(authors: Optional[str]) -> str:
+    if not authors:
+        return ""
+    try:
+        names = json.loads(authors)
+    except ValueError:
+        return authors
+    return " ".join(names) if isinstance(names, list) else str(names)
+
+
+def shingles(title: Optional[str], authors: Optional[str]) -> Set[str]:
+    """Character trigrams of the normalized title and author names"""
+    text = f"{normalize(title)} | {normalize(_author_text(authors))}"
+    return {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+
+
+@lru_cache(maxsize=65536)  # the trigram vocabulary is small and shared between titles
+def _gram_hashes(gram: str) -> Tuple[int, ...]:
+    data = gram.encode()
+    hashes = ()
+    for salt in _SALTS:
+        hashes += struct.unpack("<8Q", hashlib.blake2b(data, digest_size=64, salt=salt).digest())
+    return hashes
+
+
+def band_keys(grams: Set[str]) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs of a trigram set's MinHash signature"""
+    signature = [min(column) for column in zip(*map(_gram_hashes, grams))]
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f"<H{ROWS_PER_BAND}Q", band, *rows), digest_size=8).digest()
+        keys.append((band, struct.unpack("<q", digest)[0]))
+    return keys
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def band_rows(book: Book) -> List[Dict]:
+    return [
+        {"book_id": book.id, "user_id": book.user_id, "band": band, "bucket": bucket}
+        for band, bucket in band_keys(shingles(book.title, book.authors))
+    ]
+
+
+def find_near_duplicates(db: Session, user_id: int, title: Optional[str], authors: Optional[str],
+                         exclude_id: Optional[int] = None) -> List[Tuple[Book, float]]:
+    """Books of a user similar to the given title/authors, most similar first"""
+    grams = shingles(title, authors)
+    candidate_ids = db.execute(
+        select(BookBand.book_id).distinct().where(
+            BookBand.user_id == user_id,
+            BookBand.bucket.in_([bucket for _, bucket in band_keys(grams)])
+        )
+    ).scalars().all()
+    if exclude_id is not None:
+        candidate_ids = [book_id for book_id in candidate_ids if book_id != exclude_id]
+    if not candidate_ids:
+        return []
+
+    matches = []
+    for book in db.query(Book).filter(Book.user_id == user_id, Book.id.in_(candidate_ids)):
+        similarity = jaccard(grams, shingles(book.title, book.authors))
+        if similarity >= THRESHOLD:
+            matches.append((book, similarity))
+    return sorted(matches, key=lambda match: match[1], reverse=True)
+
+
+def duplicate_groups(db: Session, user_id: int) -> List[Tuple[List[Book], float]]:
+    """
+    Groups of near-duplicate books in a library with the lowest pairwise
+    similarity that joined each group; candidate pairs come from shared buckets
+    """
+    other = BookBand.__table__.alias("other")
+    pairs = db.execute(
+        select(BookBand.book_id, other.c.book_id).distinct().join(
+            other,
+            (other.c.user_id == BookBand.user_id)
+            & (other.c.bucket == BookBand.bucket)
+            & (other.c.book_id > BookBand.book_id)
+        ).where(BookBand.user_id == user_id)
+    ).all()
+    if not pairs:
+        return []
+
+    ids = {book_id for pair in pairs for book_id in pair}
+    books = {book.id: book for book in db.query(Book).filter(Book.user_id == user_id, Book.id.in_(ids))}
+    grams = {book_id: shingles(book.title, book.authors) for book_id, book in books.items()}
+
+    # Union-find over confirmed pairs
+    parent = {book_id: book_id for book_id in books}
+    weakest: Dict[int, float] = {}
+
+    def root(book_id: int) -> int:
+        while parent[book_id] != book_id:
+            parent[book_id] = parent[parent[book_id]]
+            book_id = parent[book_id]
+        return book_id
+
+    confirmed = []
+    for a, b in pairs:
+        if a in books and b in books:
+            similarity = jaccard(grams[a], grams[b])
+            if similarity >= THRESHOLD:
+                confirmed.append((a, b, similarity))
+                parent[root(a)] = root(b)
+
+    groups: Dict[int, List[int]] = {}
+    for a, b, similarity in confirmed:
+        group = root(a)
+        weakest[group] = min(weakest.get(group, 1.0), similarity)
+    for book_id in books:
+        if root(book_id) in weakest:
+            groups.setdefault(root(book_id), []).append(book_id)
+
+    return sorted(
+        (([books[book_id] for book_id in sorted(members)], weakest[group])
+         for group, members in groups.items()),
+        key=lambda entry: len(entry[0]),
+        reverse=True
+    )
+
+
+def _signature_changed(book: Book) -> bool:
+    state = inspect(book)
+    return any(
+        state.attrs[name].history.has_changes()
+        for name in ("title_override", "authors_override", "cleared_fields", "edition_id", "edition")
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def index_book_signatures(session, flush_context):
+    updated = [obj for obj in session.dirty if isinstance(obj, Book) and _signature_changed(obj)]
+    changed: Iterable[Book] = [obj for obj in session.new if isinstance(obj, Book)] + updated
+    stale = [obj for obj in session.deleted if isinstance(obj, Book)] + updated
+
+    connection = session.connection()
+    with session.no_autoflush:
+        rows = [row for book in changed for row in band_rows(book)]
+    if stale:
+        connection.execute(delete(BookBand).where(
+            BookBand.user_id.in_(list({book.user_id for book in stale})),
+            BookBand.book_id.in_([book.id for book in stale])
+        ))
+    if rows:
+        connection.execute(insert(BookBand), rows)
@@ -0,0 +1,130 @@
+"""
+Shared edition catalog.
+
+Bibliographic metadata is stored once per ISBN-13 in `editions`
+(filled from Open Library lookups and imports). A book links to its edition
+and keeps only the values its owner changed: before every flush, overrides
+equal to the edition's value are cleared, so a book created from a lookup
+result stores no metadata of its own and follows later edition updates.
+
+An override of None means "use the edition". To empty a field the edition
+provides, the owner clears it (Book.clear, PATCH with null): the field's bit
+in books.cleared_fields is set and the book shows no value until it gets a
+new one. The title cannot be cleared; a null title restores the edition's.
+"""
+from typing import Dict, Optional
+import json
+
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from isbn import clean, to_isbn13
+from models import Book, Edition, EDITION_FIELDS, CLEARED_BITS
+
+
+def normalize_isbn(isbn: Optional[str]) -> Optional[str]:
+    """Catalog key: the ISBN-13 of valid ISBNs, else stripped of hyphens and spaces; None for empty input"""
+    return to_isbn13(isbn) or clean(isbn) or None
+
+
+def find_edition(db: Session, isbn: Optional[str]) -> Optional[Edition]:
+    normalized = normalize_isbn(isbn)
+    if normalized is None:
+        return None
+    return db.query(Edition).filter(Edition.isbn == normalized).first()
+
+
+def upsert_edition(db: Session, isbn: str, metadata: Dict) -> Optional[Edition]:
+    """
+    Get or create the edition for an ISBN and fill its empty fields from
+    Open Library metadata (lookup format, authors as a list). Creating one
+    flushes the session (begin_nested); see save_edition.
+    """
+    normalized = normalize_isbn(isbn)
+    if normalized is None:
+        return None
+
+    values = {name: metadata.get(name) for name in EDITION_FIELDS}
+    if values["authors"] is not None:
+        values["authors"] = json.dumps(values["authors"])
+
+    edition = find_edition(db, normalized)
+    if edition is None:
+        try:
+            # Another request may create the same edition concurrently
+            with db.begin_nested():
+                edition = Edition(isbn=normalized, **values)
+                db.add(edition)
+        except IntegrityError:
+            edition = find_edition(db, normalized)
+        else:
+            return edition
+
+    for name, value in values.items():
+        if value is not None and getattr(edition, name) is None:
+            setattr(edition, name, value)
+    return edition
+
+
+def save_edition(isbn: str, metadata: Dict) -> Optional[int]:
+    """
+    upsert_edition in a short transaction of its own; returns the edition id.
+    The caller's transaction stays free of pending inserts and row locks,
+    e.g. a CSV import waiting for Open Library between rows.
+    """
+    with SessionLocal() as db:
+        edition = upsert_edition(db, isbn, metadata)
+        db.commit()
+        return edition.id if edition is not None else None
+
+
+def edition_metadata(edition: Edition) -> Dict:
+    """Edition in the ISBN lookup response format"""
+    metadata = {name: getattr(edition, name) for name in EDITION_FIELDS}
+    metadata["isbn"] = edition.isbn
+    metadata["authors"] = json.loads(edition.authors) if edition.authors else []
+    return metadata
+
+
+def edition_backed_ilike(name: str, pattern: str):
+    """
+    Filter for Book.<name> ILIKE pattern. Unlike the hybrid's CASE/COALESCE
+    expression, each side can use an index (the trigram indexes on
+    books.title and editions.title on PostgreSQL).
+    """
+    override = getattr(Book, f"{name}_override")
+    return or_(
+        override.ilike(pattern),
+        and_(
+            override.is_(None),
+            Book.cleared_fields.op("&")(CLEARED_BITS[name]) == 0,
+            Book.edition_id.in_(select(Edition.id).where(getattr(Edition, name).ilike(pattern)))
+        )
+    )
+
+
+def _same_value(name: str, override, shared) -> bool:
+    if name == "authors" and override and shared:
+        # Clients serialize the JSON array with varying whitespace
+        try:
+            return json.loads(override) == json.loads(shared)
+        except ValueError:
+            return False
+    return override == shared
+
+
+def redundant_override(name: str, override, shared) -> bool:
+    """Whether a book's value equals the edition's, so it need not be stored"""
+    return override is not None and _same_value(name, override, shared)
+
+
+@event.listens_for(Session, "before_flush")
+def drop_redundant_overrides(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Book) or obj.edition is None:
+            continue
+        for name in EDITION_FIELDS:
+            if redundant_override(name, getattr(obj, f"{name}_override"), getattr(obj.edition, name)):
+                setattr(obj, f"{name}_override", None)
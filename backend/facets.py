@@ -0,0 +1,124 @@
+"""
+Facet counts for the book listing (``?facets=tag,author,location,condition``).
+
+The filtered book set becomes a CTE, and a single UNION ALL statement over
+it returns the ids of the requested page, the total and the top counts of
+every requested facet, so the filter is evaluated once per request. Authors
+are unnested from their JSON array with json_array_elements_text
+(PostgreSQL) or json_each (SQLite).
+"""
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import JSON, String, case, cast, func, literal, null, select, true, union_all
+from sqlalchemy.orm import Query, Session
+
+from models import Book, Location, Tag, book_tags
+
+FACETS = ("tag", "author", "location", "condition")
+# Values returned per facet, most frequent first
+FACET_LIMIT = 20
+
+
+def parse_facets(facets: Optional[str]) -> FrozenSet[str]:
+    """Resolve a facets= parameter; raises 400 on unknown facets"""
+    requested = frozenset(f.strip() for f in (facets or "").split(",") if f.strip())
+    unknown = requested - set(FACETS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown facets: {', '.join(sorted(unknown))}"
+        )
+    return requested
+
+
+def _row(facet: str, value, label, count):
+    return (
+        literal(facet, String).label("facet"),
+        cast(value, String).label("value"),
+        cast(label, String).label("label"),
+        count.label("count"),
+    )
+
+
+def _top(stmt):
+    """Most frequent values first, wrapped so it can be part of a UNION"""
+    stmt = stmt.order_by(func.count().desc()).limit(FACET_LIMIT).subquery()
+    return select(*stmt.c)
+
+
+def _authors_table(db: Session, authors):
+    # Legacy values that are not a JSON array unnest to nothing
+    authors = case((authors.like("[%"), authors))
+    if db.get_bind().dialect.name == "postgresql":
+        return func.json_array_elements_text(cast(authors, JSON)).table_valued("value")
+    return func.json_each(authors).table_valued("value")
+
+
+def facet_page(db: Session, query: Query, facets: FrozenSet[str], skip: int,
+               limit: int) -> Tuple[List[int], int, Dict[str, List[dict]]]:
+    """
+    Page ids (in listing order), total and facet counts of a filtered
+    book query. Returns (ids, total, facets).
+    """
+    filtered = query.with_entities(
+        Book.id, Book.user_id, Book.is_pinned, Book.created_at, Book.location_id,
+        Book.condition, Book.authors.label("authors")
+    ).statement.cte("filtered")
+
+    # The page branch carries the listing position in the count column
+    position = func.row_number().over(
+        order_by=(filtered.c.is_pinned.desc(), filtered.c.created_at.desc())
+    )
+    page = select(filtered.c.id, position.label("seq")).order_by(
+        "seq"
+    ).offset(skip).limit(limit).subquery()
+    branches = [
+        select(*_row("page", page.c.id, null(), page.c.seq)),
+        select(*_row("total", null(), null(), func.count())).select_from(filtered),
+    ]
+
+    if "tag" in facets:
+        branches.append(_top(
+            select(*_row("tag", Tag.name, null(), func.count()))
+            .select_from(filtered)
+            .join(book_tags, (book_tags.c.book_id == filtered.c.id) & (book_tags.c.user_id == filtered.c.user_id))
+            .join(Tag, Tag.id == book_tags.c.tag_id)
+            .group_by(Tag.name)
+        ))
+    if "author" in facets:
+        author = _authors_table(db, filtered.c.authors)
+        branches.append(_top(
+            select(*_row("author", author.c.value, null(), func.count()))
+            .select_from(filtered)
+            .join(author, true())
+            .group_by(author.c.value)
+        ))
+    if "location" in facets:
+        branches.append(_top(
+            select(*_row("location", filtered.c.location_id, Location.name, func.count()))
+            .select_from(filtered)
+            .outerjoin(Location, Location.id == filtered.c.location_id)
+            .group_by(filtered.c.location_id, Location.name)
+        ))
+    if "condition" in facets:
+        branches.append(_top(
+            select(*_row("condition", filtered.c.condition, null(), func.count()))
+            .select_from(filtered)
+            .group_by(filtered.c.condition)
+        ))
+
+    rows = db.execute(union_all(*branches)).all()
+
+    page_ids = [int(row.value) for row in sorted(
+        (row for row in rows if row.facet == "page"), key=lambda row: row.count
+    )]
+    total = next(row.count for row in rows if row.facet == "total")
+    counts = {facet: [] for facet in sorted(facets)}
+    for row in rows:
+        if row.facet in counts:
+            value = row.value
+            if row.facet == "location" and value is not None:
+                value = int(value)
+            counts[row.facet].append({"value": value, "label": row.label, "count": row.count})
+    return page_ids, total, counts
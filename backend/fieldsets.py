@@ -0,0 +1,85 @@
+"""
+Sparse fieldsets for the book list endpoints.
+
+``?fields=id,title,tags`` selects the returned fields; ``card`` (the default)
+and ``full`` are predefined views. Only the columns behind the selected fields
+are read (load_only) and relationships are loaded only when requested.
+"""
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy.orm import load_only, selectinload
+
+from models import Book, Edition, EDITION_FIELDS
+
+# API fields that are computed from other columns
+DERIVED_COLUMNS = {
+    "cover_thumb_url": ("cover_cache_key",),
+    # Per-user override, falling back to the edition
+    **{name: (f"{name}_override", "edition_id", "cleared_fields") for name in EDITION_FIELDS},
+}
+RELATIONSHIPS = {
+    "tags": Book.tags,
+    "location": Book.location,
+}
+
+# What the SPA grid and list views render
+CARD_FIELDS = frozenset({
+    "id", "isbn", "title", "authors", "cover_url", "cover_thumb_url",
+    "is_pinned", "location_id", "tags",
+})
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel]) -> FrozenSet[str]:
+    """Resolve a fields= parameter against a schema; raises 400 on unknown fields"""
+    available = frozenset(schema.model_fields)
+    if not fields or fields == "card":
+        return CARD_FIELDS & available
+    if fields == "full":
+        return available
+
+    requested = frozenset(f.strip() for f in fields.split(",") if f.strip())
+    unknown = requested - available
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return requested | {"id"}
+
+
+def load_options(fields: FrozenSet[str]) -> list:
+    """SQLAlchemy loader options reading only what the selected fields need"""
+    columns = {"id"}
+    options = []
+    for field in fields:
+        if field in RELATIONSHIPS:
+            options.append(selectinload(RELATIONSHIPS[field]))
+        elif field in DERIVED_COLUMNS:
+            columns.update(DERIVED_COLUMNS[field])
+        else:
+            columns.add(field)
+    options.append(load_only(*(getattr(Book, column) for column in sorted(columns))))
+    edition_fields = sorted(fields & set(EDITION_FIELDS))
+    if edition_fields:
+        options.append(selectinload(Book.edition).load_only(
+            *(getattr(Edition, field) for field in edition_fields)
+        ))
+    return options
+
+
+@lru_cache(maxsize=64)
+def fields_adapter(schema: Type[BaseModel], fields: FrozenSet[str]) -> TypeAdapter:
+    """Precompiled list adapter for a subset of a schema's fields"""
+    model = create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (info.annotation, info)
+            for name, info in schema.model_fields.items()
+            if name in fields
+        }
+    )
+    return TypeAdapter(List[model])
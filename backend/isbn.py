@@ -0,0 +1,52 @@
+"""
+ISBN validation and normalization.
+
+Books keep the ISBN as typed in `isbn`; `isbn13` holds the canonical form
+(digits only, ISBN-10s converted to ISBN-13), so `0-306-40615-2`,
+`0306406152` and `9780306406157` are the same book for duplicate checks
+and the edition catalog.
+"""
+from typing import Optional
+import re
+
+# ASCII digits only: str.isdigit() also accepts e.g. "²", which int() rejects
+_ISBN10 = re.compile(r"[0-9]{9}[0-9X]")
+_ISBN13 = re.compile(r"97[89][0-9]{10}")
+
+
+def clean(raw: Optional[str]) -> str:
+    """Strip hyphens and spaces; uppercase the ISBN-10 check digit X"""
+    if not raw:
+        return ""
+    return raw.replace("-", "").replace(" ", "").strip().upper()
+
+
+def _isbn10_check_digit(body: str) -> str:
+    remainder = sum((10 - i) * int(d) for i, d in enumerate(body)) % 11
+    check = (11 - remainder) % 11
+    return "X" if check == 10 else str(check)
+
+
+def _isbn13_check_digit(body: str) -> str:
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_isbn10(value: str) -> bool:
+    return _ISBN10.fullmatch(value) is not None and _isbn10_check_digit(value[:9]) == value[9]
+
+
+def is_valid_isbn13(value: str) -> bool:
+    return _ISBN13.fullmatch(value) is not None and _isbn13_check_digit(value[:12]) == value[12]
+
+
+def to_isbn13(raw: Optional[str]) -> Optional[str]:
+    """Canonical ISBN-13, or None if `raw` is not a valid ISBN-10/13"""
+    value = clean(raw)
+    if is_valid_isbn13(value):
+        return value
+    if is_valid_isbn10(value):
+        body = "978" + value[:9]
+        return body + _isbn13_check_digit(body)
+    return None
+
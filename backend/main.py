@@ -1,15 +1,30 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import logging
 import os
+import threading
 
-from routers import auth, users, books, locations, stats, public
+from routers import auth, users, books, locations, stats, public, tags
+from database import engine, replica_engine, warm_up_pool, PRIMARY_PIN_COOKIE, READ_YOUR_WRITES_SECONDS
+from profiling import setup_sql_profiling
+from tracing import setup_tracing, shutdown_tracing
+from covers import UPLOAD_DIR, COVER_DIR, ImmutableStaticFiles, cover_cache, remove_originals
+from static_assets import static_assets
+from services import openlibrary_service
+from compression import CompressionMiddleware
+from public_snapshots import SNAPSHOT_DIR, URL_PREFIX as SNAPSHOT_URL_PREFIX
+from metadata_refresh import metadata_refresher
+from auth import warm_up as warm_up_auth
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="MyLibrary API",
     description="Personal Library Management System",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS Configuration
@@ -22,6 +37,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON/text responses (brotli or gzip) above the size threshold
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
+
+# Opt-in SQL profiling (SQL_PROFILING=1 or X-SQL-Profile header)
+setup_sql_profiling(app, engine, replica_engine)
+
+# Read-your-writes: after a successful write, pin this client to the primary
+# for a short window so replica lag never hides its own changes
+if replica_engine is not None:
+    @app.middleware("http")
+    async def pin_writers_to_primary(request: Request, call_next):
+        response = await call_next(request)
+        if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE, "1",
+                max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite="lax"
+            )
+        return response
+
+# Opt-in OpenTelemetry tracing (TRACING_EXPORTER); added last so its span covers all middleware
+setup_tracing(app, engine, replica_engine)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -29,28 +66,82 @@ app.include_router(books.router)
 app.include_router(locations.router)
 app.include_router(stats.router)
 app.include_router(public.router)
+app.include_router(tags.router)
+
+# Serve cached cover thumbnails (content-addressed, cached forever)
+os.makedirs(COVER_DIR, exist_ok=True)
+app.mount("/uploads/covers", ImmutableStaticFiles(directory=COVER_DIR), name="covers")
 
 # Serve uploaded files
-app.mount("/uploads", StaticFiles(directory="/app/uploads"), name="uploads")
+app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+
+# Serve pre-rendered public libraries (optional, see public_snapshots.py)
+if SNAPSHOT_DIR:
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    app.mount(SNAPSHOT_URL_PREFIX, StaticFiles(directory=SNAPSHOT_DIR, html=True), name="public_snapshots")
+
+# Serve frontend static files (fingerprinted and precompressed in memory)
+static_assets.load()
+app.mount("/static", static_assets, name="static")
+
+@app.on_event("startup")
+async def start_metadata_refresh():
+    metadata_refresher.start()
+
+def warm_up():
+    """Open pool connections, load bcrypt, import the HTTP client and clean up the cover directory"""
+    try:
+        for warm_engine in (engine, replica_engine):
+            if warm_engine is not None:
+                warm_up_pool(warm_engine)
+        warm_up_auth()
+        import httpx  # noqa: F401
+    except Exception:
+        logger.warning("Warm-up failed; the first requests will do it", exc_info=True)
+    try:
+        # Older versions kept the downloaded originals in the publicly served cover directory
+        removed = remove_originals()
+        if removed:
+            logger.info(f"Removed {removed} downloaded cover originals")
+    except OSError:
+        logger.warning("Could not remove downloaded cover originals", exc_info=True)
+
+# Runs beside the first requests instead of delaying the server start
+@app.on_event("startup")
+def start_warm_up():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_metadata_refresh():
+    await metadata_refresher.stop()
+
+@app.on_event("shutdown")
+def shutdown_cover_pool():
+    cover_cache.shutdown()
 
-# Serve frontend static files
-app.mount("/static", StaticFiles(directory="/app/static"), name="static")
+@app.on_event("shutdown")
+def flush_traces():
+    shutdown_tracing()
 
 # Health check
 @app.get("/api/health")
 def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "openlibrary": openlibrary_service.stats(),
+        "metadata_refresh": metadata_refresher.stats()
+    }
 
 # Serve frontend for all other routes (SPA)
 @app.get("/{full_path:path}")
-async def serve_frontend(full_path: str):
+async def serve_frontend(full_path: str, request: Request):
     """Serve frontend index.html for all non-API routes"""
     if full_path.startswith("api/"):
         return {"error": "Not found"}
     
-    index_path = "/app/static/index.html"
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    response = static_assets.index_response(request)
+    if response is not None:
+        return response
     else:
         return {"message": "Frontend not built yet. Please build the frontend."}
 
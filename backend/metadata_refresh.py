@@ -0,0 +1,246 @@
+"""
+Background metadata refresh for incomplete books.
+
+Books whose ISBN could not be looked up (Open Library down during a CSV
+import, a book entered by hand) have no title or cover, neither their own
+nor from an edition. Every METADATA_REFRESH_INTERVAL seconds the scheduler takes
+such books in batches, oldest lookup first (NULLs = never looked up first),
+looks their ISBNs
+up through openlibrary_service within a rate budget shared with all workers
+(the rate limit backend, Redis if configured), and writes each batch back in
+one short transaction: found metadata goes to the edition catalog and the
+books, reloaded as they are now, are linked to it, and every looked-up book
+gets metadata_fetched_at, so a book is only retried after
+METADATA_STALE_DAYS. No transaction is open while the lookups run; books
+edited or deleted meanwhile are written back as they are then. An unreachable Open Library
+(or open circuit) ends the pass without touching the remaining books.
+
+With several replicas only one runs the scheduler: the one holding a
+PostgreSQL advisory lock, on a connection kept for as long as it leads. If
+that connection dies the lock is released and another replica takes over on
+its next attempt. Other databases have no lock and always lead.
+
+Candidates come from two partial indexes, so a pass does not depend on how
+many complete books there are: books without an edition that miss a title
+or cover (ix_books_metadata_incomplete), and books of incomplete editions
+(ix_editions_incomplete, then books.edition_id).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+
+from sqlalchemy import and_, func, or_, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+import ratelimit
+from database import SessionLocal, engine
+from editions import upsert_edition
+from models import Book, Edition
+from services import openlibrary_service, OpenLibraryUnavailable, OPENLIBRARY_OFFLINE
+import tracing
+
+# Seconds between refresh passes; 0 disables the scheduler
+REFRESH_INTERVAL = float(os.getenv("METADATA_REFRESH_INTERVAL", "600"))
+BATCH_SIZE = int(os.getenv("METADATA_REFRESH_BATCH", "50"))
+# Open Library lookups per minute, across all workers
+LOOKUPS_PER_MINUTE = float(os.getenv("METADATA_REFRESH_PER_MINUTE", "20"))
+# Incomplete books are looked up again after this many days
+STALE_DAYS = int(os.getenv("METADATA_STALE_DAYS", "30"))
+# Application-wide pg_try_advisory_lock key of the scheduler
+LEADER_LOCK_KEY = 0x6D796C6201
+
+# Titles the CSV import stores when it has nothing better
+PLACEHOLDER_TITLES = ("", "Unknown")
+
+logger = logging.getLogger(__name__)
+
+
+def candidates(db: Session, limit: int, now: datetime) -> List[Tuple[int, str]]:
+    """(id, isbn13) of incomplete books not looked up since the stale cutoff, oldest lookup first"""
+    cutoff = now - timedelta(days=STALE_DAYS)
+    incomplete_editions = select(Edition.id).where(or_(Edition.title.is_(None), Edition.cover_url.is_(None)))
+    return db.query(Book.id, Book.isbn13).outerjoin(Edition, Edition.id == Book.edition_id).filter(
+        Book.isbn13.isnot(None),
+        or_(Book.metadata_fetched_at.is_(None), Book.metadata_fetched_at < cutoff),
+        # Spelled like the partial indexes' predicates, so the planner can use them
+        or_(
+            and_(
+                Book.edition_id.is_(None),
+                or_(Book.title_override.is_(None), Book.cover_url_override.is_(None))
+            ),
+            Book.edition_id.in_(incomplete_editions)
+        ),
+        or_(
+            func.coalesce(Book.title_override, Edition.title).is_(None),
+            func.coalesce(Book.cover_url_override, Edition.cover_url).is_(None)
+        )
+    ).order_by(Book.metadata_fetched_at.asc().nulls_first()).limit(limit).all()
+
+
+def load_candidates(limit: int, now: datetime) -> List[Tuple[int, str]]:
+    """candidates() in a session that is closed before the lookups start"""
+    with SessionLocal() as db:
+        return [tuple(row) for row in candidates(db, limit, now)]
+
+
+async def _take_budget():
+    """Wait for a token of the shared lookup budget"""
+    rate = LOOKUPS_PER_MINUTE / 60
+    while True:
+        allowed, wait = ratelimit.backend.take("metadata-refresh", rate, 1)
+        if allowed:
+            return
+        await asyncio.sleep(wait)
+
+
+async def lookup_all(isbns: List[str]) -> Dict[str, Optional[Dict]]:
+    """Metadata (or None if unknown) per ISBN; stops early when Open Library is unavailable"""
+    results = {}
+    for isbn in isbns:
+        await _take_budget()
+        try:
+            results[isbn] = await openlibrary_service.lookup_isbn(isbn, queue_timeout=None)
+        except OpenLibraryUnavailable:
+            logger.warning(f"Open Library unavailable, metadata refresh stops after {len(results)} lookups")
+            break
+    return results
+
+
+def write_back(db: Session, books: List[Tuple[int, str]], results: Dict[str, Optional[Dict]], now: datetime) -> int:
+    """Link books to the found editions and stamp every looked-up book; returns books enriched"""
+    found = {book_id: isbn13 for book_id, isbn13 in books if results.get(isbn13)}
+    enriched = 0
+    # Loaded now: the owner may have edited or deleted books during the lookups
+    loaded = db.query(Book).filter(Book.id.in_(list(found))).all() if found else []
+    for book in loaded:
+        if book.isbn13 != found[book.id]:
+            continue
+        book.edition = upsert_edition(db, book.isbn13, results[book.isbn13])
+        if (book.title_override or "").strip() in PLACEHOLDER_TITLES:
+            book.title_override = None
+        enriched += 1
+    db.flush()
+    # Core UPDATE: a new timestamp alone is no change for sync clients or snapshots
+    looked_up = [book_id for book_id, isbn13 in books if isbn13 in results]
+    if looked_up:
+        db.execute(
+            update(Book.__table__).where(Book.__table__.c.id.in_(looked_up)).values(metadata_fetched_at=now)
+        )
+    db.commit()
+    return enriched
+
+
+def _write_back(books: List[Tuple[int, str]], results: Dict[str, Optional[Dict]], now: datetime) -> int:
+    with SessionLocal() as db:
+        return write_back(db, books, results, now)
+
+
+class MetadataRefresher:
+    """In-process scheduler; runs passes while this process holds the leader lock"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._lock_connection: Optional[Connection] = None
+        self.leader = False
+        self.counters = {"passes": 0, "looked_up": 0, "enriched": 0}
+
+    def start(self):
+        if REFRESH_INTERVAL <= 0 or OPENLIBRARY_OFFLINE or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self._release_leadership)
+
+    def stats(self) -> Dict:
+        return {"enabled": self._task is not None, "leader": self.leader, **self.counters}
+
+    async def _run(self):
+        while True:
+            try:
+                self.leader = await asyncio.to_thread(self._hold_leadership)
+                if self.leader:
+                    await self.refresh_pass()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Metadata refresh failed: {e}")
+                self.leader = False
+                await asyncio.to_thread(self._release_leadership)
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+    def _hold_leadership(self) -> bool:
+        """Keep or try to take the advisory lock; True while this process leads"""
+        if engine.dialect.name != "postgresql":
+            return True
+        if self._lock_connection is not None:
+            try:
+                self._lock_connection.execute(text("SELECT 1"))
+                self._lock_connection.rollback()
+                return True
+            except DBAPIError:
+                logger.warning("Lost the metadata refresh leader connection")
+                self._release_leadership()
+        connection = engine.connect()
+        try:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_LOCK_KEY}
+            ).scalar()
+            # The lock belongs to the session, not the transaction
+            connection.rollback()
+        except BaseException:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        logger.info("Leading the metadata refresh")
+        self._lock_connection = connection
+        return True
+
+    def _release_leadership(self):
+        connection, self._lock_connection = self._lock_connection, None
+        if connection is None:
+            return
+        try:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LEADER_LOCK_KEY})
+            connection.commit()
+        except DBAPIError:
+            pass  # a dead connection has released the lock already
+        finally:
+            connection.close()
+
+    async def refresh_pass(self) -> int:
+        """Refresh batches until none are left or Open Library stops answering"""
+        self.counters["passes"] += 1
+        total = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            with tracing.span("metadata_refresh.batch") as batch_span:
+                books = await asyncio.to_thread(load_candidates, BATCH_SIZE, now)
+                if not books:
+                    return total
+                isbns = list(dict.fromkeys(isbn13 for _, isbn13 in books))
+                results = await lookup_all(isbns)
+                enriched = await asyncio.to_thread(_write_back, books, results, now)
+                batch_span.set_attributes({"books": len(books), "looked_up": len(results), "enriched": enriched})
+            self.counters["looked_up"] += len(results)
+            self.counters["enriched"] += enriched
+            total += enriched
+            if len(results) < len(isbns):
+                return total
+
+
+# Singleton instance
+metadata_refresher = MetadataRefresher()
@@ -0,0 +1,86 @@
+"""
+Container start: run the Alembic migrations unless the database is at head.
+
+`alembic upgrade head` imports Alembic, SQLAlchemy and the models before it
+finds out there is nothing to do, which is most of a second on every
+restart. This script reads the head revision(s) from alembic/versions and
+the database's alembic_version with the bare driver (psycopg2 or sqlite3)
+and only hands over to Alembic when they differ. If the check fails for any
+reason (no table yet, unsupported URL, ...) Alembic runs as before.
+
+Usage:
+    python migrate.py
+"""
+from typing import Set
+import os
+import re
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+VERSIONS_DIR = os.path.join(BACKEND_DIR, "alembic", "versions")
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://mylibraryuser:password@db:5432/mylibrary")
+
+_REVISION = re.compile(r"^revision\s*=\s*['\"]([^'\"]+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision\s*=\s*(.+)$", re.MULTILINE)
+_QUOTED = re.compile(r"['\"]([^'\"]+)['\"]")
+
+
+def head_revisions() -> Set[str]:
+    """Revisions of alembic/versions that no other revision builds on"""
+    revisions, parents = set(), set()
+    for name in os.listdir(VERSIONS_DIR):
+        if not name.endswith(".py") or name.startswith("__"):
+            continue
+        with open(os.path.join(VERSIONS_DIR, name), encoding="utf-8") as f:
+            source = f.read()
+        revision = _REVISION.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = _DOWN_REVISION.search(source)
+        if down_revision is not None:
+            parents.update(_QUOTED.findall(down_revision.group(1)))
+    return revisions - parents
+
+
+def database_revisions(url: str) -> Set[str]:
+    """Contents of alembic_version; raises if it cannot be read"""
+    if url.startswith("sqlite:///"):
+        import sqlite3
+        conn = sqlite3.connect(url[len("sqlite:///"):])
+    elif url.startswith(("postgresql://", "postgresql+psycopg2://", "postgres://")):
+        import psycopg2
+        # libpq understands the URL without SQLAlchemy's driver suffix
+        conn = psycopg2.connect(url.replace("+psycopg2", "", 1))
+    else:
+        raise ValueError(f"Unsupported database URL for the quick check: {url.split(':', 1)[0]}")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version_num FROM alembic_version")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def is_up_to_date() -> bool:
+    try:
+        heads = head_revisions()
+        return bool(heads) and database_revisions(DATABASE_URL) == heads
+    except Exception as e:
+        print(f"Migration check failed ({e}); running Alembic", file=sys.stderr)
+        return False
+
+
+def main():
+    if is_up_to_date():
+        print("Database is at head; no migrations to run")
+        return
+
+    # The CLI, as the migrations directory (alembic/) shadows the package here
+    os.chdir(BACKEND_DIR)
+    os.execvp("alembic", ["alembic", "upgrade", "head"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,38 @@
-from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, ForeignKey, Table
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Boolean, Column, Integer, BigInteger, SmallInteger, Float, String, Text, DateTime, ForeignKey, Table, Index, DDL, and_, case, event, select, text
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import foreign, relationship, validates
+from sqlalchemy.sql import func, null
 from database import Base
+from isbn import to_isbn13
+
+# Bibliographic fields shared through Edition; books only store overrides
+EDITION_FIELDS = ("title", "authors", "cover_url", "publisher", "published_year", "page_count", "description")
+# Bit of each field in books.cleared_fields: fields the owner emptied, shown empty despite the edition
+CLEARED_BITS = {name: 1 << i for i, name in enumerate(EDITION_FIELDS)}
+# Every field but the required title; a null title falls back to the edition's
+CLEARABLE_FIELDS = tuple(name for name in EDITION_FIELDS if name != "title")
+
+# Rows missing a title or cover, the candidates of the metadata refresh (see metadata_refresh.py)
+EDITION_INCOMPLETE = "title IS NULL OR cover_url IS NULL"
+BOOK_INCOMPLETE = "edition_id IS NULL AND (title IS NULL OR cover_url IS NULL)"
 
 # Association table for book tags
 book_tags = Table(
     'book_tags',
     Base.metadata,
     Column('book_id', Integer, ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
-    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # The book's owner, so the rows can be partitioned with books (see partitioning.py)
+    Column('user_id', Integer, nullable=False)
 )
 
+def _book_tags_join():
+    # Joins on user_id too, which lets PostgreSQL prune book_tags partitions
+    return and_(Book.id == foreign(book_tags.c.book_id), Book.user_id == foreign(book_tags.c.user_id))
+
+def _tag_join():
+    return Tag.id == foreign(book_tags.c.tag_id)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -28,8 +50,17 @@ class User(Base):
     show_notes_public = Column(Boolean, default=False)
     show_condition_public = Column(Boolean, default=True)
     
+    # Last delta-sync sequence number handed out for this user's books (see sync.py)
+    change_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # change_seq the similar-books index was last built at (see similarity.py)
+    similarity_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # DEFAULT NULL lets INSERT ... RETURNING include it instead of a later SELECT
+    updated_at = Column(DateTime(timezone=True), server_default=null(), onupdate=func.now())
+    
+    # Fetch server-generated timestamps with INSERT/UPDATE ... RETURNING (see database.py)
+    __mapper_args__ = {"eager_defaults": True}
     
     # Relationships
     books = relationship("Book", back_populates="owner", cascade="all, delete-orphan")
@@ -44,6 +75,8 @@ class Location(Base):
     description = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __mapper_args__ = {"eager_defaults": True}
+    
     # Relationships
     owner = relationship("User", back_populates="locations")
     books = relationship("Book", back_populates="location")
@@ -55,24 +88,109 @@ class Tag(Base):
     name = Column(String(50), unique=True, index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        # Case-insensitive prefix search (LIKE 'abc%') for tag suggestions
+        Index("ix_tags_name_prefix", func.lower(name).label("lower_name"),
+              postgresql_ops={"lower_name": "text_pattern_ops"}),
+    )
+    __mapper_args__ = {"eager_defaults": True}
+    
     # Relationships
-    books = relationship("Book", secondary=book_tags, back_populates="tags")
+    books = relationship("Book", secondary=book_tags, primaryjoin=_tag_join,
+                         secondaryjoin=_book_tags_join, back_populates="tags")
 
-class Book(Base):
-    __tablename__ = "books"
+class UserTagCount(Base):
+    """Number of a user's books carrying a tag, kept current on flush (see tag_counts.py)"""
+    __tablename__ = "user_tag_counts"
     
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True, index=True)
+    book_count = Column(Integer, nullable=False, default=0)
+
+class Edition(Base):
+    """Bibliographic metadata shared by every copy of an ISBN (see editions.py)"""
+    __tablename__ = "editions"
     
-    # Book metadata
-    isbn = Column(String(13), index=True)
-    title = Column(String(500), nullable=False, index=True)
+    id = Column(Integer, primary_key=True, index=True)
+    isbn = Column(String(13), unique=True, index=True, nullable=False)  # normalized
+    title = Column(String(500))
     authors = Column(String(500))  # JSON array as string
     cover_url = Column(String(1000))
     publisher = Column(String(255))
     published_year = Column(Integer)
     page_count = Column(Integer)
     description = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Relationships
+    books = relationship("Book", back_populates="edition")
+    
+    __table_args__ = (
+        Index("ix_editions_incomplete", "id",
+              postgresql_where=text(EDITION_INCOMPLETE), sqlite_where=text(EDITION_INCOMPLETE)),
+        # Substring title search (see editions.edition_backed_ilike)
+        Index("ix_editions_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
+def edition_backed(name):
+    """
+    Book metadata attribute: the per-user override stored in books.<name>,
+    or the edition's value when there is no override and the owner has not
+    cleared the field (Book.clear). Setting a value undoes a clear.
+    """
+    override = f"{name}_override"
+    bit = CLEARED_BITS[name]
+    
+    def fget(self):
+        value = getattr(self, override)
+        if value is None and self.edition is not None and not (self.cleared_fields or 0) & bit:
+            return getattr(self.edition, name)
+        return value
+    
+    def fset(self, value):
+        setattr(self, override, value)
+        if value is not None and (self.cleared_fields or 0) & bit:
+            self.cleared_fields &= ~bit
+    
+    def expr(cls):
+        edition_value = select(getattr(Edition, name)).where(
+            Edition.id == cls.edition_id
+        ).correlate_except(Edition).scalar_subquery()
+        return case(
+            (cls.cleared_fields.op("&")(bit) != 0, null()),
+            else_=func.coalesce(getattr(cls, override), edition_value)
+        )
+    
+    return hybrid_property(fget, fset, expr=expr)
+
+class Book(Base):
+    __tablename__ = "books"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    # Book metadata: shared edition plus per-user overrides (NULL = use the edition)
+    isbn = Column(String(20), index=True)  # as entered
+    isbn13 = Column(String(13))  # canonical, set from isbn (see isbn.py)
+    edition_id = Column(Integer, ForeignKey("editions.id", ondelete="SET NULL"), index=True)
+    title_override = Column("title", String(500), index=True)
+    authors_override = Column("authors", String(500))  # JSON array as string
+    cover_url_override = Column("cover_url", String(1000))
+    cover_cache_key = Column(String(32))  # set once the cover is cached locally, see covers.py
+    publisher_override = Column("publisher", String(255))
+    published_year_override = Column("published_year", Integer)
+    page_count_override = Column("page_count", Integer)
+    description_override = Column("description", Text)
+    
+    title = edition_backed("title")
+    authors = edition_backed("authors")
+    cover_url = edition_backed("cover_url")
+    publisher = edition_backed("publisher")
+    published_year = edition_backed("published_year")
+    page_count = edition_backed("page_count")
+    description = edition_backed("description")
     
     # User data
     location_id = Column(Integer, ForeignKey("locations.id", ondelete="SET NULL"))
@@ -83,9 +201,97 @@ class Book(Base):
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=null(), onupdate=func.now())
+    
+    # Delta sync: per-user sequence number of the last change (see sync.py)
+    change_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Last Open Library lookup for this book; NULL = never (see metadata_refresh.py)
+    metadata_fetched_at = Column(DateTime(timezone=True))
+    # Edition-backed fields the owner cleared (CLEARED_BITS)
+    cleared_fields = Column(SmallInteger, nullable=False, default=0, server_default="0")
+    
+    __table_args__ = (
+        Index("ix_books_user_change_seq", "user_id", "change_seq"),
+        Index("ux_books_user_isbn13", "user_id", "isbn13", unique=True),
+        # Refresh order of books without an edition, partial so complete books are not in it;
+        # SQLite sorts NULLs first by default and rejects NULLS FIRST in indexes
+        Index("ix_books_metadata_incomplete", "metadata_fetched_at",
+              postgresql_ops={"metadata_fetched_at": "NULLS FIRST"},
+              postgresql_where=text(BOOK_INCOMPLETE), sqlite_where=text(BOOK_INCOMPLETE)),
+        Index("ix_books_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+    # UPDATE/DELETE statements name the owner as well, so PostgreSQL can prune
+    # partitions when books is hash-partitioned by user_id (see partitioning.py)
+    __mapper_args__ = {"eager_defaults": True, "primary_key": [id, user_id]}
     
     # Relationships
     owner = relationship("User", back_populates="books")
+    edition = relationship("Edition", back_populates="books", lazy="selectin")
     location = relationship("Location", back_populates="books")
-    tags = relationship("Tag", secondary=book_tags, back_populates="books")
+    tags = relationship("Tag", secondary=book_tags, primaryjoin=_book_tags_join,
+                        secondaryjoin=_tag_join, back_populates="books")
+
+    @validates("isbn")
+    def _set_isbn13(self, key, value):
+        self.isbn13 = to_isbn13(value)
+        return value
+
+    def clear(self, name: str):
+        """Empty an edition-backed field, also when the edition has a value"""
+        setattr(self, f"{name}_override", None)
+        self.cleared_fields = (self.cleared_fields or 0) | CLEARED_BITS[name]
+
+    @property
+    def cover_thumb_url(self):
+        """Locally cached medium WebP thumbnail (small.webp sits next to it)"""
+        if not self.cover_cache_key:
+            return None
+        return f"/uploads/covers/{self.cover_cache_key}/medium.webp"
+
+class BookTombstone(Base):
+    """Marks a deleted book for delta-sync clients"""
+    __tablename__ = "book_tombstones"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    book_id = Column(Integer, nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_book_tombstones_user_change_seq", "user_id", "change_seq"),
+    )
+
+class BookBand(Base):
+    """LSH band of a book's title/authors MinHash signature (see duplicates.py)"""
+    __tablename__ = "book_lsh_bands"
+    
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    band = Column(SmallInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    bucket = Column(BigInteger, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_book_lsh_bands_lookup", "user_id", "bucket"),
+    )
+
+class BookSimilarity(Base):
+    """Precomputed neighbour of a book in its owner's library (see similarity.py)"""
+    __tablename__ = "book_similarities"
+    
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    # Indexed for the ON DELETE CASCADE lookups
+    similar_book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)  # owner of both books, the partition key
+    score = Column(Float, nullable=False)  # cosine similarity, 0..1
+    
+    __table_args__ = (
+        Index("ix_book_similarities_book_score", "book_id", "score"),
+    )
+
+# The trigram indexes need pg_trgm (migration 012 creates it for migrated databases)
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
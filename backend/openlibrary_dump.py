@@ -0,0 +1,250 @@
+"""
+Load Open Library data dumps into the local edition catalog.
+
+The monthly dumps (https://openlibrary.org/developers/dumps) are gzipped
+TSV files with one record per line: type, key, revision, last_modified and
+the record as JSON. Files are streamed line by line; author names and work
+data are staged in temporary tables on the loading connection, so memory use
+does not grow with the dump size. Every valid ISBN of an edition becomes an
+`editions` row keyed by its ISBN-13 (see editions.py), which the ISBN lookup
+and CSV import check before calling openlibrary.org. Existing editions only
+get their empty fields filled, as with lookup results.
+
+Usage:
+    python openlibrary_dump.py --authors ol_dump_authors_latest.txt.gz \\
+        --works ol_dump_works_latest.txt.gz --editions ol_dump_editions_latest.txt.gz
+
+--authors and --works are optional; without them editions only get the
+author names and descriptions stored on the edition record itself.
+"""
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+import argparse
+import gzip
+import json
+import sys
+
+import orjson
+from sqlalchemy import Column, MetaData, String, Table, Text, bindparam, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from database import engine
+from isbn import to_isbn13
+from models import Edition, EDITION_FIELDS
+from services import OpenLibraryService, openlibrary_service
+
+BATCH_SIZE = 5000
+# Size of editions.authors
+AUTHORS_MAX_LENGTH = 500
+
+# Staging tables, private to the loading connection
+_staging = MetaData()
+dump_authors = Table(
+    "ol_dump_authors", _staging,
+    Column("key", String(64), primary_key=True),
+    Column("name", String(500)),
+    prefixes=["TEMPORARY"],
+)
+dump_works = Table(
+    "ol_dump_works", _staging,
+    Column("key", String(64), primary_key=True),
+    Column("author_keys", Text),  # JSON array of author keys
+    Column("description", Text),
+    prefixes=["TEMPORARY"],
+)
+
+
+def read_dump(path: str, record_type: str) -> Iterator[Dict]:
+    """Records of one type from a (gzipped) dump file"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t", 4)
+            if len(parts) == 5 and parts[0] == record_type:
+                yield orjson.loads(parts[4])
+
+
+def batched(records: Iterable, size: int = BATCH_SIZE) -> Iterator[List]:
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert_new(conn: Connection, table: Table):
+    """INSERT that skips rows whose key already exists"""
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+def _progress(label: str, count: int):
+    print(f"\r{label}: {count}", end="", file=sys.stderr, flush=True)
+
+
+def load_authors(conn: Connection, path: str) -> int:
+    count = 0
+    for batch in batched(read_dump(path, "/type/author")):
+        conn.execute(_insert_new(conn, dump_authors), [
+            {"key": record["key"], "name": (record.get("name") or "")[:500] or None}
+            for record in batch
+        ])
+        count += len(batch)
+        _progress("authors", count)
+    print(file=sys.stderr)
+    return count
+
+
+def load_works(conn: Connection, path: str) -> int:
+    count = 0
+    for batch in batched(read_dump(path, "/type/work")):
+        conn.execute(_insert_new(conn, dump_works), [
+            {
+                "key": record["key"],
+                "author_keys": json.dumps([
+                    entry["author"]["key"] for entry in record.get("authors", [])
+                    if isinstance(entry.get("author"), dict) and "key" in entry["author"]
+                ]),
+                "description": openlibrary_service._extract_description(record),
+            }
+            for record in batch
+        ])
+        count += len(batch)
+        _progress("works", count)
+    print(file=sys.stderr)
+    return count
+
+
+def _isbns(record: Dict) -> List[str]:
+    isbns = []
+    for raw in record.get("isbn_13", []) + record.get("isbn_10", []):
+        isbn = to_isbn13(raw) if isinstance(raw, str) else None
+        if isbn and isbn not in isbns:
+            isbns.append(isbn)
+    return isbns
+
+
+def authors_json(names: List[str]) -> Optional[str]:
+    """Author names as a JSON array that fits editions.authors, dropping names from the end"""
+    while names:
+        value = json.dumps(names)
+        if len(value) <= AUTHORS_MAX_LENGTH:
+            return value
+        names = names[:-1]
+    return None
+
+
+def _edition_rows(conn: Connection, batch: List[Dict]) -> Dict[str, Dict]:
+    """Catalog rows keyed by ISBN, with author names and work data resolved"""
+    work_keys = {
+        record["works"][0]["key"] for record in batch
+        if record.get("works") and "key" in record["works"][0]
+    }
+    works = {
+        row.key: row for row in conn.execute(
+            select(dump_works).where(dump_works.c.key.in_(work_keys))
+        )
+    } if work_keys else {}
+
+    def work_of(record: Dict):
+        return works.get(record["works"][0].get("key")) if record.get("works") else None
+
+    def author_keys(record: Dict) -> List[str]:
+        keys = [entry["key"] for entry in record.get("authors", []) if "key" in entry]
+        work = work_of(record)
+        if not keys and work is not None:
+            keys = json.loads(work.author_keys)
+        return keys
+
+    wanted = {key for record in batch for key in author_keys(record)}
+    names = dict(conn.execute(
+        select(dump_authors.c.key, dump_authors.c.name).where(dump_authors.c.key.in_(wanted))
+    ).all()) if wanted else {}
+
+    rows = {}
+    for record in batch:
+        isbns = _isbns(record)
+        if not isbns:
+            continue
+        work = work_of(record)
+        authors = [names[key] for key in author_keys(record) if names.get(key)]
+        cover_ids = [cover for cover in record.get("covers", []) if isinstance(cover, int) and cover > 0]
+        values = {
+            "title": (record.get("title") or "")[:500] or None,
+            "authors": authors_json(authors),
+            "cover_url": f"{OpenLibraryService.BASE_URL}/covers/id/{cover_ids[0]}-L.jpg" if cover_ids else None,
+            "publisher": (record.get("publishers") or [None])[0],
+            "published_year": openlibrary_service._extract_year(record.get("publish_date")),
+            "page_count": record.get("number_of_pages") if isinstance(record.get("number_of_pages"), int) else None,
+            "description": openlibrary_service._extract_description(record),
+        }
+        if values["description"] is None and work is not None:
+            values["description"] = work.description
+        if values["publisher"]:
+            values["publisher"] = str(values["publisher"])[:255]
+        for isbn in isbns:
+            rows.setdefault(isbn, {"isbn": isbn, **values})
+    return rows
+
+
+def load_editions(conn: Connection, path: str) -> Dict[str, int]:
+    editions = Edition.__table__
+    fill_empty = update(editions).where(editions.c.isbn == bindparam("b_isbn")).values({
+        name: func.coalesce(editions.c[name], bindparam(f"b_{name}")) for name in EDITION_FIELDS
+    })
+    counts = {"records": 0, "inserted": 0, "updated": 0}
+    for batch in batched(read_dump(path, "/type/edition")):
+        rows = _edition_rows(conn, batch)
+        existing = set(conn.execute(
+            select(editions.c.isbn).where(editions.c.isbn.in_(list(rows)))
+        ).scalars()) if rows else set()
+        new = [row for isbn, row in rows.items() if isbn not in existing]
+        if new:
+            # Lookups running meanwhile may add the same ISBN
+            conn.execute(_insert_new(conn, editions), new)
+        if existing:
+            conn.execute(fill_empty, [
+                {f"b_{name}": value for name, value in rows[isbn].items()} for isbn in existing
+            ])
+        conn.commit()
+        counts["records"] += len(batch)
+        counts["inserted"] += len(new)
+        counts["updated"] += len(existing)
+        _progress("editions", counts["records"])
+    print(file=sys.stderr)
+    return counts
+
+
+def ingest(conn: Connection, editions_path: str, authors_path: Optional[str] = None,
+           works_path: Optional[str] = None) -> Dict[str, int]:
+    """Load dump files through one connection (the staging tables live on it)"""
+    _staging.create_all(conn)
+    try:
+        if authors_path:
+            load_authors(conn, authors_path)
+        if works_path:
+            load_works(conn, works_path)
+        conn.commit()
+        return load_editions(conn, editions_path)
+    finally:
+        _staging.drop_all(conn)
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--editions", required=True, help="editions dump (.txt or .txt.gz)")
+    parser.add_argument("--authors", help="authors dump, for author names")
+    parser.add_argument("--works", help="works dump, for authors and descriptions editions lack")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        counts = ingest(conn, args.editions, args.authors, args.works)
+    print(f"{counts['records']} edition records: {counts['inserted']} ISBNs added, "
+          f"{counts['updated']} already in the catalog")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Optional hash partitioning of the books tables by user (PostgreSQL).
+
+books and the tables hanging off it (book_tags, book_lsh_bands,
+book_similarities) all carry user_id and can be split into N hash
+partitions on it, so a big library's rows and indexes no longer deepen every
+other library's indexes, and vacuum/analyze work on one partition at a time.
+Every query on these tables names the user (the Book mapper's primary key
+includes user_id, the tags relationship joins on it), so the planner prunes
+to a single partition.
+
+Partitioned tables need the partition key in primary keys and in the foreign
+keys between them: books is keyed by (id, user_id) and the other tables
+reference it with (book_id, user_id). Book ids still come from one sequence.
+
+Converting rebuilds the tables and moves all rows in one transaction; the
+tables are locked meanwhile, so plan a maintenance window for big installs:
+
+    python partitioning.py                   # current layout
+    python partitioning.py --partitions 16   # partition, or change the count
+    python partitioning.py --partitions 0    # back to plain tables
+
+Migration 010 partitions at upgrade time when BOOKS_HASH_PARTITIONS is set.
+"""
+from typing import Dict, List, Tuple
+import argparse
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# Tables converted together, books first, with their primary key without user_id
+TABLES: Dict[str, Tuple[str, ...]] = {
+    "books": ("id",),
+    "book_tags": ("book_id", "tag_id"),
+    "book_lsh_bands": ("book_id", "band"),
+    "book_similarities": ("book_id", "similar_book_id"),
+}
+
+_FOREIGN_KEY = re.compile(r"FOREIGN KEY \((?P<columns>[^)]*)\) REFERENCES (?P<target>[^(]+)\((?P<target_columns>[^)]*)\)(?P<rest>.*)")
+
+
+def partition_count(conn: Connection) -> int:
+    """Hash partitions of books; 0 for a plain table"""
+    return conn.execute(text("SELECT count(*) FROM pg_inherits WHERE inhparent = 'books'::regclass")).scalar()
+
+
+def _indexes(conn: Connection, table: str) -> List[str]:
+    """CREATE INDEX statements of a table, without those backing constraints"""
+    statements = conn.execute(text("""
+        SELECT indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = :table
+          AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass))
+    """), {"table": table}).scalars().all()
+    # Indexes of a partitioned table print as ON ONLY, which would skip the partitions
+    return [statement.replace(" ON ONLY ", " ON ", 1) for statement in statements]
+
+
+def _constraints(conn: Connection, table: str) -> List[Tuple[str, str]]:
+    """(name, definition) of a table's foreign key and unique constraints"""
+    return conn.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = CAST(:table AS regclass) AND contype IN ('f', 'u')
+    """), {"table": table}).all()
+
+
+def _with_key(columns: str, partitioned: bool) -> str:
+    names = [name.strip() for name in columns.split(",") if name.strip() != "user_id"]
+    return ", ".join(names + ["user_id"] if partitioned else names)
+
+
+def _constraint_sql(definition: str, partitioned: bool) -> str:
+    """Foreign keys into books get user_id added (or removed); the rest stay as they were"""
+    match = _FOREIGN_KEY.fullmatch(definition)
+    if match is None or match["target"].split(".")[-1] not in TABLES:
+        return definition
+    return (
+        f"FOREIGN KEY ({_with_key(match['columns'], partitioned)}) "
+        f"REFERENCES {match['target']}({_with_key(match['target_columns'], partitioned)}){match['rest']}"
+    )
+
+
+def rebuild(conn: Connection, partitions: int):
+    """Recreate the tables with the given number of hash partitions (0 = plain tables) and move the rows"""
+    if conn.dialect.name != "postgresql":
+        raise RuntimeError("Partitioning needs PostgreSQL")
+    if partitions < 0:
+        raise ValueError("The number of partitions cannot be negative")
+    partitioned = partitions > 0
+
+    # Definitions print table names, so they are read before the renames
+    indexes = {table: _indexes(conn, table) for table in TABLES}
+    constraints = {table: _constraints(conn, table) for table in TABLES}
+
+    for table in TABLES:
+        children = conn.execute(
+            text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = CAST(:table AS regclass)"),
+            {"table": table}
+        ).scalars().all()
+        for child in children:
+            conn.execute(text(f"ALTER TABLE {child} RENAME TO {child}_old"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_old"))
+
+    for table in TABLES:
+        conn.execute(text(
+            f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            + (" PARTITION BY HASH (user_id)" if partitioned else "")
+        ))
+        for remainder in range(partitions):
+            conn.execute(text(
+                f"CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            ))
+        # Serial columns keep their sequence, which would be dropped with the old table
+        serials = conn.execute(text("""
+            SELECT attname, pg_get_serial_sequence(:table, attname) FROM pg_attribute
+            WHERE attrelid = CAST(:table AS regclass) AND attnum > 0 AND NOT attisdropped
+        """), {"table": f"{table}_old"}).all()
+        for column, sequence in serials:
+            if sequence is not None:
+                conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{column}"))
+        conn.execute(text(f"INSERT INTO {table} SELECT * FROM {table}_old"))
+
+    for table in reversed(list(TABLES)):
+        conn.execute(text(f"DROP TABLE {table}_old"))
+
+    # Keys and indexes are built once the rows are in, which is faster than maintaining them row by row
+    for table, primary_key in TABLES.items():
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({_with_key(', '.join(primary_key), partitioned)})"
+        ))
+        for statement in indexes[table]:
+            conn.execute(text(statement))
+    for table in TABLES:
+        for name, definition in constraints[table]:
+            conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {_constraint_sql(definition, partitioned)}"))
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partitions", type=int, help="hash partitions per table; 0 = plain tables")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        current = partition_count(conn)
+        if args.partitions is not None and args.partitions != current:
+            rebuild(conn, args.partitions)
+            current = args.partitions
+    print(f"books: {current} hash partitions" if current else "books: not partitioned")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Opt-in per-request SQL profiling.
+
+Enabled for every request with SQL_PROFILING=1, or for a single request by
+sending the header ``X-SQL-Profile: <SQL_PROFILING_TOKEN>``. Profiled
+responses carry a ``Server-Timing`` header; slow statements and repeated
+statements (N+1 patterns) are written to the ``sql.profile`` logger.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("sql.profile")
+
+PROFILING_ENABLED = os.getenv("SQL_PROFILING", "0") == "1"
+PROFILING_TOKEN = os.getenv("SQL_PROFILING_TOKEN")
+PROFILING_HEADER = "X-SQL-Profile"
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class QueryRecord:
+    statement: str
+    duration_ms: float
+    caller: Optional[str]
+    param_count: int
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    path: str
+    queries: List[QueryRecord] = field(default_factory=list)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(q.duration_ms for q in self.queries)
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+
+def _find_caller() -> Optional[str]:
+    """Return the first router function on the stack, e.g. 'routers.stats.get_library_stats'"""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("routers."):
+            return f"{module}.{frame.f_code.co_name}"
+        if fallback is None and module in ("auth", "main", "services"):
+            fallback = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return fallback
+
+
+def _count_params(parameters) -> int:
+    if isinstance(parameters, dict):
+        return len(parameters)
+    if isinstance(parameters, (list, tuple)):
+        return len(parameters)
+    return 0
+
+
+def _normalize(statement: str) -> str:
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is None or not conn.info.get("query_start"):
+        return
+    duration_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    profile.queries.append(QueryRecord(
+        statement=_normalize(statement),
+        duration_ms=duration_ms,
+        caller=_find_caller(),
+        param_count=_count_params(parameters),
+    ))
+
+
+def install_engine_hooks(engine: Engine) -> None:
+    """Attach the cursor execute listeners to an engine"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def server_timing(profile: RequestProfile) -> str:
+    """Build a Server-Timing header value: one total entry plus one per caller"""
+    entries = [f'db;dur={profile.total_ms:.2f};desc="{len(profile.queries)} queries"']
+    by_caller = {}
+    for query in profile.queries:
+        count, total = by_caller.get(query.caller, (0, 0.0))
+        by_caller[query.caller] = (count + 1, total + query.duration_ms)
+    for index, (caller, (count, total)) in enumerate(by_caller.items()):
+        entries.append(f'db{index};dur={total:.2f};desc="{caller} x{count}"')
+    return ", ".join(entries)
+
+
+def report(profile: RequestProfile) -> None:
+    """Log slow statements and N+1 patterns. Parameter values are never logged."""
+    for query in profile.queries:
+        if query.duration_ms >= SLOW_QUERY_MS:
+            logger.warning(json.dumps({
+                "event": "slow_query",
+                "method": profile.method,
+                "path": profile.path,
+                "caller": query.caller,
+                "duration_ms": round(query.duration_ms, 2),
+                "statement": query.statement,
+                "params": "<redacted>" if query.param_count else None,
+                "param_count": query.param_count,
+            }))
+
+    repeats = {}
+    for query in profile.queries:
+        key = (query.caller, query.statement)
+        repeats[key] = repeats.get(key, 0) + 1
+    for (caller, statement), count in repeats.items():
+        if count > N_PLUS_ONE_THRESHOLD:
+            logger.warning(json.dumps({
+                "event": "n_plus_one",
+                "method": profile.method,
+                "path": profile.path,
+                "caller": caller,
+                "count": count,
+                "statement": statement,
+            }))
+
+
+def _is_requested(request) -> bool:
+    if PROFILING_ENABLED:
+        return True
+    token = request.headers.get(PROFILING_HEADER)
+    return bool(PROFILING_TOKEN and token) and secrets.compare_digest(token, PROFILING_TOKEN)
+
+
+def setup_sql_profiling(app, *engines: Engine) -> None:
+    """Register the engine hooks and the profiling middleware on the app"""
+    if not PROFILING_ENABLED and not PROFILING_TOKEN:
+        return
+
+    for engine in engines:
+        if engine is not None:
+            install_engine_hooks(engine)
+
+    @app.middleware("http")
+    async def sql_profiling_middleware(request, call_next):
+        if not _is_requested(request):
+            return await call_next(request)
+
+        profile = RequestProfile(method=request.method, path=request.url.path)
+        reset_token = _current_profile.set(profile)
+        try:
+            response = await call_next(request)
+        finally:
+            _current_profile.reset(reset_token)
+
+        # Statements issued outside a router frame are lazy loads during response
+        # serialization; attribute them to the matched endpoint.
+        endpoint = request.scope.get("endpoint")
+        if endpoint is not None:
+            serializer = f"{endpoint.__module__}.{endpoint.__name__}:serialize"
+            for query in profile.queries:
+                if query.caller is None:
+                    query.caller = serializer
+
+        response.headers["Server-Timing"] = server_timing(profile)
+        report(profile)
+        return response
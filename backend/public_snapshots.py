@@ -0,0 +1,291 @@
+"""
+Static snapshots of public libraries.
+
+With PUBLIC_SNAPSHOT_DIR set, every public library is rendered to files:
+
+    {username}/library.json      GET /api/public/library/{username}
+    {username}/stats.json        GET /api/public/library/{username}/stats
+    {username}/books/{n}.json    GET .../books?fields=full&skip={n * PAGE_SIZE}&limit={PAGE_SIZE}
+    {username}/index.html        the library page, first page inlined
+
+The directory is mounted at /library (so the share link /library/{username}
+works) and can be served by a front proxy instead, taking anonymous traffic
+off the application and the database. Hidden fields (show_tags_public,
+show_notes_public, show_condition_public) are blanked exactly as in the API.
+
+A library is re-rendered in a background thread a few seconds after a commit
+that changed its books or its owner's profile or sharing settings (several
+commits in a row cause one render); a library made private loses its
+snapshot. Files are replaced atomically, one at a time. Changes to shared
+editions (see editions.py) and bulk loads that bypass the ORM are picked up
+by the next render or by `python public_snapshots.py`.
+
+Usage:
+    python public_snapshots.py [--user-id ID]
+"""
+from typing import Dict, List
+import argparse
+import html
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+
+import orjson
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from fieldsets import load_options
+from models import User, Book
+from routers.public import hidden_fields, public_books_query, public_library_stats, serialize_public_books
+from schemas import BookPublic, UserPublic
+
+SNAPSHOT_DIR = os.getenv("PUBLIC_SNAPSHOT_DIR")
+# Seconds to wait after a change before rendering; negative disables
+SNAPSHOT_DELAY = float(os.getenv("PUBLIC_SNAPSHOT_DELAY", "5"))
+PAGE_SIZE = 100
+URL_PREFIX = "/library"
+
+# User attributes that show up in a snapshot
+_PROFILE_ATTRIBUTES = (
+    "display_name", "avatar_url", "bio", "is_library_public",
+    "show_tags_public", "show_notes_public", "show_condition_public",
+)
+_ALL_FIELDS = frozenset(BookPublic.model_fields)
+
+logger = logging.getLogger(__name__)
+
+
+def _write(path: str, content: bytes):
+    """Replace a file atomically, so readers never see a partial one"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _library_dir(username: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, username)
+
+
+def remove_snapshot(username: str):
+    shutil.rmtree(_library_dir(username), ignore_errors=True)
+
+
+def publish(db: Session, user_id: int) -> bool:
+    """Render a user's public library, or remove it if private. Returns whether one was written."""
+    user = db.get(User, user_id)
+    if user is None:
+        return False
+    if not user.is_library_public:
+        remove_snapshot(user.username)
+        return False
+
+    library_dir = _library_dir(user.username)
+    hidden = hidden_fields(user)
+    info = UserPublic.model_validate(user)
+    stats = public_library_stats(db, user)
+    query = public_books_query(db, user).options(*load_options(_ALL_FIELDS - hidden))
+
+    pages = max(1, math.ceil(stats.total_books / PAGE_SIZE))
+    first_page: List[Dict] = []
+    for page in range(pages):
+        books = serialize_public_books(
+            query.offset(page * PAGE_SIZE).limit(PAGE_SIZE).all(), _ALL_FIELDS, hidden
+        )
+        if page == 0:
+            first_page = books
+        _write(os.path.join(library_dir, "books", f"{page}.json"), orjson.dumps(books))
+
+    # Pages beyond the current count are from a bigger library
+    for name in os.listdir(os.path.join(library_dir, "books")):
+        stem, ext = os.path.splitext(name)
+        if ext == ".json" and stem.isdigit() and int(stem) >= pages:
+            os.unlink(os.path.join(library_dir, "books", name))
+
+    _write(os.path.join(library_dir, "stats.json"), stats.model_dump_json().encode())
+    _write(os.path.join(library_dir, "library.json"), info.model_dump_json().encode())
+    _write(os.path.join(library_dir, "index.html"), render_page(info, stats.total_books, pages, first_page).encode())
+    return True
+
+
+def _book_item(book: Dict) -> str:
+    authors = book.get("authors") or ""
+    try:
+        names = orjson.loads(authors) if authors else []
+        if isinstance(names, list):
+            authors = ", ".join(str(name) for name in names)
+    except orjson.JSONDecodeError:
+        pass
+    cover = book.get("cover_thumb_url") or book.get("cover_url")
+    details = [
+        f'<p class="text-xs text-blue-400 mt-2">{html.escape(", ".join(tag["name"] for tag in book["tags"]))}</p>'
+        if book.get("tags") else "",
+        f'<p class="text-xs text-gray-400 mt-1">Zustand: {html.escape(book["condition"])}</p>'
+        if book.get("condition") else "",
+        f'<p class="text-xs text-gray-400 mt-1">{html.escape(book["notes"])}</p>' if book.get("notes") else "",
+    ]
+    return (
+        '<li class="bg-gray-800 rounded-lg p-4 flex gap-4">'
+        + (f'<img src="{html.escape(cover)}" alt="" loading="lazy" class="w-16 h-24 object-cover rounded">' if cover else "")
+        + '<div>'
+        + ('<i class="fas fa-thumbtack text-yellow-400 mr-1"></i>' if book.get("is_pinned") else "")
+        + f'<span class="font-semibold">{html.escape(book.get("title") or "")}</span>'
+        + f'<p class="text-sm text-gray-400">{html.escape(authors)}</p>'
+        + "".join(details)
+        + '</div></li>'
+    )
+
+
+def render_page(info: UserPublic, total_books: int, pages: int, first_page: List[Dict]) -> str:
+    """HTML page of a library; further pages are fetched from books/{n}.json"""
+    name = html.escape(info.display_name or info.username)
+    bio = f'<p class="text-gray-400 mt-2">{html.escape(info.bio)}</p>' if info.bio else ""
+    items = "\n".join(_book_item(book) for book in first_page)
+    more = "" if pages < 2 else f"""
+    <button id="more" class="mt-6 w-full bg-gray-700 hover:bg-gray-600 py-2 rounded-lg">Mehr laden</button>
+    <script>
+        // Later pages are rendered from the JSON snapshot with the same markup
+        let page = 1;
+        const pages = {pages};
+        const escapes = {{'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'}};
+        const text = value => String(value ?? '').replace(/[&<>"']/g, c => escapes[c]);
+        document.getElementById('more').onclick = async () => {{
+            const books = await (await fetch(`books/${{page}}.json`)).json();
+            document.getElementById('books').insertAdjacentHTML('beforeend', books.map(book => {{
+                let authors = book.authors || '';
+                try {{ const names = JSON.parse(authors); if (Array.isArray(names)) authors = names.join(', '); }} catch (e) {{}}
+                const cover = book.cover_thumb_url || book.cover_url;
+                return `<li class="bg-gray-800 rounded-lg p-4 flex gap-4">`
+                    + (cover ? `<img src="${{text(cover)}}" alt="" loading="lazy" class="w-16 h-24 object-cover rounded">` : '')
+                    + `<div>` + (book.is_pinned ? '<i class="fas fa-thumbtack text-yellow-400 mr-1"></i>' : '')
+                    + `<span class="font-semibold">${{text(book.title)}}</span>`
+                    + `<p class="text-sm text-gray-400">${{text(authors)}}</p>`
+                    + (book.tags && book.tags.length ? `<p class="text-xs text-blue-400 mt-2">${{text(book.tags.map(t => t.name).join(', '))}}</p>` : '')
+                    + (book.condition ? `<p class="text-xs text-gray-400 mt-1">Zustand: ${{text(book.condition)}}</p>` : '')
+                    + (book.notes ? `<p class="text-xs text-gray-400 mt-1">${{text(book.notes)}}</p>` : '')
+                    + `</div></li>`;
+            }}).join(''));
+            page += 1;
+            if (page >= pages) document.getElementById('more').remove();
+        }};
+    </script>"""
+    return f"""<!DOCTYPE html>
+<html lang="de" class="dark">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{name} - MyLibrary</title>
+    <meta name="description" content="Die Bibliothek von {name} ({total_books} Bücher)">
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css">
+</head>
+<body class="bg-gray-900 text-gray-100">
+    <main class="max-w-3xl mx-auto p-6">
+        <h1 class="text-3xl font-bold"><i class="fas fa-book mr-2"></i>{name}</h1>
+        {bio}
+        <p class="text-sm text-gray-500 mt-2">{total_books} Bücher</p>
+        <ul id="books" class="mt-6 space-y-3">
+{items}
+        </ul>{more}
+    </main>
+</body>
+</html>
+"""
+
+
+class SnapshotPublisher:
+    """Debounced per-library renders on daemon timer threads"""
+
+    def __init__(self, delay: float = SNAPSHOT_DELAY):
+        self.delay = delay
+        self._timers: Dict[int, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, user_id: int):
+        if not SNAPSHOT_DIR or self.delay < 0:
+            return
+        with self._lock:
+            pending = self._timers.get(user_id)
+            if pending is not None:
+                pending.cancel()
+            timer = threading.Timer(self.delay, self._run, (user_id,))
+            timer.daemon = True
+            self._timers[user_id] = timer
+            timer.start()
+
+    def _run(self, user_id: int):
+        with self._lock:
+            if self._timers.get(user_id) is threading.current_thread():
+                del self._timers[user_id]
+        try:
+            with SessionLocal() as db:
+                publish(db, user_id)
+        except Exception as e:
+            logger.error(f"Error publishing the library of user {user_id}: {e}")
+
+
+# Singleton instance
+snapshot_publisher = SnapshotPublisher()
+
+
+def _profile_changed(user: User) -> bool:
+    state = inspect(user)
+    return any(state.attrs[name].history.has_changes() for name in _PROFILE_ATTRIBUTES)
+
+
+@event.listens_for(Session, "before_flush")
+def collect_snapshot_changes(session, flush_context, instances):
+    if not SNAPSHOT_DIR:
+        return
+    users = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Book):
+            users.add(obj.user_id)
+    for obj in session.dirty:
+        if isinstance(obj, Book) and session.is_modified(obj):
+            users.add(obj.user_id)
+        elif isinstance(obj, User) and _profile_changed(obj):
+            users.add(obj.id)
+    if users:
+        session.info.setdefault("snapshot_users", set()).update(users)
+
+
+@event.listens_for(Session, "after_commit")
+def schedule_snapshots(session):
+    for user_id in session.info.pop("snapshot_users", ()):
+        snapshot_publisher.schedule(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_snapshot_changes(session):
+    session.info.pop("snapshot_users", None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, help="only this library")
+    args = parser.parse_args()
+    if not SNAPSHOT_DIR:
+        parser.error("PUBLIC_SNAPSHOT_DIR is not set")
+
+    with SessionLocal() as db:
+        query = db.query(User.id).order_by(User.id)
+        if args.user_id is not None:
+            query = query.filter(User.id == args.user_id)
+        user_ids = [user_id for (user_id,) in query]
+        published = sum(publish(db, user_id) for user_id in user_ids)
+    print(f"Published {published} of {len(user_ids)} libraries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Rate limiting and admission control.
+
+Token buckets keyed per client IP and, when the request carries a valid
+token, per user. Buckets live in process memory by default; with
+RATE_LIMIT_REDIS_URL they are kept in Redis so all workers share them (any
+client object with a redis-py compatible ``eval`` works, e.g. a fake in
+tests). Over-limit requests fail fast with 429 and a Retry-After header.
+
+AdmissionControl caps the number of in-flight requests of a route group and
+rejects the excess immediately instead of letting it queue for worker
+threads and database connections.
+"""
+from collections import OrderedDict
+from typing import Optional, Tuple
+import logging
+import math
+import os
+import threading
+import time
+
+from fastapi import HTTPException, Request, status
+
+from auth import SECRET_KEY, ALGORITHM
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+# Only behind trusted reverse proxies (Traefik): the client IP is the X-Forwarded-For
+# entry appended by the outermost of TRUSTED_HOPS proxies; entries left of it are client input
+TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+TRUSTED_HOPS = max(1, int(os.getenv("RATE_LIMIT_TRUSTED_HOPS", "1")))
+
+
+class MemoryBackend:
+    """Token buckets in a dict; per process, least recently used evicted beyond MAX_KEYS"""
+    MAX_KEYS = 100_000
+
+    def __init__(self):
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, wait = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, wait = False, (1 - tokens) / rate
+            self._buckets.move_to_end(key)
+            # The longest unused bucket, the one most likely to have refilled anyway
+            if len(self._buckets) > self.MAX_KEYS:
+                self._buckets.popitem(last=False)
+        return allowed, wait
+
+
+class RedisBackend:
+    """Token buckets in Redis, updated atomically by a Lua script"""
+    SCRIPT = """
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        allowed, wait = self.client.eval(
+            self.SCRIPT, 1, f"ratelimit:{key}", rate, burst, time.time()
+        )
+        return bool(int(allowed)), float(wait)
+
+
+def create_backend():
+    if RATE_LIMIT_REDIS_URL:
+        try:
+            import redis
+        except ImportError:  # only needed with RATE_LIMIT_REDIS_URL
+            logger.error("RATE_LIMIT_REDIS_URL is set but redis is not installed; using memory backend")
+        else:
+            return RedisBackend(redis.Redis.from_url(RATE_LIMIT_REDIS_URL))
+    return MemoryBackend()
+
+
+backend = create_backend()
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_HOPS:
+            return hops[-TRUSTED_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def token_user_id(request: Request) -> Optional[str]:
+    """User id from a valid bearer token, without touching the database"""
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    user_id = payload.get("sub")
+    return str(user_id) if user_id is not None else None
+
+
+def too_many_requests(retry_after: float, detail: str = "Too many requests") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class RateLimit:
+    """
+    Dependency enforcing a token bucket of `per_minute` requests (bursts up
+    to `burst`) per client IP, plus one per authenticated user.
+    """
+
+    def __init__(self, name: str, per_minute: int, burst: Optional[int] = None):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst or max(1, per_minute // 2)
+
+    def __call__(self, request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        keys = [f"{self.name}:ip:{client_ip(request)}"]
+        user_id = token_user_id(request)
+        if user_id is not None:
+            keys.append(f"{self.name}:user:{user_id}")
+        for key in keys:
+            allowed, wait = backend.take(key, self.rate, self.burst)
+            if not allowed:
+                raise too_many_requests(wait)
+
+
+class AdmissionControl:
+    """Dependency capping concurrent requests; the excess is rejected at once"""
+
+    def __init__(self, name: str, max_concurrent: int, retry_after: int = 1):
+        self.name = name
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def __call__(self):
+        if not self._slots.acquire(blocking=False):
+            logger.warning(f"Shedding load on {self.name}: concurrency limit reached")
+            raise too_many_requests(self.retry_after, "Server busy, please retry")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+lookup_rate_limit = RateLimit("isbn-lookup", int(os.getenv("RATE_LIMIT_LOOKUP_PER_MINUTE", "30")))
+public_rate_limit = RateLimit("public", int(os.getenv("RATE_LIMIT_PUBLIC_PER_MINUTE", "120")))
+public_admission = AdmissionControl("public", int(os.getenv("PUBLIC_MAX_CONCURRENCY", "8")))
@@ -1,23 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import or_, func
-from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Union
+import asyncio
 import json
 import csv
 import io
+import math
 
-from database import get_db
-from models import User, Book, Tag, Location
+from database import SessionLocal, get_db, get_read_db, read_session
+from models import User, Book, Tag, Location, CLEARABLE_FIELDS
 from schemas import (
-    BookCreate, BookUpdate, BookResponse, ISBNLookupResponse,
-    CSVImportProgress
+    BookCreate, BookUpdate, BookResponse, BookChanges, BookFacetPage, DuplicateGroup,
+    ISBNLookupResponse, CSVImportProgress
 )
 from auth import get_current_user
-from services import openlibrary_service
+from services import openlibrary_service, OpenLibraryBusy, OpenLibraryUnavailable
+from csv_import import read_rows, import_csv, start_import, sse_events
+from ratelimit import lookup_rate_limit, too_many_requests
+from covers import cover_cache
+from serialization import json_response
+from fieldsets import parse_fields, load_options, fields_adapter
+from sync import get_changes
+from facets import parse_facets, facet_page
+from duplicates import find_near_duplicates, duplicate_groups
+from editions import find_edition, save_edition, edition_metadata, edition_backed_ilike
+from isbn import to_isbn13
+from similarity import TOP_K, similar_book_ids
+import bulk_io
 
 router = APIRouter(prefix="/api/books", tags=["books"])
 
-@router.get("/", response_model=List[BookResponse])
+@router.get("/", response_model=Union[List[BookResponse], BookFacetPage])
 def get_my_books(
     skip: int = 0,
     limit: int = 100,
@@ -25,24 +41,31 @@ def get_my_books(
     author: Optional[str] = None,
     tag: Optional[str] = None,
     location_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields, or 'card' (default) / 'full'"),
+    facets: Optional[str] = Query(None, description="Comma-separated facets (tag, author, location, condition); returns {books, total, facets}"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
+    selected = parse_fields(fields, BookResponse)
+    requested_facets = parse_facets(facets)
     query = db.query(Book).filter(Book.user_id == current_user.id)
     
     # Apply filters
     if search:
         search_pattern = f"%{search}%"
-        query = query.filter(
-            or_(
-                Book.title.ilike(search_pattern),
-                Book.authors.ilike(search_pattern),
-                Book.isbn.ilike(search_pattern)
-            )
-        )
+        conditions = [
+            edition_backed_ilike("title", search_pattern),
+            edition_backed_ilike("authors", search_pattern),
+            Book.isbn.ilike(search_pattern)
+        ]
+        # An ISBN also finds the book entered in its other form
+        search_isbn13 = to_isbn13(search)
+        if search_isbn13:
+            conditions.append(Book.isbn13 == search_isbn13)
+        query = query.filter(or_(*conditions))
     
     if author:
-        query = query.filter(Book.authors.ilike(f"%{author}%"))
+        query = query.filter(edition_backed_ilike("authors", f"%{author}%"))
     
     if tag:
         query = query.join(Book.tags).filter(Tag.name == tag)
@@ -50,10 +73,62 @@ def get_my_books(
     if location_id:
         query = query.filter(Book.location_id == location_id)
     
+    adapter = fields_adapter(BookResponse, selected)
+    
+    if requested_facets:
+        # Page ids and facet counts over the filtered set in one statement
+        page_ids, total, facet_counts = facet_page(db, query, requested_facets, skip, limit)
+        books_by_id = {
+            book.id: book
+            for book in db.query(Book).options(*load_options(selected)).filter(
+                Book.user_id == current_user.id, Book.id.in_(page_ids)
+            )
+        }
+        books = [books_by_id[book_id] for book_id in page_ids]
+        return ORJSONResponse({
+            "books": adapter.dump_python(adapter.validate_python(books, from_attributes=True)),
+            "total": total,
+            "facets": facet_counts,
+        })
+    
     # Order by pinned first, then newest
     query = query.order_by(Book.is_pinned.desc(), Book.created_at.desc())
     
-    return query.offset(skip).limit(limit).all()
+    books = query.options(*load_options(selected)).offset(skip).limit(limit).all()
+    return json_response(adapter, adapter.validate_python(books, from_attributes=True))
+
+@router.get("/changes", response_model=BookChanges)
+def get_book_changes(
+    since: int = Query(0, ge=0, description="next_token of the previous call, 0 for a full sync"),
+    limit: int = Query(500, ge=1, le=5000),
+    fields: Optional[str] = Query("full", description="Comma-separated fields, or 'card' / 'full' (default)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Books created or updated and ids of books deleted since a sync token"""
+    selected = parse_fields(fields, BookResponse)
+    books, deleted, next_token, has_more = get_changes(
+        db, current_user.id, since, limit, load_options(selected | {"change_seq"})
+    )
+    
+    adapter = fields_adapter(BookResponse, selected)
+    return ORJSONResponse({
+        "changed": adapter.dump_python(adapter.validate_python(books, from_attributes=True)),
+        "deleted": deleted,
+        "next_token": next_token,
+        "has_more": has_more
+    })
+
+@router.get("/duplicates", response_model=List[DuplicateGroup])
+def get_duplicate_books(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Groups of books with near-identical title and authors"""
+    return [
+        DuplicateGroup(books=books, similarity=round(similarity, 3))
+        for books, similarity in duplicate_groups(db, current_user.id)
+    ]
 
 @router.get("/{book_id}", response_model=BookResponse)
 def get_book(
@@ -71,40 +146,125 @@ def get_book(
     
     return book
 
+@router.get("/{book_id}/similar", response_model=List[BookResponse])
+def get_similar_books(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=TOP_K),
+    fields: Optional[str] = Query(None, description="Comma-separated fields, or 'card' (default) / 'full'"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Books sharing tags, authors or publisher, from the precomputed index"""
+    selected = parse_fields(fields, BookResponse)
+    owned = db.query(Book.id).filter(
+        Book.id == book_id,
+        Book.user_id == current_user.id
+    ).first()
+    
+    if not owned:
+        raise HTTPException(status_code=404, detail="Book not found")
+    
+    similar_ids = similar_book_ids(db, current_user.id, book_id, limit)
+    books_by_id = {
+        book.id: book
+        for book in db.query(Book).options(*load_options(selected)).filter(
+            Book.user_id == current_user.id, Book.id.in_(similar_ids)
+        )
+    }
+    books = [books_by_id[similar_id] for similar_id in similar_ids if similar_id in books_by_id]
+    
+    adapter = fields_adapter(BookResponse, selected)
+    return json_response(adapter, adapter.validate_python(books, from_attributes=True))
+
+def get_or_create_tags(db: Session, names: List[str]) -> List[Tag]:
+    """Tags by name in one query, creating the missing ones"""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    existing = {tag.name: tag for tag in db.query(Tag).filter(Tag.name.in_(names))}
+    tags = []
+    for name in names:
+        tag = existing.get(name)
+        if tag is None:
+            tag = Tag(name=name)
+            db.add(tag)
+        tags.append(tag)
+    return tags
+
+def get_own_location(db: Session, user: User, location_id: Optional[int]) -> Optional[Location]:
+    if location_id is None:
+        return None
+    location = db.query(Location).filter(
+        Location.id == location_id,
+        Location.user_id == user.id
+    ).first()
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+    return location
+
+def duplicate_isbn() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Book with this ISBN already exists in your library"
+    )
+
 @router.post("/", response_model=BookResponse, status_code=status.HTTP_201_CREATED)
 def create_book(
     book_data: BookCreate,
+    background_tasks: BackgroundTasks,
+    allow_duplicate: bool = Query(False, description="Create even if a near-duplicate exists"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Check for duplicates if ISBN provided
+    # Check for duplicates if ISBN provided (any spelling of the same ISBN-13)
     if book_data.isbn:
-        existing = db.query(Book).filter(
+        isbn13 = to_isbn13(book_data.isbn)
+        if isbn13 is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid ISBN"
+            )
+        existing = db.query(Book.id).filter(
             Book.user_id == current_user.id,
-            Book.isbn == book_data.isbn
+            Book.isbn13 == isbn13
         ).first()
         if existing:
+            raise duplicate_isbn()
+    elif not allow_duplicate:
+        # Without an ISBN, look for the same title and authors in other spellings
+        matches = find_near_duplicates(db, current_user.id, book_data.title, book_data.authors)
+        if matches:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Book with this ISBN already exists in your library"
+                status_code=status.HTTP_409_CONFLICT,
+                detail={
+                    "message": "A similar book already exists in your library",
+                    "duplicates": [
+                        {"id": book.id, "title": book.title, "authors": book.authors,
+                         "similarity": round(similarity, 3)}
+                        for book, similarity in matches[:5]
+                    ]
+                }
             )
     
-    # Create book
+    # Create book; metadata matching the shared edition is not stored per user
     book_dict = book_data.model_dump(exclude={"tag_names"})
     db_book = Book(**book_dict, user_id=current_user.id)
-    
-    # Handle tags
-    if book_data.tag_names:
-        for tag_name in book_data.tag_names:
-            tag = db.query(Tag).filter(Tag.name == tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.add(tag)
-            db_book.tags.append(tag)
+    db_book.edition = find_edition(db, book_data.isbn)
+    db_book.location = get_own_location(db, current_user, book_data.location_id)
+    db_book.tags = get_or_create_tags(db, book_data.tag_names)
     
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    try:
+        db.commit()
+    except IntegrityError:
+        # The same ISBN added concurrently
+        db.rollback()
+        raise duplicate_isbn()
+    
+    # The response is built from the objects above; no reload after commit
+    
+    if db_book.cover_url:
+        background_tasks.add_task(cover_cache.cache_books, [db_book.id])
     
     return db_book
 
@@ -112,10 +272,14 @@ def create_book(
 def update_book(
     book_id: int,
     book_update: BookUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    book = db.query(Book).filter(
+    # Everything the response shows, in one SELECT
+    book = db.query(Book).options(
+        joinedload(Book.edition), joinedload(Book.location), joinedload(Book.tags)
+    ).filter(
         Book.id == book_id,
         Book.user_id == current_user.id
     ).first()
@@ -125,21 +289,31 @@ def update_book(
     
     # Update fields
     update_data = book_update.model_dump(exclude_unset=True, exclude={"tag_names"})
+    if "location_id" in update_data:
+        book.location = get_own_location(db, current_user, update_data.pop("location_id"))
+    # A null title falls back to the edition's; without one there is nothing to show
+    if "title" in update_data and update_data["title"] is None and (book.edition is None or book.edition.title is None):
+        raise HTTPException(status_code=400, detail="Title cannot be empty")
     for field, value in update_data.items():
-        setattr(book, field, value)
+        if value is None and field in CLEARABLE_FIELDS:
+            # Empty even where the edition has a value
+            book.clear(field)
+        else:
+            setattr(book, field, value)
+    
+    # A new cover invalidates the cached thumbnail
+    if "cover_url" in update_data:
+        book.cover_cache_key = None
     
     # Update tags if provided
     if book_update.tag_names is not None:
-        book.tags = []
-        for tag_name in book_update.tag_names:
-            tag = db.query(Tag).filter(Tag.name == tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.add(tag)
-            book.tags.append(tag)
+        book.tags = get_or_create_tags(db, book_update.tag_names)
     
+    # UPDATE ... RETURNING refreshes updated_at; no reload after commit
     db.commit()
-    db.refresh(book)
+    
+    if "cover_url" in update_data and book.cover_url:
+        background_tasks.add_task(cover_cache.cache_books, [book.id])
     
     return book
 
@@ -149,7 +323,8 @@ def delete_book(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    book = db.query(Book).filter(
+    # Tags are needed for the usage counts (see tag_counts.py)
+    book = db.query(Book).options(joinedload(Book.tags)).filter(
         Book.id == book_id,
         Book.user_id == current_user.id
     ).first()
@@ -160,10 +335,31 @@ def delete_book(
     db.delete(book)
     db.commit()
 
-@router.get("/isbn/lookup/{isbn}", response_model=ISBNLookupResponse)
-async def lookup_isbn(isbn: str):
-    """Lookup book metadata by ISBN from Open Library"""
-    result = await openlibrary_service.lookup_isbn(isbn)
+@router.get(
+    "/isbn/lookup/{isbn}",
+    response_model=ISBNLookupResponse,
+    dependencies=[Depends(lookup_rate_limit)]
+)
+async def lookup_isbn(isbn: str, db: Session = Depends(get_db)):
+    """Lookup book metadata by ISBN, from the edition catalog or Open Library"""
+    if to_isbn13(isbn) is None:
+        raise HTTPException(status_code=400, detail="Invalid ISBN")
+    
+    # The session is synchronous; its queries run in a thread, off the event loop
+    edition = await asyncio.to_thread(find_edition, db, isbn)
+    if edition is not None and edition.title:
+        return ISBNLookupResponse(**edition_metadata(edition))
+    
+    try:
+        result = await openlibrary_service.lookup_isbn(isbn)
+    except OpenLibraryBusy as e:
+        raise too_many_requests(e.retry_after, "ISBN lookup is busy, please retry")
+    except OpenLibraryUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Open Library is not reachable right now, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
     
     if not result:
         raise HTTPException(
@@ -171,10 +367,14 @@ async def lookup_isbn(isbn: str):
             detail="Book not found for this ISBN"
         )
     
+    await asyncio.to_thread(save_edition, isbn, result)
+    
     return ISBNLookupResponse(**result)
 
 @router.post("/import/csv", response_model=CSVImportProgress)
 async def import_books_csv(
+    request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -182,88 +382,132 @@ async def import_books_csv(
     """
     Import books from CSV file with ISBN column
     Expected format: ISBN (required), Title (optional), Authors (optional)
+    With `Accept: text/event-stream` the response streams `progress` events
+    and ends with a `done` event carrying the result (see csv_import.py)
     """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV")
     
-    content = await file.read()
-    csv_data = io.StringIO(content.decode('utf-8'))
-    reader = csv.DictReader(csv_data)
+    rows = read_rows(await file.read())
     
-    progress = CSVImportProgress(total=0, processed=0, successful=0, failed=0)
+    if "text/event-stream" in request.headers.get("accept", ""):
+        feed = start_import(current_user.id, rows)
+        return StreamingResponse(
+            sse_events(feed),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     
-    # Count total rows
-    rows = list(reader)
-    progress.total = len(rows)
+    progress = CSVImportProgress(total=len(rows), processed=0, successful=0, failed=0)
+    cover_book_ids = await import_csv(db, current_user.id, rows, progress)
     
-    for row in rows:
-        progress.processed += 1
-        isbn = row.get('ISBN', '').strip()
-        
-        if not isbn:
-            progress.failed += 1
-            progress.errors.append(f"Row {progress.processed}: No ISBN provided")
-            continue
-        
-        # Check for duplicate
-        existing = db.query(Book).filter(
-            Book.user_id == current_user.id,
-            Book.isbn == isbn
-        ).first()
-        
-        if existing:
-            progress.failed += 1
-            progress.errors.append(f"Row {progress.processed}: Book with ISBN {isbn} already exists")
-            continue
+    if cover_book_ids:
+        background_tasks.add_task(cover_cache.cache_books, cover_book_ids)
+    
+    return progress
+
+@router.websocket("/import/ws")
+async def import_books_csv_ws(websocket: WebSocket):
+    """
+    CSV import with live progress over a WebSocket: send {"token": "..."},
+    then the CSV file as one message; progress and done messages follow
+    """
+    await websocket.accept()
+    try:
+        token = (await websocket.receive_json()).get("token")
+        db = SessionLocal()
+        try:
+            user = await asyncio.to_thread(get_current_user, token, db)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        finally:
+            db.close()
         
+        message = await websocket.receive()
+        content = message.get("bytes") or (message.get("text") or "").encode()
         try:
-            # Try to fetch metadata
-            metadata = await openlibrary_service.lookup_isbn(isbn)
-            
-            if metadata:
-                # Use metadata from API
-                authors_str = json.dumps(metadata.get('authors', []))
-                db_book = Book(
-                    user_id=current_user.id,
-                    isbn=isbn,
-                    title=metadata.get('title') or row.get('Title', 'Unknown'),
-                    authors=authors_str,
-                    cover_url=metadata.get('cover_url'),
-                    publisher=metadata.get('publisher'),
-                    published_year=metadata.get('published_year'),
-                    page_count=metadata.get('page_count'),
-                    description=metadata.get('description')
-                )
-            else:
-                # Use CSV data only
-                authors = row.get('Authors', '').strip()
-                authors_str = json.dumps([authors]) if authors else None
-                db_book = Book(
-                    user_id=current_user.id,
-                    isbn=isbn,
-                    title=row.get('Title', 'Unknown'),
-                    authors=authors_str
-                )
-            
-            db.add(db_book)
-            progress.successful += 1
-            
-        except Exception as e:
-            progress.failed += 1
-            progress.errors.append(f"Row {progress.processed}: {str(e)}")
+            rows = read_rows(content)
+        except (UnicodeDecodeError, csv.Error):
+            await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+            return
+        
+        async for event, data in start_import(user.id, rows).events():
+            await websocket.send_json({"type": event, **(data or {})})
+        await websocket.close()
+    except WebSocketDisconnect:
+        # The import itself keeps running
+        pass
+
+def schedule_cover_caching(background_tasks: BackgroundTasks, book_ids: List[int]):
+    """Cache covers after the response, one import batch per task"""
+    for start in range(0, len(book_ids), bulk_io.BATCH_SIZE):
+        background_tasks.add_task(cover_cache.cache_books, book_ids[start:start + bulk_io.BATCH_SIZE])
+
+@router.post("/import/jsonl", response_model=CSVImportProgress)
+def import_books_jsonl(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Import books from a JSON Lines export (one record per line, see bulk_io.py)"""
+    progress, cover_book_ids = bulk_io.import_records(db, current_user.id, bulk_io.jsonl_batches(file.file))
+    schedule_cover_caching(background_tasks, cover_book_ids)
+    return progress
+
+@router.post("/import/parquet", response_model=CSVImportProgress)
+def import_books_parquet(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Import books from a Parquet export (see bulk_io.py)"""
+    try:
+        batches = bulk_io.parquet_batches(file.file)
+        progress, cover_book_ids = bulk_io.import_records(db, current_user.id, batches)
+    except bulk_io.InvalidFile:
+        raise HTTPException(status_code=400, detail="File must be a Parquet file")
     
-    db.commit()
+    schedule_cover_caching(background_tasks, cover_book_ids)
     return progress
 
+@router.get("/export/jsonl")
+def export_books_jsonl(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Export user's library as JSON Lines, streamed batch by batch"""
+    return StreamingResponse(
+        bulk_io.stream_export(read_session(request), current_user.id, bulk_io.jsonl_chunks),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=library_{current_user.username}.jsonl"}
+    )
+
+@router.get("/export/parquet")
+def export_books_parquet(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Export user's library as Parquet (one row group per batch), for backups and analytics"""
+    return StreamingResponse(
+        bulk_io.stream_export(read_session(request), current_user.id, bulk_io.parquet_chunks),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f"attachment; filename=library_{current_user.username}.parquet"}
+    )
+
 @router.get("/export/csv")
 def export_books_csv(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Export user's library as CSV"""
-    from fastapi.responses import StreamingResponse
     
-    books = db.query(Book).filter(Book.user_id == current_user.id).all()
+    books = db.query(Book).options(
+        selectinload(Book.tags),
+        selectinload(Book.location)
+    ).filter(Book.user_id == current_user.id).all()
     
     output = io.StringIO()
     writer = csv.writer(output)
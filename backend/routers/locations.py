@@ -27,7 +27,6 @@ def create_location(
     db_location = Location(**location_data.model_dump(), user_id=current_user.id)
     db.add(db_location)
     db.commit()
-    db.refresh(db_location)
     return db_location
 
 @router.delete("/{location_id}", status_code=status.HTTP_204_NO_CONTENT)
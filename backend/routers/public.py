@@ -1,17 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List
+from typing import FrozenSet, List, Set
 import json
 
-from database import get_db
+from database import get_read_db
 from models import User, Book, Tag
+from editions import edition_backed_ilike
 from schemas import UserPublic, BookPublic, LibraryStats
+from fieldsets import parse_fields, load_options, fields_adapter
+from ratelimit import public_rate_limit, public_admission
+from similarity import TOP_K, similar_book_ids
 
-router = APIRouter(prefix="/api/public", tags=["public"])
+router = APIRouter(
+    prefix="/api/public",
+    tags=["public"],
+    dependencies=[Depends(public_rate_limit), Depends(public_admission)]
+)
+
+def hidden_fields(user: User) -> Set[str]:
+    """BookPublic fields the owner's sharing settings hide"""
+    hidden = set()
+    if not user.show_tags_public:
+        hidden.add("tags")
+    if not user.show_condition_public:
+        hidden.add("condition")
+    if not user.show_notes_public:
+        hidden.add("notes")
+    return hidden
+
+def public_books_query(db: Session, user: User):
+    """A user's public books, pinned first, then newest"""
+    return db.query(Book).filter(
+        Book.user_id == user.id,
+        Book.show_in_public == True
+    ).order_by(Book.is_pinned.desc(), Book.created_at.desc())
+
+def serialize_public_books(books: List[Book], selected: FrozenSet[str], hidden: Set[str]) -> List[dict]:
+    adapter = fields_adapter(BookPublic, selected - hidden)
+    public_books = adapter.dump_python(adapter.validate_python(books, from_attributes=True))
+    for book in public_books:
+        for field in hidden & selected:
+            book[field] = [] if field == "tags" else None
+    return public_books
 
 @router.get("/library/{username}", response_model=UserPublic)
-def get_public_library_info(username: str, db: Session = Depends(get_db)):
+def get_public_library_info(username: str, db: Session = Depends(get_read_db)):
     """Get public library information for a user"""
     user = db.query(User).filter(User.username == username).first()
     
@@ -36,68 +71,86 @@ def get_public_library_books(
     search: str = None,
     author: str = None,
     tag: str = None,
-    db: Session = Depends(get_db)
+    fields: str = Query(None, description="Comma-separated fields, or 'card' (default) / 'full'"),
+    db: Session = Depends(get_read_db)
 ):
     """Get books from a public library"""
+    selected = parse_fields(fields, BookPublic)
     user = db.query(User).filter(User.username == username).first()
     
     if not user or not user.is_library_public:
         raise HTTPException(status_code=404, detail="Library not found or is private")
     
-    # Query books
-    query = db.query(Book).filter(
-        Book.user_id == user.id,
-        Book.show_in_public == True
-    )
+    query = public_books_query(db, user)
     
     # Apply filters
     if search:
         search_pattern = f"%{search}%"
         query = query.filter(
-            (Book.title.ilike(search_pattern)) |
-            (Book.authors.ilike(search_pattern))
+            edition_backed_ilike("title", search_pattern) |
+            edition_backed_ilike("authors", search_pattern)
         )
     
     if author:
-        query = query.filter(Book.authors.ilike(f"%{author}%"))
+        query = query.filter(edition_backed_ilike("authors", f"%{author}%"))
     
     if tag:
         query = query.join(Book.tags).filter(Tag.name == tag)
     
-    # Order by pinned first
-    query = query.order_by(Book.is_pinned.desc(), Book.created_at.desc())
+    # Fields hidden by the user's public settings are never read
+    hidden = hidden_fields(user)
+    books = query.options(*load_options(selected - hidden)).offset(skip).limit(limit).all()
+    
+    return ORJSONResponse(serialize_public_books(books, selected, hidden))
+
+@router.get("/library/{username}/books/{book_id}/similar", response_model=List[BookPublic])
+def get_public_similar_books(
+    username: str,
+    book_id: int,
+    limit: int = Query(10, ge=1, le=TOP_K),
+    fields: str = Query(None, description="Comma-separated fields, or 'card' (default) / 'full'"),
+    db: Session = Depends(get_read_db)
+):
+    """Public books similar to a public book, from the precomputed index"""
+    selected = parse_fields(fields, BookPublic)
+    user = db.query(User).filter(User.username == username).first()
+    
+    if not user or not user.is_library_public:
+        raise HTTPException(status_code=404, detail="Library not found or is private")
+    
+    visible = db.query(Book.id).filter(
+        Book.id == book_id,
+        Book.user_id == user.id,
+        Book.show_in_public == True
+    ).first()
     
-    books = query.offset(skip).limit(limit).all()
+    if not visible:
+        raise HTTPException(status_code=404, detail="Book not found")
     
-    # Format response based on user's public settings
-    public_books = []
-    for book in books:
-        book_data = {
-            "id": book.id,
-            "isbn": book.isbn,
-            "title": book.title,
-            "authors": book.authors,
-            "cover_url": book.cover_url,
-            "publisher": book.publisher,
-            "published_year": book.published_year,
-            "description": book.description,
-            "is_pinned": book.is_pinned,
-            "tags": book.tags if user.show_tags_public else [],
-            "condition": book.condition if user.show_condition_public else None,
-            "notes": book.notes if user.show_notes_public else None
-        }
-        public_books.append(BookPublic(**book_data))
+    similar_ids = similar_book_ids(db, user.id, book_id, limit, public_only=True)
+    hidden = hidden_fields(user)
+    books_by_id = {
+        book.id: book
+        for book in db.query(Book).options(*load_options(selected - hidden)).filter(
+            Book.user_id == user.id, Book.id.in_(similar_ids)
+        )
+    }
+    books = [books_by_id[similar_id] for similar_id in similar_ids if similar_id in books_by_id]
     
-    return public_books
+    return ORJSONResponse(serialize_public_books(books, selected, hidden))
 
 @router.get("/library/{username}/stats", response_model=LibraryStats)
-def get_public_library_stats(username: str, db: Session = Depends(get_db)):
+def get_public_library_stats(username: str, db: Session = Depends(get_read_db)):
     """Get statistics for a public library"""
     user = db.query(User).filter(User.username == username).first()
     
     if not user or not user.is_library_public:
         raise HTTPException(status_code=404, detail="Library not found or is private")
     
+    return public_library_stats(db, user)
+
+def public_library_stats(db: Session, user: User) -> LibraryStats:
+    """Stats of a user's public books, with fields hidden by the sharing settings blanked"""
     # Total books
     total_books = db.query(func.count(Book.id)).filter(
         Book.user_id == user.id,
@@ -106,7 +159,8 @@ def get_public_library_stats(username: str, db: Session = Depends(get_db)):
     
     # Books by author (top 10)
     books_by_author = []
-    books = db.query(Book).filter(
+    # Only the (edition-resolved) authors column is needed
+    books = db.query(Book.authors.label("authors")).filter(
         Book.user_id == user.id,
         Book.show_in_public == True,
         Book.authors.isnot(None)
@@ -153,11 +207,17 @@ def get_public_library_stats(username: str, db: Session = Depends(get_db)):
         Book.is_pinned == True
     ).order_by(Book.created_at.desc()).limit(5).all()
     
-    return LibraryStats(
+    stats = LibraryStats(
         total_books=total_books,
         books_by_author=books_by_author,
         books_by_location=[],  # Don't show locations in public view
-        books_by_tag=books_by_tag,
+        books_by_tag=books_by_tag if user.show_tags_public else [],
         recent_additions=recent,
         pinned_books=pinned
     )
+    blanked = {field: [] if field == "tags" else None for field in hidden_fields(user)}
+    blanked.update(location=None, location_id=None)
+    for book in stats.recent_additions + stats.pinned_books:
+        for field, value in blanked.items():
+            setattr(book, field, value)
+    return stats
@@ -3,17 +3,18 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 import json
 
-from database import get_db
-from models import User, Book, Tag, Location
+from database import get_read_db
+from models import User, Book, Location
 from schemas import LibraryStats
 from auth import get_current_user
+from tag_counts import suggest_tags
 
 router = APIRouter(prefix="/api/stats", tags=["stats"])
 
 @router.get("/", response_model=LibraryStats)
 def get_library_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get statistics for current user's library"""
     
@@ -23,7 +24,8 @@ def get_library_stats(
     ).scalar()
     
     # Books by author
-    books = db.query(Book).filter(
+    # Only the (edition-resolved) authors column is needed
+    books = db.query(Book.authors.label("authors")).filter(
         Book.user_id == current_user.id,
         Book.authors.isnot(None)
     ).all()
@@ -55,17 +57,10 @@ def get_library_stats(
         for row in location_query.all()
     ]
     
-    # Books by tag
-    tag_query = db.query(
-        Tag.name,
-        func.count(Book.id).label('count')
-    ).join(Book.tags).filter(
-        Book.user_id == current_user.id
-    ).group_by(Tag.name).order_by(func.count(Book.id).desc()).limit(10)
-    
+    # Books by tag, from the maintained usage counts
     books_by_tag = [
-        {"tag": row.name, "count": row.count}
-        for row in tag_query.all()
+        {"tag": name, "count": count}
+        for name, count in suggest_tags(db, current_user.id, limit=10)
     ]
     
     # Recent additions
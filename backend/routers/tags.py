@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List
+
+from database import get_read_db
+from models import User
+from schemas import TagSuggestion
+from auth import get_current_user
+from tag_counts import SUGGEST_LIMIT, suggest_tags
+
+router = APIRouter(prefix="/api/tags", tags=["tags"])
+
+@router.get("/suggest", response_model=List[TagSuggestion])
+def suggest(
+    prefix: str = Query("", max_length=50, description="Start of the tag name (case-insensitive)"),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """The user's most used tags starting with a prefix"""
+    return [
+        TagSuggestion(name=name, count=count)
+        for name, count in suggest_tags(db, current_user.id, prefix, limit)
+    ]
@@ -24,7 +24,6 @@ def update_user_profile(
         setattr(current_user, field, value)
     
     db.commit()
-    db.refresh(current_user)
     return current_user
 
 @router.get("/check-username/{username}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional, List
+from typing import Annotated, Optional, List, Dict, Union
 from datetime import datetime
 
 # User Schemas
@@ -74,6 +74,10 @@ class TagResponse(TagBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class TagSuggestion(BaseModel):
+    name: str
+    count: int
+
 # Book Schemas
 class BookBase(BaseModel):
     isbn: Optional[str] = None
@@ -111,8 +115,10 @@ class BookUpdate(BaseModel):
 class BookResponse(BookBase):
     id: int
     user_id: int
+    edition_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime]
+    cover_thumb_url: Optional[str] = None
     tags: List[TagResponse] = []
     location: Optional[LocationResponse] = None
     
@@ -124,6 +130,7 @@ class BookPublic(BaseModel):
     title: str
     authors: Optional[str]
     cover_url: Optional[str]
+    cover_thumb_url: Optional[str] = None
     publisher: Optional[str]
     published_year: Optional[int]
     description: Optional[str]
@@ -134,6 +141,29 @@ class BookPublic(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+# Delta sync
+class BookChanges(BaseModel):
+    changed: List[BookResponse]
+    deleted: List[int]
+    next_token: int
+    has_more: bool
+
+# Faceted listing (GET /api/books/?facets=...)
+class FacetCount(BaseModel):
+    value: Union[int, str, None]  # location facet: location id
+    label: Optional[str] = None  # location facet: location name
+    count: int
+
+class BookFacetPage(BaseModel):
+    books: List[BookResponse]
+    total: int
+    facets: Dict[str, List[FacetCount]]
+
+# Near-duplicate report (GET /api/books/duplicates)
+class DuplicateGroup(BaseModel):
+    books: List[BookResponse]
+    similarity: float  # lowest confirmed pairwise similarity in the group
+
 # ISBN Lookup Response
 class ISBNLookupResponse(BaseModel):
     isbn: str
@@ -145,7 +175,25 @@ class ISBNLookupResponse(BaseModel):
     page_count: Optional[int]
     description: Optional[str]
 
-# CSV Import
+# JSON Lines / Parquet export and import (see bulk_io.py); limits are the column sizes
+class BookRecord(BaseModel):
+    isbn: Optional[str] = Field(None, max_length=20)
+    title: Optional[str] = Field(None, max_length=500)
+    authors: List[str] = []
+    cover_url: Optional[str] = Field(None, max_length=1000)
+    publisher: Optional[str] = Field(None, max_length=255)
+    published_year: Optional[int] = None
+    page_count: Optional[int] = None
+    description: Optional[str] = None
+    location: Optional[str] = Field(None, max_length=100)
+    condition: Optional[str] = Field(None, max_length=20)
+    notes: Optional[str] = None
+    tags: List[Annotated[str, Field(max_length=50)]] = []
+    is_pinned: bool = False
+    show_in_public: bool = True
+    created_at: Optional[datetime] = None
+
+# CSV Import (also the result of JSON Lines and Parquet imports)
 class CSVImportProgress(BaseModel):
     total: int
     processed: int
@@ -0,0 +1,22 @@
+"""
+Precompiled serializers for large list payloads.
+
+Endpoints returning hundreds of books validate the ORM rows once through a
+TypeAdapter, dump them to plain Python objects and encode with orjson,
+instead of FastAPI's validate -> dict -> re-validate -> encode path.
+orjson encodes datetimes natively, which benchmarks/bench_serialization.py
+shows to be faster than both the default path and TypeAdapter.dump_json.
+"""
+from typing import List
+
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+
+from schemas import BookResponse
+
+book_list_adapter = TypeAdapter(List[BookResponse])
+
+
+def json_response(adapter: TypeAdapter, value, status_code: int = 200) -> ORJSONResponse:
+    """Serialize already-validated data with a precompiled adapter"""
+    return ORJSONResponse(content=adapter.dump_python(value), status_code=status_code)
@@ -1,45 +1,294 @@
-import httpx
-from typing import Optional, Dict, List
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional, Dict, List
+import asyncio
 import logging
+import os
+import random
+import time
+
+import tracing
+
+if TYPE_CHECKING:
+    import httpx  # imported on the first lookup, it is slow to import
 
 logger = logging.getLogger(__name__)
 
+# Outbound requests to Open Library in flight at once, across all endpoints
+OPENLIBRARY_MAX_CONCURRENCY = int(os.getenv("OPENLIBRARY_MAX_CONCURRENCY", "4"))
+# How long an interactive lookup may wait for a free slot before it is shed
+OPENLIBRARY_QUEUE_TIMEOUT = float(os.getenv("OPENLIBRARY_QUEUE_TIMEOUT", "2"))
+# Never call openlibrary.org; lookups only use the local catalog (see openlibrary_dump.py)
+OPENLIBRARY_OFFLINE = os.getenv("OPENLIBRARY_OFFLINE", "0") == "1"
+# Time budget of one lookup (edition, authors and search fallback), from getting a slot
+OPENLIBRARY_DEADLINE = float(os.getenv("OPENLIBRARY_DEADLINE", "8"))
+# Timeout of a single HTTP attempt (capped by what is left of the deadline)
+OPENLIBRARY_ATTEMPT_TIMEOUT = float(os.getenv("OPENLIBRARY_ATTEMPT_TIMEOUT", "3"))
+# Retries after a 429/5xx answer or a network error, with jittered exponential backoff
+OPENLIBRARY_RETRIES = int(os.getenv("OPENLIBRARY_RETRIES", "2"))
+OPENLIBRARY_BACKOFF = float(os.getenv("OPENLIBRARY_BACKOFF", "0.2"))
+# Send a second identical request when the first has not answered after this many seconds (0 = off)
+OPENLIBRARY_HEDGE_AFTER = float(os.getenv("OPENLIBRARY_HEDGE_AFTER", "0"))
+# Consecutive failed attempts that open the circuit, and how long it stays open
+OPENLIBRARY_BREAKER_THRESHOLD = int(os.getenv("OPENLIBRARY_BREAKER_THRESHOLD", "5"))
+OPENLIBRARY_BREAKER_COOLDOWN = float(os.getenv("OPENLIBRARY_BREAKER_COOLDOWN", "30"))
+
+
+class OpenLibraryBusy(Exception):
+    """No outbound slot became free within the queue timeout"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Open Library lookups are saturated")
+        self.retry_after = retry_after
+
+
+class OpenLibraryUnavailable(Exception):
+    """Open Library failed, ran out of time or the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Open Library is unavailable")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed attempts and rejects calls for
+    `cooldown` seconds; then a single probe decides whether it closes again.
+    Only used from the event loop, so it needs no lock.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 1
+        return max(1, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+def _retryable(response: "httpx.Response") -> bool:
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def _retry_after(response: Optional["httpx.Response"]) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (AttributeError, KeyError, ValueError):
+        return None
+
+
 class OpenLibraryService:
     BASE_URL = "https://openlibrary.org"
     
-    async def lookup_isbn(self, isbn: str) -> Optional[Dict]:
+    def __init__(self):
+        self._slots = asyncio.Semaphore(OPENLIBRARY_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker(OPENLIBRARY_BREAKER_THRESHOLD, OPENLIBRARY_BREAKER_COOLDOWN)
+        # Outcome counters, reported by /api/health
+        self.metrics = Counter()
+    
+    def stats(self) -> Dict:
+        return {"circuit": self.breaker.state, **self.metrics}
+    
+    @asynccontextmanager
+    async def _outbound_slot(self, queue_timeout: Optional[float]):
+        """Hold one of the global outbound slots; None waits indefinitely"""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), queue_timeout)
+        except asyncio.TimeoutError:
+            self.metrics["shed"] += 1
+            raise OpenLibraryBusy(retry_after=queue_timeout or 1)
+        try:
+            yield
+        finally:
+            self._slots.release()
+    
+    async def lookup_isbn(self, isbn: str, queue_timeout: Optional[float] = OPENLIBRARY_QUEUE_TIMEOUT) -> Optional[Dict]:
         """
-        Lookup book metadata by ISBN from Open Library API
+        Lookup book metadata by ISBN from Open Library API; None if it has no such book
+        Raises OpenLibraryBusy if no outbound slot frees up within queue_timeout,
+        and OpenLibraryUnavailable if Open Library fails or the circuit is open
         """
+        if OPENLIBRARY_OFFLINE:
+            return None
+        if self.breaker.state == "open":
+            # Fail fast without taking a slot
+            self.metrics["short_circuited"] += 1
+            raise OpenLibraryUnavailable(self.breaker.retry_after())
+        
         # Clean ISBN (remove hyphens, spaces)
         clean_isbn = isbn.replace("-", "").replace(" ", "")
         
+        with tracing.span("openlibrary.lookup", {"isbn": clean_isbn}) as lookup_span:
+            async with self._outbound_slot(queue_timeout):
+                # Time spent waiting for a slot ends here
+                lookup_span.add_event("slot_acquired")
+                try:
+                    result = await self._lookup(clean_isbn, time.monotonic() + OPENLIBRARY_DEADLINE)
+                except OpenLibraryUnavailable:
+                    self.metrics["unavailable"] += 1
+                    logger.warning(f"Open Library unavailable for ISBN {isbn} (circuit {self.breaker.state})")
+                    raise
+            lookup_span.set_attribute("openlibrary.found", bool(result))
+        self.metrics["found" if result else "not_found"] += 1
+        return result
+    
+    async def _lookup(self, clean_isbn: str, deadline: float) -> Optional[Dict]:
+        try:
+            return await self._fetch(clean_isbn, deadline)
+        except ValueError as e:
+            logger.error(f"Malformed Open Library response for ISBN {clean_isbn}: {e}")
+            return None
+    
+    async def _fetch(self, clean_isbn: str, deadline: float) -> Optional[Dict]:
+        import httpx
+        
+        # /isbn/<isbn>.json answers with a redirect to the edition (/books/<key>.json)
+        async with httpx.AsyncClient(base_url=self.BASE_URL, follow_redirects=True) as client:
+            # Try ISBN API first
+            response = await self._get(client, f"/isbn/{clean_isbn}.json", deadline)
+            if response.status_code == 200:
+                return await self._format_book_data(client, response.json(), clean_isbn, deadline)
+            
+            # Only an unknown ISBN (not a failure) is worth a search request
+            if response.status_code != 404:
+                return None
+            response = await self._get(client, "/search.json", deadline, params={"isbn": clean_isbn})
+            if response.status_code == 200:
+                search_data = response.json()
+                if search_data.get("docs") and len(search_data["docs"]) > 0:
+                    return await self._format_search_result(search_data["docs"][0], clean_isbn)
+            
+            return None
+    
+    async def _get(self, client: "httpx.AsyncClient", path: str, deadline: float,
+                   params: Optional[Dict] = None) -> "httpx.Response":
+        """
+        GET with retries on 429/5xx and network errors, within the deadline.
+        Returns the first non-retryable response.
+        """
+        with tracing.span("openlibrary.get", {"url.path": path}) as get_span:
+            response = await self._get_with_retries(client, path, deadline, params, get_span)
+            get_span.set_attribute("http.response.status_code", response.status_code)
+            return response
+    
+    async def _get_with_retries(self, client: "httpx.AsyncClient", path: str, deadline: float,
+                                params: Optional[Dict], get_span) -> "httpx.Response":
+        import httpx
+        
+        response = None
+        for attempt in range(OPENLIBRARY_RETRIES + 1):
+            if not self.breaker.allow():
+                self.metrics["short_circuited"] += 1
+                raise OpenLibraryUnavailable(self.breaker.retry_after())
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.metrics["deadline_exceeded"] += 1
+                break
+            
+            response = None
+            try:
+                response = await self._attempt(client, path, params, min(OPENLIBRARY_ATTEMPT_TIMEOUT, remaining))
+            except httpx.HTTPError as e:
+                self.metrics["network_error"] += 1
+                logger.info(f"Open Library request {path} failed: {e!r}")
+            except asyncio.CancelledError:
+                self.breaker.record_failure()
+                raise
+            else:
+                if not _retryable(response):
+                    self.breaker.record_success()
+                    return response
+                self.metrics[f"http_{response.status_code}"] += 1
+            self.breaker.record_failure()
+            
+            if attempt == OPENLIBRARY_RETRIES:
+                break
+            # Full jitter, unless the server said how long to wait
+            delay = _retry_after(response)
+            if delay is None:
+                delay = random.uniform(0, OPENLIBRARY_BACKOFF * 2 ** attempt)
+            if time.monotonic() + delay >= deadline:
+                self.metrics["deadline_exceeded"] += 1
+                break
+            self.metrics["retried"] += 1
+            get_span.add_event("retry", {"attempt": attempt + 1, "delay": delay})
+            await asyncio.sleep(delay)
+        
+        raise OpenLibraryUnavailable(_retry_after(response) or self.breaker.retry_after())
+    
+    async def _attempt(self, client: "httpx.AsyncClient", path: str, params: Optional[Dict],
+                       timeout: float) -> "httpx.Response":
+        """One request, hedged with a second one if it is slow"""
+        if not OPENLIBRARY_HEDGE_AFTER or OPENLIBRARY_HEDGE_AFTER >= timeout:
+            return await client.get(path, params=params, timeout=timeout)
+        
+        first = asyncio.ensure_future(client.get(path, params=params, timeout=timeout))
+        done, _ = await asyncio.wait({first}, timeout=OPENLIBRARY_HEDGE_AFTER)
+        if done:
+            return first.result()
+        
+        self.metrics["hedged"] += 1
+        hedge = asyncio.ensure_future(
+            client.get(path, params=params, timeout=timeout - OPENLIBRARY_HEDGE_AFTER)
+        )
+        pending = {first, hedge}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and (not _retryable(task.result()) or not pending):
+                        if task is hedge:
+                            self.metrics["hedge_won"] += 1
+                        return task.result()
+                if not pending:
+                    # Both failed; report the original request's error
+                    return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _author_name(self, client: "httpx.AsyncClient", author_key: str, deadline: float) -> Optional[str]:
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                # Try ISBN API first
-                url = f"{self.BASE_URL}/isbn/{clean_isbn}.json"
-                response = await client.get(url)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return await self._format_book_data(data, clean_isbn)
-                
-                # If not found, try search API
-                search_url = f"{self.BASE_URL}/search.json"
-                response = await client.get(search_url, params={"isbn": clean_isbn})
-                
-                if response.status_code == 200:
-                    search_data = response.json()
-                    if search_data.get("docs") and len(search_data["docs"]) > 0:
-                        return await self._format_search_result(search_data["docs"][0], clean_isbn)
-                
+            response = await self._get(client, f"{author_key}.json", deadline)
+            if response.status_code != 200:
                 return None
-                
-        except Exception as e:
-            logger.error(f"Error looking up ISBN {isbn}: {e}")
+            return response.json().get("name", "Unknown")
+        except (OpenLibraryUnavailable, ValueError):
             return None
     
-    async def _format_book_data(self, data: Dict, isbn: str) -> Dict:
+    async def _format_book_data(self, client: "httpx.AsyncClient", data: Dict, isbn: str, deadline: float) -> Dict:
         """Format book data from ISBN API response"""
         # Get cover image
         cover_url = None
@@ -47,20 +296,12 @@ class OpenLibraryService:
             cover_id = data["covers"][0]
             cover_url = f"{self.BASE_URL}/covers/id/{cover_id}-L.jpg"
         
-        # Get authors
-        authors = []
-        if data.get("authors"):
-            for author_ref in data["authors"]:
-                author_key = author_ref.get("key")
-                if author_key:
-                    try:
-                        async with httpx.AsyncClient(timeout=5.0) as client:
-                            author_response = await client.get(f"{self.BASE_URL}{author_key}.json")
-                            if author_response.status_code == 200:
-                                author_data = author_response.json()
-                                authors.append(author_data.get("name", "Unknown"))
-                    except:
-                        pass
+        # Get authors, concurrently; names that fail are left out
+        author_keys = [ref["key"] for ref in data.get("authors", []) if isinstance(ref, dict) and ref.get("key")]
+        names = await asyncio.gather(*(self._author_name(client, key, deadline) for key in author_keys))
+        authors = [name for name in names if name]
+        if len(authors) < len(author_keys):
+            self.metrics["author_failed"] += len(author_keys) - len(authors)
         
         return {
             "isbn": isbn,
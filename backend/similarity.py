@@ -0,0 +1,261 @@
+"""
+"Similar books" index (GET /api/books/{id}/similar).
+
+Every book of a library is a sparse vector over its tags, authors and
+publisher, IDF-weighted within the library and L2-normalized, so the dot
+product of two rows is their cosine similarity. The top TOP_K neighbours of
+each book are computed in row chunks of X @ X.T and stored in
+`book_similarities`; serving a request is an index range scan on
+(book_id, score) whose cost does not depend on the library size.
+
+A library's index is rebuilt in a background thread a few seconds after a
+commit that added, deleted or re-tagged books or changed their authors,
+publisher or edition (several commits in a row cause one rebuild).
+`users.similarity_seq` records the change_seq (see sync.py) the index was
+built at; `python similarity.py` rebuilds every stale library, e.g. after
+bulk loads that bypass the ORM. Changes to a shared edition are not tracked.
+
+Usage:
+    python similarity.py [--all] [--user-id ID]
+"""
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import logging
+import os
+import threading
+
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from duplicates import normalize
+from models import User, Book, BookSimilarity, book_tags
+
+if TYPE_CHECKING:
+    from scipy import sparse  # numpy and scipy are imported by the first rebuild
+
+# Neighbours stored per book (upper bound for ?limit=)
+TOP_K = 20
+# Relative weight of the feature kinds before IDF weighting
+TAG_WEIGHT = 1.0
+AUTHOR_WEIGHT = 2.0
+PUBLISHER_WEIGHT = 0.5
+# Cells of the dense similarity block computed at once (~16 MB as float32)
+CHUNK_CELLS = 4_000_000
+# Seconds to wait after a change before rebuilding; negative disables
+REFRESH_DELAY = float(os.getenv("SIMILARITY_REFRESH_DELAY", "5"))
+
+# Attributes that change a book's feature vector
+_FEATURE_ATTRIBUTES = ("tags", "authors_override", "publisher_override", "cleared_fields", "edition_id", "edition")
+
+logger = logging.getLogger(__name__)
+
+
+def _author_names(authors: Optional[str]) -> List[str]:
+    if not authors:
+        return []
+    try:
+        names = json.loads(authors)
+    except ValueError:
+        return [authors]
+    return names if isinstance(names, list) else [str(names)]
+
+
+def library_features(db: Session, user_id: int) -> Tuple[List[int], "sparse.csr_matrix"]:
+    """Book ids and their L2-normalized feature rows"""
+    import numpy as np
+    from scipy import sparse
+
+    rows = db.query(
+        Book.id, Book.authors.label("authors"), Book.publisher.label("publisher")
+    ).filter(Book.user_id == user_id).order_by(Book.id).all()
+    book_ids = [row.id for row in rows]
+    position = {book_id: i for i, book_id in enumerate(book_ids)}
+
+    features: Dict[str, int] = {}
+    kinds: List[float] = []
+    entries: List[Tuple[int, int]] = []
+
+    def add(row: int, key: str, weight: float):
+        column = features.get(key)
+        if column is None:
+            column = features[key] = len(kinds)
+            kinds.append(weight)
+        entries.append((row, column))
+
+    for row in rows:
+        i = position[row.id]
+        for name in {normalize(name) for name in _author_names(row.authors)} - {""}:
+            add(i, f"a:{name}", AUTHOR_WEIGHT)
+        publisher = normalize(row.publisher)
+        if publisher:
+            add(i, f"p:{publisher}", PUBLISHER_WEIGHT)
+    tag_links = db.execute(
+        select(book_tags.c.book_id, book_tags.c.tag_id).where(book_tags.c.user_id == user_id)
+    ).all()
+    for book_id, tag_id in tag_links:
+        add(position[book_id], f"t:{tag_id}", TAG_WEIGHT)
+
+    shape = (len(book_ids), len(kinds))
+    if not entries:
+        return book_ids, sparse.csr_matrix(shape, dtype=np.float32)
+    row_idx, col_idx = (np.array(values, dtype=np.int64) for values in zip(*entries))
+    matrix = sparse.csr_matrix((np.ones(len(entries), dtype=np.float32), (row_idx, col_idx)), shape=shape)
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+
+    # Smoothed IDF: features shared by most of the library say little
+    df = np.bincount(matrix.indices, minlength=shape[1])
+    idf = np.log((1 + shape[0]) / (1 + df)) + 1
+    matrix = matrix @ sparse.diags((idf * np.array(kinds)).astype(np.float32))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return book_ids, sparse.csr_matrix(sparse.diags(1 / norms) @ matrix, dtype=np.float32)
+
+
+def nearest_neighbors(matrix: "sparse.csr_matrix", top_k: int = TOP_K) -> Iterator[Tuple[int, int, float]]:
+    """(row, neighbour row, cosine) for the top_k most similar other rows of every row"""
+    import numpy as np
+
+    n = matrix.shape[0]
+    if n < 2:
+        return
+    transposed = matrix.T.tocsc()
+    k = min(top_k, n - 1)
+    chunk = max(1, CHUNK_CELLS // n)
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        scores = (matrix[start:stop] @ transposed).toarray()
+        # A book is not similar to itself
+        scores[np.arange(stop - start), np.arange(start, stop)] = 0
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        for offset in range(stop - start):
+            for column, score in zip(best[offset], best_scores[offset]):
+                if score > 0:
+                    yield start + offset, int(column), float(score)
+
+
+def refresh_user(db: Session, user_id: int, force: bool = False) -> bool:
+    """Rebuild a library's similarity rows; False if it was already current"""
+    change_seq, similarity_seq = db.execute(
+        select(User.change_seq, User.similarity_seq).where(User.id == user_id)
+    ).one()
+    if not force and similarity_seq >= change_seq:
+        return False
+
+    book_ids, matrix = library_features(db, user_id)
+    rows = [
+        {"book_id": book_ids[i], "similar_book_id": book_ids[j], "user_id": user_id, "score": round(score, 4)}
+        for i, j, score in nearest_neighbors(matrix)
+    ]
+
+    try:
+        db.execute(delete(BookSimilarity).where(BookSimilarity.user_id == user_id))
+        for start in range(0, len(rows), 5000):
+            db.execute(insert(BookSimilarity), rows[start:start + 5000])
+        db.execute(update(User).where(User.id == user_id).values(similarity_seq=change_seq))
+        db.commit()
+    except IntegrityError:
+        # A rebuild of the same library in another process won the race
+        db.rollback()
+        return False
+    return True
+
+
+def similar_book_ids(db: Session, user_id: int, book_id: int, limit: int, public_only: bool = False) -> List[int]:
+    """Ids of a book's stored neighbours, most similar first"""
+    # The join also skips books deleted since the last rebuild
+    query = db.query(BookSimilarity.similar_book_id).join(
+        Book, (Book.id == BookSimilarity.similar_book_id) & (Book.user_id == user_id)
+    ).filter(BookSimilarity.user_id == user_id, BookSimilarity.book_id == book_id)
+    if public_only:
+        query = query.filter(Book.show_in_public == True)
+    return [
+        similar_id for (similar_id,) in
+        query.order_by(BookSimilarity.score.desc()).limit(limit)
+    ]
+
+
+class SimilarityRefresher:
+    """Debounced per-library rebuilds on daemon timer threads"""
+
+    def __init__(self, delay: float = REFRESH_DELAY):
+        self.delay = delay
+        self._timers: Dict[int, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, user_id: int):
+        if self.delay < 0:
+            return
+        with self._lock:
+            pending = self._timers.get(user_id)
+            if pending is not None:
+                pending.cancel()
+            timer = threading.Timer(self.delay, self._run, (user_id,))
+            timer.daemon = True
+            self._timers[user_id] = timer
+            timer.start()
+
+    def _run(self, user_id: int):
+        with self._lock:
+            if self._timers.get(user_id) is threading.current_thread():
+                del self._timers[user_id]
+        try:
+            with SessionLocal() as db:
+                refresh_user(db, user_id)
+        except Exception as e:
+            logger.error(f"Error refreshing similar books of user {user_id}: {e}")
+
+
+# Singleton instance
+similarity_refresher = SimilarityRefresher()
+
+
+def _features_changed(book: Book) -> bool:
+    state = inspect(book)
+    return any(state.attrs[name].history.has_changes() for name in _FEATURE_ATTRIBUTES)
+
+
+@event.listens_for(Session, "before_flush")
+def collect_similarity_changes(session, flush_context, instances):
+    users = {obj.user_id for obj in session.new if isinstance(obj, Book)}
+    users.update(obj.user_id for obj in session.deleted if isinstance(obj, Book))
+    users.update(
+        obj.user_id for obj in session.dirty
+        if isinstance(obj, Book) and _features_changed(obj)
+    )
+    if users:
+        session.info.setdefault("similarity_users", set()).update(users)
+
+
+@event.listens_for(Session, "after_commit")
+def schedule_similarity_refresh(session):
+    for user_id in session.info.pop("similarity_users", ()):
+        similarity_refresher.schedule(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_similarity_changes(session):
+    session.info.pop("similarity_users", None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="rebuild current libraries too")
+    parser.add_argument("--user-id", type=int, help="only this library")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        query = db.query(User.id).order_by(User.id)
+        if args.user_id is not None:
+            query = query.filter(User.id == args.user_id)
+        user_ids = [user_id for (user_id,) in query]
+        rebuilt = sum(refresh_user(db, user_id, force=args.all) for user_id in user_ids)
+    print(f"Rebuilt {rebuilt} of {len(user_ids)} libraries")
+
+
+if __name__ == "__main__":
+    main()
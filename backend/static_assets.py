@@ -0,0 +1,202 @@
+"""
+Fingerprinted, precompressed frontend assets.
+
+At startup every file in the static directory is read once, given a
+content-hashed name (app.js -> app.3f2a9c1b04de.js), precompressed with gzip
+and brotli, and kept in memory together with an index.html whose asset
+references point at the hashed names. Hashed names are served as immutable;
+original names stay reachable with an ETag for links built at runtime. Each
+encoding of an asset is its own representation with its own ETag
+("<hash>", "<hash>-gzip", "<hash>-br").
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.getenv("STATIC_DIR", "/app/static")
+STATIC_URL_PREFIX = "/static/"
+INDEX_FILE = "index.html"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Compression below this size costs more than it saves
+MIN_COMPRESS_SIZE = 512
+
+
+@dataclass
+class Asset:
+    content: bytes
+    media_type: str
+    etag: str
+    encodings: Dict[str, bytes] = field(default_factory=dict)
+
+
+def _is_compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _build_asset(content: bytes, media_type: str) -> Asset:
+    digest = hashlib.sha256(content).hexdigest()
+    asset = Asset(content=content, media_type=media_type, etag=f'"{digest[:16]}"')
+    if _is_compressible(media_type) and len(content) >= MIN_COMPRESS_SIZE:
+        asset.encodings["gzip"] = gzip.compress(content, compresslevel=9, mtime=0)
+        if brotli is not None:
+            asset.encodings["br"] = brotli.compress(content, quality=11)
+    return asset
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag of a content-coded representation: the encoding appended inside the quotes"""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag.removeprefix("W/")
+        for candidate in if_none_match.split(",")
+    )
+
+
+def _hashed_name(name: str, content: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def negotiate_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Pick the best available content coding (br before gzip) the client accepts"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class StaticAssets:
+    def __init__(self, directory: str = STATIC_DIR):
+        self.directory = directory
+        self.assets: Dict[str, Asset] = {}
+        self.immutable: set = set()
+        self.manifest: Dict[str, str] = {}
+        self.index: Optional[Asset] = None
+
+    def load(self):
+        """Read, fingerprint and compress every file in the static directory"""
+        if not os.path.isdir(self.directory):
+            logger.warning(f"Static directory {self.directory} not found")
+            return
+
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    files[rel] = f.read()
+
+        index_html = files.pop(INDEX_FILE, None)
+
+        # Binary assets first, so text assets referencing them can be rewritten
+        # before they are hashed themselves.
+        def is_text(rel):
+            return _is_compressible(mimetypes.guess_type(rel)[0] or "")
+
+        for rel in sorted(files, key=lambda r: (is_text(r), r)):
+            content = files[rel]
+            if is_text(rel):
+                content = self._rewrite(content)
+            media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+            asset = _build_asset(content, media_type)
+            hashed = _hashed_name(rel, content)
+            self.assets[rel] = asset
+            self.assets[hashed] = asset
+            self.immutable.add(hashed)
+            self.manifest[rel] = hashed
+
+        if index_html is not None:
+            self.index = _build_asset(self._rewrite(index_html), "text/html; charset=utf-8")
+
+        logger.info(f"Loaded {len(self.manifest)} static assets from {self.directory}")
+
+    def _rewrite(self, content: bytes) -> bytes:
+        for rel, hashed in self.manifest.items():
+            content = content.replace(
+                f"{STATIC_URL_PREFIX}{rel}".encode(),
+                f"{STATIC_URL_PREFIX}{hashed}".encode()
+            )
+        return content
+
+    def respond(self, request: Request, asset: Asset, cache_control: str) -> Response:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), asset.encodings)
+        headers = {
+            "Cache-Control": cache_control,
+            "ETag": encoded_etag(asset.etag, encoding),
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        body = asset.content
+        if encoding:
+            body = asset.encodings[encoding]
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(body, headers=headers, media_type=asset.media_type)
+
+    def index_response(self, request: Request) -> Optional[Response]:
+        if self.index is None:
+            return None
+        return self.respond(request, self.index, REVALIDATE)
+
+    async def __call__(self, scope, receive, send):
+        """ASGI app for the /static mount"""
+        request = Request(scope, receive)
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        rel = path.lstrip("/")
+        asset = self.assets.get(rel)
+        if request.method not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+        elif asset is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+        else:
+            cache_control = IMMUTABLE if rel in self.immutable else REVALIDATE
+            response = self.respond(request, asset, cache_control)
+        await response(scope, receive, send)
+
+
+# Singleton instance
+static_assets = StaticAssets()
@@ -0,0 +1,97 @@
+"""
+Change tracking for delta sync (GET /api/books/changes).
+
+Every flush that inserts, updates or deletes books draws numbers from the
+owner's monotonic counter (users.change_seq) and stamps each changed book
+with its own number; deleted books leave a tombstone carrying one. The
+counter row is updated in the writing transaction, so concurrent writers for
+the same user are serialized and a client that has seen token N has seen
+every change <= N.
+
+Bulk Query.update()/delete() calls bypass the ORM flush and are not tracked
+(bulk imports in bulk_io.py stamp their books with allocate_seq() themselves),
+and neither are changes to a shared edition (see editions.py) that books
+inherit metadata from.
+"""
+from collections import defaultdict
+from typing import List, Tuple
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models import User, Book, Location, BookTombstone
+
+
+def allocate_seq(session: Session, user_id: int, count: int) -> int:
+    """Reserve `count` sequence numbers for a user and return the first one"""
+    last = session.connection().execute(
+        update(User.__table__)
+        .where(User.__table__.c.id == user_id)
+        .values(change_seq=User.__table__.c.change_seq + count)
+        .returning(User.__table__.c.change_seq)
+    ).scalar_one()
+    return last - count + 1
+
+
+@event.listens_for(Session, "before_flush")
+def stamp_book_changes(session, flush_context, instances):
+    # dicts keep insertion order and drop duplicates
+    changed = defaultdict(dict)
+    for obj in session.new:
+        if isinstance(obj, Book):
+            changed[obj.user_id][obj] = None
+    for obj in session.dirty:
+        if isinstance(obj, Book) and session.is_modified(obj):
+            changed[obj.user_id][obj] = None
+
+    deleted = defaultdict(list)
+    for obj in session.deleted:
+        if isinstance(obj, Book):
+            deleted[obj.user_id].append(obj)
+        elif isinstance(obj, Location):
+            # The flush will null location_id on these books
+            for book in obj.books:
+                if book not in session.deleted:
+                    changed[book.user_id][book] = None
+
+    for user_id in sorted(set(changed) | set(deleted)):
+        books = list(changed.get(user_id, {}))
+        removed = deleted.get(user_id, [])
+        seq = allocate_seq(session, user_id, len(books) + len(removed))
+        for book in books:
+            book.change_seq = seq
+            seq += 1
+        for book in removed:
+            session.add(BookTombstone(user_id=user_id, book_id=book.id, change_seq=seq))
+            seq += 1
+
+
+def get_changes(db: Session, user_id: int, since: int, limit: int, options=()) -> Tuple[List[Book], List[int], int, bool]:
+    """
+    Books changed and ids deleted after `since`, in sequence order, at most
+    `limit` entries. Returns (books, deleted_ids, next_token, has_more).
+    """
+    books = db.query(Book).options(*options).filter(
+        Book.user_id == user_id,
+        Book.change_seq > since
+    ).order_by(Book.change_seq).limit(limit + 1).all()
+    
+    tombstones = db.query(BookTombstone.book_id, BookTombstone.change_seq).filter(
+        BookTombstone.user_id == user_id,
+        BookTombstone.change_seq > since
+    ).order_by(BookTombstone.change_seq).limit(limit + 1).all()
+    
+    entries = sorted(
+        [(book.change_seq, book, None) for book in books] +
+        [(row.change_seq, None, row.book_id) for row in tombstones],
+        key=lambda entry: entry[0]
+    )
+    page = entries[:limit]
+    next_token = page[-1][0] if page else since
+    
+    return (
+        [book for _, book, _ in page if book is not None],
+        [book_id for _, _, book_id in page if book_id is not None],
+        next_token,
+        len(entries) > limit
+    )
@@ -0,0 +1,111 @@
+"""
+Per-user tag usage counts for tag suggestions (GET /api/tags/suggest).
+
+Tags are shared by all users, so how often a user has used a tag lives in
+`user_tag_counts`. The counts are adjusted by the same flush that changes a
+book's tags: before the flush the tags added to and removed from books are
+collected (all tags of new and deleted books), after it the deltas are
+applied in one batched upsert. Suggestions are then a prefix scan of the
+lower(name) text_pattern_ops index on tags joined to the user's counts, with
+no aggregate over book_tags.
+
+Bulk inserts into book_tags (the benchmark generator, migrations) bypass the
+flush and call recount() afterwards.
+"""
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Book, Tag, UserTagCount, book_tags
+
+SUGGEST_LIMIT = 10
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def suggest_tags(db: Session, user_id: int, prefix: str = "",
+                 limit: int = SUGGEST_LIMIT) -> List[Tuple[str, int]]:
+    """The user's most used tags starting with `prefix` (case-insensitive), as (name, count)"""
+    query = db.query(Tag.name, UserTagCount.book_count).join(
+        UserTagCount, UserTagCount.tag_id == Tag.id
+    ).filter(
+        UserTagCount.user_id == user_id,
+        UserTagCount.book_count > 0
+    )
+    prefix = prefix.strip().lower()
+    if prefix:
+        query = query.filter(func.lower(Tag.name).like(_escape_like(prefix) + "%", escape="\\"))
+    return query.order_by(UserTagCount.book_count.desc(), Tag.name).limit(limit).all()
+
+
+def recount(conn: Connection, user_id: Optional[int] = None):
+    """Rebuild the counts from book_tags (all users or one)"""
+    counts = UserTagCount.__table__
+    stale = delete(counts)
+    source = select(
+        book_tags.c.user_id, book_tags.c.tag_id, func.count().label("book_count")
+    ).group_by(book_tags.c.user_id, book_tags.c.tag_id)
+    if user_id is not None:
+        stale = stale.where(counts.c.user_id == user_id)
+        source = source.where(book_tags.c.user_id == user_id)
+    conn.execute(stale)
+    conn.execute(counts.insert().from_select(["user_id", "tag_id", "book_count"], source))
+
+
+@event.listens_for(Session, "before_flush")
+def collect_tag_changes(session, flush_context, instances):
+    deltas = session.info.setdefault("tag_count_deltas", Counter())
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Book):
+                for tag in obj.tags:
+                    deltas[obj.user_id, tag] += 1
+        for obj in session.deleted:
+            if isinstance(obj, Book):
+                for tag in obj.tags:
+                    deltas[obj.user_id, tag] -= 1
+        for obj in session.dirty:
+            if isinstance(obj, Book):
+                history = inspect(obj).attrs.tags.history
+                for tag in history.added or ():
+                    deltas[obj.user_id, tag] += 1
+                for tag in history.deleted or ():
+                    deltas[obj.user_id, tag] -= 1
+
+
+@event.listens_for(Session, "after_flush")
+def apply_tag_changes(session, flush_context):
+    deltas = session.info.pop("tag_count_deltas", None)
+    if not deltas:
+        return
+    # New tags have their ids now; sorted to take row locks in a fixed order
+    rows = sorted(
+        (
+            {"user_id": user_id, "tag_id": tag.id, "book_count": delta}
+            for (user_id, tag), delta in deltas.items() if delta and tag.id is not None
+        ),
+        key=lambda row: (row["user_id"], row["tag_id"])
+    )
+    if not rows:
+        return
+
+    connection = session.connection()
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    counts = UserTagCount.__table__
+    upsert = dialect.insert(counts)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[counts.c.user_id, counts.c.tag_id],
+        set_={"book_count": counts.c.book_count + upsert.excluded.book_count}
+    )
+    connection.execute(upsert, rows)
+    if any(row["book_count"] < 0 for row in rows):
+        connection.execute(delete(counts).where(
+            counts.c.user_id.in_({row["user_id"] for row in rows}),
+            counts.c.book_count <= 0
+        ))
@@ -0,0 +1,47 @@
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from compression import CompressionMiddleware
+
+
+def _large(request):
+    return JSONResponse({"books": ["x" * 50] * 100}, headers={"ETag": '"v1"'})
+
+
+def _small(request):
+    return JSONResponse({"ok": True})
+
+
+def _image(request):
+    return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+
+client = TestClient(CompressionMiddleware(Starlette(routes=[
+    Route("/large", _large), Route("/small", _small), Route("/image", _image)
+])))
+
+
+def test_compressed_response_gets_its_own_etag():
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"v1-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_uncompressed_responses_vary_on_accept_encoding():
+    identity = client.get("/large", headers={"Accept-Encoding": "identity"})
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] == '"v1"'
+    assert identity.headers["vary"] == small.headers["vary"] == "Accept-Encoding"
+
+
+def test_incompressible_types_pass_through():
+    response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
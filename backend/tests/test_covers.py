@@ -0,0 +1,118 @@
+import asyncio
+import functools
+import io
+import os
+import socket
+
+import httpx
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import covers
+from database import Base
+from models import Book, User
+
+COVER_URL = "https://covers.openlibrary.org/b/id/1-L.jpg"
+PUBLIC_IP = "93.184.216.34"
+
+
+def _image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 600), (200, 10, 10)).save(buffer, "BMP")
+    return buffer.getvalue()
+
+
+def image_server(request: httpx.Request) -> httpx.Response:
+    """Fake cover host: images, redirects and the 1x1 placeholder"""
+    if request.url.path == "/b/id/1-L.jpg":
+        return httpx.Response(302, headers={"location": "https://ia800100.us.archive.org/covers/1.jpg"})
+    if request.url.path == "/b/id/2-L.jpg":
+        return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data"})
+    if request.url.path == "/b/id/3-L.jpg":
+        return httpx.Response(200, content=b"GIF89a")
+    return httpx.Response(200, content=_image())
+
+
+@pytest.fixture(autouse=True)
+def cover_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(covers, "COVER_DIR", str(tmp_path / "covers"))
+    yield
+    covers.cover_cache.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def resolver(monkeypatch):
+    """Cover hosts resolve to a public address, everything else as given"""
+    async def getaddrinfo(self, host, port, **kwargs):
+        address = host if host[0].isdigit() else PUBLIC_IP
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", getaddrinfo)
+
+
+@pytest.mark.parametrize("url, allowed", [
+    (COVER_URL, True),
+    ("https://ia800100.us.archive.org/covers/1.jpg", True),
+    ("https://openlibrary.org.evil.example/1.jpg", False),
+    ("https://evilopenlibrary.org/1.jpg", False),
+    ("ftp://covers.openlibrary.org/1.jpg", False),
+    ("http://127.0.0.1/1.jpg", False),
+    ("http://169.254.169.254/latest", False),
+])
+def test_allowed_url(url, allowed):
+    assert asyncio.run(covers._allowed_url(url)) is allowed
+
+
+def fetch(url):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(image_server)) as client:
+            return await covers.cover_cache.fetch(url, client)
+    return asyncio.run(run())
+
+
+def test_fetch_follows_allowed_redirects_and_keeps_thumbnails():
+    key = fetch(COVER_URL)
+
+    assert key == covers.cover_key(COVER_URL)
+    assert sorted(os.listdir(os.path.join(covers.COVER_DIR, key))) == ["medium.webp", "small.webp"]
+
+
+def test_fetch_rejects_redirect_to_private_address():
+    assert fetch("https://covers.openlibrary.org/b/id/2-L.jpg") is None
+
+
+def test_fetch_skips_placeholder():
+    assert fetch("https://covers.openlibrary.org/b/id/3-L.jpg") is None
+    assert not os.path.exists(covers.COVER_DIR) or not os.listdir(covers.COVER_DIR)
+
+
+def test_cache_books_keeps_covers_changed_during_download(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'covers.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(covers, "SessionLocal", sessionmaker(bind=engine))
+    with Session(engine) as db:
+        user = User(email="a@example.org", username="alice", hashed_password="x")
+        db.add(user)
+        db.flush()
+        unchanged = Book(user_id=user.id, title="Unchanged", cover_url=COVER_URL)
+        changed = Book(user_id=user.id, title="Changed", cover_url=COVER_URL)
+        db.add_all([unchanged, changed])
+        db.commit()
+        unchanged_id, changed_id = unchanged.id, changed.id
+
+    def serve_and_edit(request):
+        # The owner sets another cover while the download runs
+        with Session(engine) as db:
+            db.query(Book).filter(Book.id == changed_id).one().cover_url = "https://covers.openlibrary.org/b/id/9-L.jpg"
+            db.commit()
+        return image_server(request)
+
+    monkeypatch.setattr(httpx, "AsyncClient", functools.partial(
+        httpx.AsyncClient, transport=httpx.MockTransport(serve_and_edit)
+    ))
+    asyncio.run(covers.cover_cache.cache_books([unchanged_id, changed_id]))
+
+    with Session(engine) as db:
+        keys = dict(db.query(Book.id, Book.cover_cache_key))
+    assert keys == {unchanged_id: covers.cover_key(COVER_URL), changed_id: None}
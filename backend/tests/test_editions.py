@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import Base
+from editions import edition_backed_ilike
+from models import Book, Edition, User
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(email="a@example.org", username="alice", hashed_password="x")
+        edition = Edition(isbn="9780306406157", title="Edition Title", cover_url="https://covers.example/1.jpg",
+                          description="From the edition")
+        session.add_all([user, edition])
+        session.flush()
+        session.add(Book(user_id=user.id, isbn="9780306406157", edition=edition))
+        session.commit()
+        yield session
+
+
+def test_unset_fields_follow_the_edition(db):
+    book = db.query(Book).one()
+    assert book.description == "From the edition"
+    assert db.query(Book.description).scalar() == "From the edition"
+
+
+def test_cleared_field_stays_empty(db):
+    book = db.query(Book).one()
+    book.clear("description")
+    db.commit()
+    db.expire_all()
+
+    book = db.query(Book).one()
+    assert book.description is None
+    assert db.query(Book.description).scalar() is None
+    assert book.cover_url == "https://covers.example/1.jpg"
+
+
+def test_new_value_undoes_a_clear(db):
+    book = db.query(Book).one()
+    book.clear("description")
+    db.commit()
+    book.description = "My own"
+    db.commit()
+    db.expire_all()
+
+    assert db.query(Book).one().description == "My own"
+
+
+def test_value_equal_to_the_edition_is_not_stored(db):
+    book = db.query(Book).one()
+    book.clear("description")
+    db.commit()
+    book.description = "From the edition"
+    db.commit()
+    db.expire_all()
+
+    book = db.query(Book).one()
+    assert book.description_override is None
+    assert book.description == "From the edition"
+
+
+@pytest.mark.parametrize("pattern, found", [
+    ("%edition tit%", True),
+    ("%nothing%", False),
+])
+def test_title_search_matches_the_edition(db, pattern, found):
+    assert (db.query(Book).filter(edition_backed_ilike("title", pattern)).count() == 1) is found
+
+
+def test_title_search_prefers_the_override(db):
+    db.query(Book).one().title = "Own Title"
+    db.commit()
+
+    assert db.query(Book).filter(edition_backed_ilike("title", "%own title%")).count() == 1
+    assert db.query(Book).filter(edition_backed_ilike("title", "%edition title%")).count() == 0
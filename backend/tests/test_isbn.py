@@ -0,0 +1,29 @@
+import pytest
+
+from isbn import is_valid_isbn10, is_valid_isbn13, to_isbn13
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("9780306406157", "9780306406157"),
+    ("978-0-306-40615-7", "9780306406157"),
+    ("0306406152", "9780306406157"),
+    ("0-306-40615-2", "9780306406157"),
+    ("080442957x", "9780804429573"),
+    ("9780306406158", None),
+    ("1234567890123", None),
+    ("", None),
+    (None, None),
+])
+def test_to_isbn13(raw, expected):
+    assert to_isbn13(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [
+    "97803064061²7",   # superscript two: str.isdigit() is True, int() fails
+    "978030640615٧",   # Arabic-Indic seven
+    "03064061５2",      # fullwidth five
+])
+def test_non_ascii_digits_are_invalid(raw):
+    assert not is_valid_isbn13(raw)
+    assert not is_valid_isbn10(raw)
+    assert to_isbn13(raw) is None
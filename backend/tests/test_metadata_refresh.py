@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import Base
+from metadata_refresh import candidates, write_back
+from models import Book, User
+
+NOW = datetime(2026, 10, 19, tzinfo=timezone.utc)
+METADATA = {"title": "Found Title", "authors": ["Ann Author"], "cover_url": "https://covers.openlibrary.org/b/id/1-L.jpg"}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as session:
+        user = User(email="a@example.org", username="alice", hashed_password="x")
+        session.add(user)
+        session.flush()
+        session.add_all([
+            Book(user_id=user.id, isbn="9780306406157", title="Unknown"),
+            Book(user_id=user.id, isbn="9781111111113", title="Unknown"),
+        ])
+        session.commit()
+        yield session
+
+
+def test_write_back_links_editions_and_drops_placeholder_titles(db):
+    books = candidates(db, 10, NOW)
+    db.rollback()
+
+    enriched = write_back(db, books, {isbn13: METADATA for _, isbn13 in books}, NOW)
+
+    assert enriched == 2
+    for book in db.query(Book).all():
+        assert book.title == "Found Title"
+        assert book.metadata_fetched_at is not None
+
+
+def test_write_back_sees_changes_made_during_the_lookups(db):
+    books = candidates(db, 10, NOW)
+    db.rollback()
+    edited, deleted = db.query(Book).order_by(Book.id).all()
+    edited.title = "Typed Meanwhile"
+    db.delete(deleted)
+    db.commit()
+    db.expunge_all()
+
+    enriched = write_back(db, books, {isbn13: METADATA for _, isbn13 in books}, NOW)
+
+    assert enriched == 1
+    book = db.query(Book).one()
+    assert book.title == "Typed Meanwhile"
+    assert book.cover_url == METADATA["cover_url"]
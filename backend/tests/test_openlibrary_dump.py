@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from database import Base
+from models import Edition
+from openlibrary_dump import AUTHORS_MAX_LENGTH, authors_json, ingest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        Base.metadata.create_all(conn)
+        # Already in the catalog: only empty fields get filled
+        conn.execute(Edition.__table__.insert().values(isbn="9781111111113", title="Kept Title"))
+        conn.commit()
+        yield conn
+
+
+def editions(conn):
+    return {row.isbn: row for row in conn.execute(select(Edition.__table__))}
+
+
+def test_ingest(conn):
+    counts = ingest(conn, fixture("ol_dump_editions.txt"), fixture("ol_dump_authors.txt"), fixture("ol_dump_works.txt"))
+
+    assert counts == {"records": 3, "inserted": 1, "updated": 1}
+    rows = editions(conn)
+    assert set(rows) == {"9780306406157", "9781111111113"}
+
+    # Authors and description from the work, the ISBN-10 stored as ISBN-13
+    work_edition = rows["9780306406157"]
+    assert json.loads(work_edition.authors) == ["Ann Author", "Bob Writer"]
+    assert work_edition.description == "About the work"
+    assert work_edition.cover_url.endswith("/covers/id/123-L.jpg")
+    assert (work_edition.publisher, work_edition.published_year, work_edition.page_count) == ("First Press", 2001, 320)
+
+    existing = rows["9781111111113"]
+    assert existing.title == "Kept Title"
+    assert json.loads(existing.authors) == ["Bob Writer"]
+    assert existing.description == "Its own description"
+    assert existing.publisher == "Second Press"
+
+
+def test_ingest_without_authors_and_works(conn):
+    ingest(conn, fixture("ol_dump_editions.txt"))
+
+    work_edition = editions(conn)["9780306406157"]
+    assert work_edition.authors is None
+    assert work_edition.description is None
+
+
+def test_authors_json_drops_whole_names():
+    names = ["N" * 200, "M" * 200, "O" * 200]
+
+    value = authors_json(names)
+
+    assert len(value) <= AUTHORS_MAX_LENGTH
+    assert json.loads(value) == names[:2]
+    assert authors_json(["X" * AUTHORS_MAX_LENGTH]) is None
+    assert authors_json([]) is None
@@ -0,0 +1,38 @@
+import pytest
+from starlette.testclient import TestClient
+
+from static_assets import StaticAssets, brotli
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "app.js").write_text("console.log('mylibrary');\n" * 100)
+    assets = StaticAssets(str(tmp_path))
+    assets.load()
+    return TestClient(assets)
+
+
+def test_each_encoding_has_its_own_etag(client):
+    identity = client.get("/app.js", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/app.js", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+    assert identity.headers["vary"] == gzipped.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_etag(client):
+    response = client.get("/app.js", headers={"Accept-Encoding": "br, gzip"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"].endswith('-br"')
+
+
+def test_not_modified_only_for_the_same_representation(client):
+    etag = client.get("/app.js", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+    assert client.get("/app.js", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    assert client.get("/app.js", headers={"Accept-Encoding": "gzip", "If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/app.js", headers={"Accept-Encoding": "identity", "If-None-Match": etag}).status_code == 200
@@ -0,0 +1,223 @@
+"""
+Opt-in OpenTelemetry tracing.
+
+Enabled with TRACING_EXPORTER (console, file or otlp). Spans are recorded for
+every HTTP/WebSocket request (named after the route template, W3C
+traceparent headers are honoured), every SQL statement, every Open Library
+request (lookups and their author and search sub-requests) and CSV import
+rows and metadata refresh batches. Log records carry otelTraceID and
+otelSpanID, so log lines can be matched to traces.
+
+    console   spans as JSON on stdout
+    file      spans as JSON lines appended to TRACING_FILE
+    otlp      OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (default
+              http://localhost:4318), e.g. a local collector or Jaeger;
+              needs opentelemetry-exporter-otlp-proto-http
+
+TRACING_SAMPLE_RATIO samples that share of traces (a sampled caller's
+traceparent always wins). Without an exporter nothing is installed: span()
+returns a shared no-op context manager and the SQL hooks are not attached.
+Unsampled requests only cost a is_recording() check per statement.
+OpenTelemetry itself is only imported by setup_tracing() when enabled.
+"""
+from contextlib import nullcontext
+from typing import Dict, Optional
+import logging
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Set by setup_tracing() once OpenTelemetry is imported
+trace = propagate = SpanKind = Status = StatusCode = None
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "mylibrary")
+# Longer statements are cut in span attributes; parameters are never recorded
+MAX_STATEMENT_LENGTH = 2000
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [trace_id=%(otelTraceID)s span_id=%(otelSpanID)s] %(message)s"
+
+_tracer = None
+_provider = None
+
+
+class _NoSpan:
+    """Stands in for a span while tracing is off"""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def add_event(self, name, attributes=None):
+        pass
+
+
+_NO_SPAN = nullcontext(_NoSpan())
+
+
+def span(name: str, attributes: Optional[Dict] = None):
+    """Context manager for a child span of the current one; a no-op while tracing is off"""
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def _create_exporter():
+    if TRACING_EXPORTER == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if TRACING_EXPORTER == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter(
+            out=open(TRACING_FILE, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n"
+        )
+    if TRACING_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.error("TRACING_EXPORTER=otlp needs opentelemetry-exporter-otlp-proto-http; tracing is off")
+            return None
+        return OTLPSpanExporter()
+    logger.error(f"Unknown TRACING_EXPORTER {TRACING_EXPORTER!r}; tracing is off")
+    return None
+
+
+def _add_trace_context_to_logs():
+    """Give every log record otelTraceID/otelSpanID ("0" outside a span)"""
+    factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        context = trace.get_current_span().get_span_context()
+        if context.is_valid:
+            record.otelTraceID = format(context.trace_id, "032x")
+            record.otelSpanID = format(context.span_id, "016x")
+        else:
+            record.otelTraceID = record.otelSpanID = "0"
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+    if not logging.getLogger().handlers:
+        logging.basicConfig(format=LOG_FORMAT)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware with one server span per request, kept open until the
+    response body is sent (covers streaming responses and WebSockets)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        method = scope.get("method", "WEBSOCKET")
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        with _tracer.start_as_current_span(
+            f"{method} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": method, "url.path": scope["path"]},
+        ) as request_span:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    request_span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        request_span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # Matched by the router meanwhile; the template keeps span names low-cardinality
+                route = scope.get("route")
+                if route is not None:
+                    request_span.update_name(f"{method} {route.path}")
+                    request_span.set_attribute("http.route", route.path)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not trace.get_current_span().is_recording():
+        return
+    operation = (statement.split(None, 1) or ["SQL"])[0].upper()
+    statement_span = _tracer.start_span(operation, kind=SpanKind.CLIENT, attributes={
+        "db.system": conn.dialect.name,
+        "db.statement": statement[:MAX_STATEMENT_LENGTH],
+        "db.executemany": executemany,
+    })
+    conn.info.setdefault("trace_spans", []).append(statement_span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        spans.pop().end()
+
+
+def _handle_error(exception_context):
+    spans = exception_context.connection.info.get("trace_spans") if exception_context.connection else None
+    if spans:
+        statement_span = spans.pop()
+        statement_span.record_exception(exception_context.original_exception)
+        statement_span.set_status(Status(StatusCode.ERROR))
+        statement_span.end()
+
+
+def install_engine_hooks(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def setup_tracing(app, *engines: Engine) -> None:
+    """Install the tracer provider, the request middleware and the SQL hooks"""
+    global _tracer, _provider, trace, propagate, SpanKind, Status, StatusCode
+    if not TRACING_EXPORTER or TRACING_EXPORTER == "none":
+        return
+    try:
+        from opentelemetry import propagate, trace
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+    except ImportError:  # optional dependency
+        logger.error("TRACING_EXPORTER is set but opentelemetry-sdk is not installed; tracing is off")
+        return
+
+    exporter = _create_exporter()
+    if exporter is None:
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("mylibrary")
+
+    _add_trace_context_to_logs()
+    for engine in engines:
+        if engine is not None:
+            install_engine_hooks(engine)
+    app.add_middleware(TracingMiddleware)
+
+
+def shutdown_tracing() -> None:
+    """Export the spans still buffered"""
+    if _provider is not None:
+        _provider.shutdown()
@@ -0,0 +1,173 @@
+"""
+Micro-benchmark: near-duplicate lookup time as one library grows.
+
+Fills a single user's library to each size in --sizes (titles from a few
+thousand pseudo-words plus the generator's vocabulary, authors from its name
+pools, LSH band rows written the way the app writes them) and times
+duplicates.find_near_duplicates for a mix of re-spelled existing titles and
+unseen titles. For comparison it also times a naive scan that compares the
+query against every book of the library.
+
+Usage (from the repository root):
+    python benchmarks/bench_duplicates.py [--sizes 1000,10000,100000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+if "--database-url" not in sys.argv:
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "duplicates.db"))
+
+from generator import WORDS, FIRST_NAMES, LAST_NAMES, BATCH_SIZE
+
+
+SYLLABLES = "ka ro mi ten sa lu ber do fin gra hol ve nor sti wal mer an el is ur".split()
+
+
+def vocabulary(size=3000, seed=7):
+    """WORDS plus pseudo-words, so unrelated titles overlap about as much as real ones"""
+    rng = random.Random(seed)
+    words = set(WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize())
+    return sorted(words)
+
+
+VOCABULARY = vocabulary()
+
+
+def random_book(rng):
+    title = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 6)))
+    authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.choice((1, 1, 2)))]
+    return title, json.dumps(authors)
+
+
+def respell(rng, title):
+    """The same book typed differently: case, punctuation, a subtitle marker"""
+    variants = (title.upper(), title + ".", title.replace(" ", "  "), title + ":", title.lower())
+    return rng.choice(variants)
+
+
+def grow(engine, rng, user_id, start, stop):
+    from duplicates import band_keys, shingles
+    from models import Book, BookBand
+
+    with engine.begin() as conn:
+        for batch_start in range(start, stop, BATCH_SIZE):
+            books, bands = [], []
+            for book_id in range(batch_start + 1, min(batch_start + BATCH_SIZE, stop) + 1):
+                title, authors = random_book(rng)
+                books.append({"id": book_id, "user_id": user_id, "title": title, "authors": authors,
+                              "change_seq": book_id})
+                bands.extend(
+                    {"book_id": book_id, "user_id": user_id, "band": band, "bucket": bucket}
+                    for band, bucket in band_keys(shingles(title, authors))
+                )
+            conn.execute(Book.__table__.insert(), books)
+            conn.execute(BookBand.__table__.insert(), bands)
+
+
+def naive_scan(db, user_id, title, authors):
+    from duplicates import THRESHOLD, jaccard, shingles
+    from models import Book
+
+    grams = shingles(title, authors)
+    return [
+        book_id for book_id, other_title, other_authors in
+        db.query(Book.id, Book.title, Book.authors).filter(Book.user_id == user_id)
+        if jaccard(grams, shingles(other_title, other_authors)) >= THRESHOLD
+    ]
+
+
+def timed(fn, queries):
+    timings, found = [], 0
+    for title, authors in queries:
+        start = time.perf_counter()
+        found += bool(fn(title, authors))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "hit_rate": round(found / len(queries), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="database to use (tables are recreated)")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--naive-queries", type=int, default=5, help="queries for the full-scan baseline (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from database import Base, engine, SessionLocal
+    from duplicates import find_near_duplicates
+    from models import User
+    from sqlalchemy import text
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{
+            "id": 1, "email": "dup@example.com", "username": "dup", "hashed_password": "-", "change_seq": 0,
+        }])
+    user_id = 1
+
+    rng = random.Random(args.seed)
+    results = []
+    size = 0
+    for target in sorted(int(s) for s in args.sizes.split(",")):
+        grow(engine, rng, user_id, size, target)
+        size = target
+        if engine.dialect.name == "postgresql":
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text("ANALYZE"))
+
+        with SessionLocal() as db:
+            existing = db.execute(text(
+                "SELECT title, authors FROM books WHERE user_id = :user_id ORDER BY id"
+            ), {"user_id": user_id}).all()
+            queries = []
+            for i in range(args.queries):
+                if i % 2:
+                    title, authors = rng.choice(existing)
+                    queries.append((respell(rng, title), authors))
+                else:
+                    queries.append(random_book(rng))
+
+            entry = {"books": size, "lsh": timed(
+                lambda title, authors: find_near_duplicates(db, user_id, title, authors), queries
+            )}
+            if args.naive_queries:
+                entry["scan"] = timed(
+                    lambda title, authors: naive_scan(db, user_id, title, authors),
+                    queries[:args.naive_queries]
+                )
+            results.append(entry)
+
+    if args.json:
+        print(json.dumps({"dialect": engine.dialect.name, "queries": args.queries, "results": results}))
+        return
+
+    print(f"Near-duplicate lookup on {engine.dialect.name} ({args.queries} queries, half re-spelled existing titles)")
+    print(f"  {'books':>8}  {'lsh p50':>9}  {'lsh p95':>9}  {'hit rate':>8}  {'scan p50':>10}")
+    for entry in results:
+        scan = f"{entry['scan']['p50_ms']:8.2f} ms" if "scan" in entry else "-"
+        print(f"  {entry['books']:>8}  {entry['lsh']['p50_ms']:6.2f} ms  {entry['lsh']['p95_ms']:6.2f} ms"
+              f"  {entry['lsh']['hit_rate']:>8.2f}  {scan:>10}")
+
+
+if __name__ == "__main__":
+    main()
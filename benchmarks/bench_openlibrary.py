@@ -0,0 +1,113 @@
+"""
+Resilience benchmark: ISBN lookups against a fault-injecting Open Library stub.
+
+Runs the same batch of lookups through services.OpenLibraryService under a
+few upstream conditions (healthy, ISBNs redirected to their edition like on
+openlibrary.org, flaky 5xx/429, slow tail with and without hedging, full
+outage) and reports latency, outcomes, upstream requests and
+the circuit breaker state afterwards. A fresh service instance is used per
+condition so breaker state does not leak between them.
+
+Usage (from the repository root):
+    python benchmarks/bench_openlibrary.py [--lookups 200] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generator import isbn13
+from openlibrary_stub import OpenLibraryStub
+
+# name, stub faults, service settings
+CONDITIONS = [
+    ("healthy", {}, {}),
+    ("redirect", {"redirect": True}, {}),
+    ("flaky", {"error_rate": 0.3}, {}),
+    ("slow_tail", {"slow_rate": 0.1, "slow_ms": 2000}, {}),
+    ("slow_tail_hedged", {"slow_rate": 0.1, "slow_ms": 2000}, {"OPENLIBRARY_HEDGE_AFTER": 0.2}),
+    ("outage", {"error_rate": 1.0}, {}),
+]
+
+
+async def run_lookups(service, isbns, concurrency):
+    from services import OpenLibraryUnavailable
+
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, outcomes = [], {"found": 0, "not_found": 0, "unavailable": 0}
+
+    async def one(isbn):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                outcomes["found" if await service.lookup_isbn(isbn, queue_timeout=None) else "not_found"] += 1
+            except OpenLibraryUnavailable:
+                outcomes["unavailable"] += 1
+            timings.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(isbn) for isbn in isbns))
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 1),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 1),
+        "max_ms": round(timings[-1], 1),
+        **outcomes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    import services
+    logging.getLogger("services").setLevel(logging.ERROR)
+
+    isbns = [isbn13(10**8 + i) for i in range(args.lookups)]
+    results = []
+    for name, faults, settings in CONDITIONS:
+        defaults = {key: getattr(services, key) for key in settings}
+        for key, value in settings.items():
+            setattr(services, key, value)
+        try:
+            with OpenLibraryStub(seed=1, **faults) as stub:
+                service = services.OpenLibraryService()
+                service.BASE_URL = stub.url
+                started = time.perf_counter()
+                entry = asyncio.run(run_lookups(service, isbns, args.concurrency))
+                entry.update(
+                    condition=name,
+                    seconds=round(time.perf_counter() - started, 2),
+                    upstream_requests=stub.requests,
+                    circuit=service.breaker.state,
+                    metrics=dict(service.metrics),
+                )
+        finally:
+            for key, value in defaults.items():
+                setattr(services, key, value)
+        results.append(entry)
+
+    if args.json:
+        print(json.dumps({"lookups": args.lookups, "concurrency": args.concurrency, "results": results}))
+        return
+
+    print(f"{args.lookups} lookups, {args.concurrency} concurrent")
+    print(f"  {'condition':<18} {'p50':>8} {'p95':>8} {'max':>8}  {'found':>5} {'miss':>5} {'unavail':>7}"
+          f"  {'upstream':>8}  circuit")
+    for entry in results:
+        print(f"  {entry['condition']:<18} {entry['p50_ms']:6.1f}ms {entry['p95_ms']:6.1f}ms {entry['max_ms']:6.0f}ms"
+              f"  {entry['found']:>5} {entry['not_found']:>5} {entry['unavailable']:>7}"
+              f"  {entry['upstream_requests']:>8}  {entry['circuit']}")
+
+
+if __name__ == "__main__":
+    main()
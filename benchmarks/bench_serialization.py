@@ -0,0 +1,134 @@
+"""
+Micro-benchmark: serialization time and bytes on the wire for one page of books.
+
+Compares FastAPI's default path (validate each row, dump to dicts, encode with
+the stdlib json module) against orjson and the precompiled TypeAdapter paths
+(the list endpoints use type_adapter_orjson), then reports payload size raw, gzip and brotli.
+
+Usage (from the repository root):
+    python benchmarks/bench_serialization.py [--books 500] [--repeat 20]
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from models import Book, Tag, Location
+from schemas import BookResponse
+from serialization import book_list_adapter, json_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_books(count):
+    now = datetime.now(timezone.utc)
+    tags = [Tag(id=i, name=f"tag-{i}", created_at=now) for i in range(20)]
+    location = Location(id=1, user_id=1, name="Wohnzimmer Regal 1", created_at=now)
+    books = []
+    for i in range(count):
+        books.append(Book(
+            id=i + 1,
+            user_id=1,
+            isbn=f"978{i:010d}",
+            title=f"The Collected Works, Volume {i}",
+            authors=json.dumps([f"Author {i % 50}", f"Co-Author {i % 7}"]),
+            cover_url=f"https://covers.openlibrary.org/b/id/{1000000 + i}-L.jpg",
+            publisher="Penguin Random House",
+            published_year=1950 + i % 70,
+            page_count=200 + i % 400,
+            description="A long description of the book. " * 20,
+            location_id=1,
+            location=location,
+            condition="good",
+            notes="Signed first edition." if i % 10 == 0 else None,
+            is_pinned=i % 25 == 0,
+            show_in_public=True,
+            created_at=now,
+            updated_at=now,
+            tags=tags[i % 20:i % 20 + 3],
+        ))
+    return books
+
+
+def fastapi_default(books):
+    models = [BookResponse.model_validate(book) for book in books]
+    content = [m.model_dump(mode="json") for m in models]
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def orjson_models(books):
+    models = [BookResponse.model_validate(book) for book in books]
+    return orjson.dumps([m.model_dump(mode="json") for m in models])
+
+
+def type_adapter_dump_json(books):
+    return book_list_adapter.dump_json(book_list_adapter.validate_python(books, from_attributes=True))
+
+
+def type_adapter_orjson(books):
+    """What serialization.json_response does"""
+    return json_response(book_list_adapter, book_list_adapter.validate_python(books, from_attributes=True)).body
+
+
+def measure(fn, books, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = fn(books)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    books = make_books(args.books)
+    results = {"books": args.books, "serializers": {}, "wire_bytes": {}}
+
+    payload = None
+    serializers = (
+        ("fastapi_default", fastapi_default),
+        ("orjson", orjson_models),
+        ("type_adapter_dump_json", type_adapter_dump_json),
+        ("type_adapter_orjson", type_adapter_orjson),
+    )
+    for name, fn in serializers:
+        median_ms, payload = measure(fn, books, args.repeat)
+        results["serializers"][name] = round(median_ms, 2)
+
+    results["wire_bytes"]["identity"] = len(payload)
+    results["wire_bytes"]["gzip"] = len(gzip.compress(payload, compresslevel=6))
+    if brotli is not None:
+        results["wire_bytes"]["br"] = len(brotli.compress(payload, quality=4))
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    print(f"Serializing {args.books} books (median of {args.repeat} runs)")
+    for name, ms in results["serializers"].items():
+        print(f"  {name:<24} {ms:8.2f} ms")
+    print("Bytes on the wire")
+    for name, size in results["wire_bytes"].items():
+        print(f"  {name:<24} {size:8d} B")
+
+
+if __name__ == "__main__":
+    main()
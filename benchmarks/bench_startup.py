@@ -0,0 +1,180 @@
+"""
+Cold start: import time of the app, the migration check and time to first response.
+
+Runs fresh interpreters, so nothing is cached between measurements:
+
+    import      `python -X importtime -c "import main"`, total and the
+                slowest packages; also fails if a module that is meant to be
+                imported lazily (LAZY_MODULES) gets imported at startup
+    migrate     `python migrate.py` against a database already at head
+    first 200   uvicorn started until GET /api/health answers 200
+
+Each is measured --repeat times and the best run is reported. Exits with
+status 1 if a best run exceeds its budget or a lazy module is imported.
+
+Usage (from the repository root):
+    python benchmarks/bench_startup.py [--repeat 3] [--import-budget 2.5] [--top 10]
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "backend"))
+
+# Slow or optional packages that only the code paths needing them import
+LAZY_MODULES = ["httpx", "numpy", "scipy", "jose", "passlib", "pyarrow", "opentelemetry", "redis", "PIL"]
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)$")
+
+
+def run_import(env: dict):
+    """(total seconds, {root package: cumulative seconds}, lazy modules imported)"""
+    code = (
+        "import sys, json, main; "
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    total = 0
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, name = match.groups()
+        total += int(self_us)
+        root = name.split(".")[0]
+        # The outermost import of a package includes its submodules
+        if root != "main":
+            packages[root] = max(packages.get(root, 0), int(cumulative_us) / 1e6)
+    imported = json.loads(result.stdout.strip().splitlines()[-1])
+    return total / 1e6, packages, imported
+
+
+def run_migrate(env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_first_response(env: dict, timeout: float = 30.0) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/health"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError(f"no response from {url} within {timeout} s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def stamp_head(path: str):
+    """A SQLite database whose alembic_version is at head"""
+    sys.path.insert(0, BACKEND_DIR)
+    from migrate import head_revisions
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)")
+        conn.execute("DELETE FROM alembic_version")
+        conn.executemany("INSERT INTO alembic_version VALUES (?)", [(head,) for head in head_revisions()])
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list")
+    parser.add_argument("--import-budget", type=float, default=2.5, help="seconds")
+    parser.add_argument("--migrate-budget", type=float, default=0.3, help="seconds")
+    parser.add_argument("--first-response-budget", type=float, default=4.0, help="seconds")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mylibrary-startup-")
+    database = os.path.join(workdir, "startup.db")
+    stamp_head(database)
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{database}",
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+        METADATA_REFRESH_INTERVAL="0",
+        SIMILARITY_REFRESH_DELAY="-1",
+        PYTHONDONTWRITEBYTECODE="1",
+    )
+
+    imports = [run_import(env) for _ in range(args.repeat)]
+    import_seconds, packages, lazy_imported = min(imports, key=lambda run: run[0])
+    migrate_seconds = min(run_migrate(env) for _ in range(args.repeat))
+    first_response_seconds = min(run_first_response(env) for _ in range(args.repeat))
+
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    results = {
+        "import_s": round(import_seconds, 3),
+        "migrate_check_s": round(migrate_seconds, 3),
+        "first_response_s": round(first_response_seconds, 3),
+        "slowest_packages": [{"package": name, "s": round(seconds, 3)} for name, seconds in top],
+        "lazy_modules_imported": lazy_imported,
+    }
+
+    failures = []
+    for label, seconds, budget in (
+        ("import main", import_seconds, args.import_budget),
+        ("migration check", migrate_seconds, args.migrate_budget),
+        ("first response", first_response_seconds, args.first_response_budget),
+    ):
+        if seconds > budget:
+            failures.append(f"{label}: {seconds:.3f} s > {budget:.3f} s")
+    if lazy_imported:
+        failures.append(f"imported at startup: {', '.join(lazy_imported)}")
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"import main      {import_seconds:7.3f} s  (budget {args.import_budget} s)")
+        print(f"migration check  {migrate_seconds:7.3f} s  (budget {args.migrate_budget} s)")
+        print(f"first response   {first_response_seconds:7.3f} s  (budget {args.first_response_budget} s)")
+        print("slowest packages:")
+        for name, seconds in top:
+            print(f"  {name:<24} {seconds:7.3f} s")
+
+    if failures:
+        print("Over budget:", file=sys.stderr)
+        for line in failures:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
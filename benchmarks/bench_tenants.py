@@ -0,0 +1,114 @@
+"""
+Tenant isolation: a small library's read latency while another one grows.
+
+For each size in --sizes the database is regenerated with two libraries, a
+small one of --small-books and a big one of that size, and the read
+scenarios (see scenarios.py) are timed against the small library. On
+PostgreSQL, --partitions N hash-partitions the books tables first (see
+backend/partitioning.py); run once without and once with it to compare.
+Exits with status 1 if the small library's p50 for a scenario at the largest
+size exceeds --max-slowdown times its p50 at the smallest size.
+
+Usage (from the repository root):
+    python benchmarks/bench_tenants.py [--sizes 1000,10000,100000] [--small-books 200]
+    python benchmarks/bench_tenants.py --database-url postgresql://user:pw@localhost/mylibrary_bench \\
+        --partitions 16
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "backend"))
+
+# Read scenarios whose work should only depend on the small library
+DEFAULT_SCENARIOS = "list,search,filter_tag,facets,similar,tag_suggest,stats,export"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///" + os.path.join(tempfile.gettempdir(), "mylibrary-tenants.db"))
+    parser.add_argument("--sizes", default="1000,10000,100000", help="sizes of the big library")
+    parser.add_argument("--small-books", type=int, default=200)
+    parser.add_argument("--partitions", type=int, default=0, help="hash partitions (PostgreSQL only)")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--max-slowdown", type=float, default=1.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="mylibrary-tenants-uploads-"))
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("SIMILARITY_REFRESH_DELAY", "-1")
+    os.environ.setdefault("METADATA_REFRESH_INTERVAL", "0")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+
+    import generator
+    from database import engine
+    from main import app
+    from run import measure
+    from scenarios import SCENARIOS, Context
+
+    logging.getLogger("covers").setLevel(logging.ERROR)
+    if args.partitions and engine.dialect.name != "postgresql":
+        parser.error("--partitions needs a PostgreSQL --database-url")
+
+    names = args.scenarios.split(",")
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    results = []
+    for size in sizes:
+        dataset = generator.generate(engine, seed=args.seed, max_books=size, sizes=[args.small_books, size])
+        if args.partitions:
+            from partitioning import rebuild
+            with engine.begin() as conn:
+                rebuild(conn, args.partitions)
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text("ANALYZE"))
+        small = dataset.libraries[0]
+        with TestClient(app) as client:
+            ctx = Context(client=client, dataset=dataset, import_rows=0)
+            for name in names:
+                result = measure(SCENARIOS[name], ctx, small, args.repeat, args.warmup)
+                result["big_books"] = size
+                results.append(result)
+                print(f"{name:<12} big {size:>7}  small p50 {result['p50_ms']:8.2f} ms", file=sys.stderr)
+
+    over_budget = []
+    for name in names:
+        first, last = (
+            next(r["p50_ms"] for r in results if r["scenario"] == name and r["big_books"] == size)
+            for size in (sizes[0], sizes[-1])
+        )
+        if last > first * args.max_slowdown:
+            over_budget.append(f"{name}: {first:.2f} ms -> {last:.2f} ms")
+
+    if args.json:
+        print(json.dumps({
+            "dialect": engine.dialect.name, "partitions": args.partitions,
+            "small_books": args.small_books, "results": results,
+        }))
+    else:
+        print(f"Small library ({args.small_books} books) p50 on {engine.dialect.name}"
+              f"{f', {args.partitions} partitions' if args.partitions else ''}, by big library size")
+        print(f"  {'scenario':<12}" + "".join(f"{size:>12}" for size in sizes))
+        for name in names:
+            row = [r["p50_ms"] for r in results if r["scenario"] == name]
+            print(f"  {name:<12}" + "".join(f"{p50:>9.2f} ms" for p50 in row))
+
+    if over_budget:
+        print(f"Slower than {args.max_slowdown}x with the big library grown:", file=sys.stderr)
+        for line in over_budget:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
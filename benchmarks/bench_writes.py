@@ -0,0 +1,92 @@
+"""
+Statement budget for the write endpoints.
+
+Sends each write request once against a fresh database and counts the SQL
+statements it executes, including authentication, the flush listeners
+(sync.py, duplicates.py, tag_counts.py) and serializing the response. Exits
+with status 1 if an endpoint goes over its budget, so a reintroduced
+commit-then-refresh or a lazy load during serialization shows up in CI.
+
+Usage (from the repository root):
+    python benchmarks/bench_writes.py [--database-url sqlite:////tmp/mylibrary-writes.db] [--verbose]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "backend"))
+
+# name, method, path, JSON body, statement budget
+REQUESTS = [
+    ("register", "POST", "/api/auth/register",
+     {"email": "writer@example.com", "username": "writer", "password": "benchmark-password"}, 3),
+    ("update_profile", "PATCH", "/api/users/me", {"bio": "Reads a lot"}, 2),
+    ("create_location", "POST", "/api/locations/", {"name": "Regal"}, 2),
+    ("create_book", "POST", "/api/books/",
+     {"title": "Der Zauberberg", "authors": '["Thomas Mann"]', "isbn": "9780306406157",
+      "location_id": 1, "tag_names": ["Klassiker", "Roman"]}, 12),
+    ("create_book_plain", "POST", "/api/books/", {"title": "Notizen", "authors": '["Unbekannt"]'}, 5),
+    ("update_book", "PATCH", "/api/books/1", {"notes": "Signiert", "is_pinned": True}, 4),
+    ("update_book_tags", "PATCH", "/api/books/1", {"tag_names": ["Roman", "Lieblingsbuch"]}, 10),
+    ("delete_book", "DELETE", "/api/books/2", None, 6),
+    ("delete_location", "DELETE", "/api/locations/1", None, 6),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///" + os.path.join(tempfile.gettempdir(), "mylibrary-writes.db"))
+    parser.add_argument("--verbose", action="store_true", help="print the statements")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="mylibrary-writes-uploads-"))
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("SIMILARITY_REFRESH_DELAY", "-1")
+    os.environ.setdefault("OPENLIBRARY_OFFLINE", "1")
+    os.environ.setdefault("METADATA_REFRESH_INTERVAL", "0")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from auth import create_access_token
+    from database import Base, engine
+    from main import app
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *rest: statements.append(" ".join(statement.split())))
+
+    over = 0
+    headers = {}
+    print(f"{'endpoint':<18} {'status':>6} {'statements':>10} {'budget':>6}")
+    with TestClient(app) as client:
+        for name, method, path, body, budget in REQUESTS:
+            statements.clear()
+            response = client.request(method, path, json=body, headers=headers)
+            count = len(statements)
+            flag = ""
+            if response.status_code >= 400:
+                flag = f"  FAILED {response.text[:200]}"
+                over += 1
+            elif count > budget:
+                flag = "  OVER BUDGET"
+                over += 1
+            print(f"{name:<18} {response.status_code:>6} {count:>10} {budget:>6}{flag}")
+            if args.verbose or flag:
+                for statement in statements:
+                    print(f"    {statement[:160]}")
+            if name == "register":
+                token = create_access_token({"sub": str(response.json()["id"])})
+                headers = {"Authorization": f"Bearer {token}"}
+
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Compare two benchmark result files written by run.py.
+
+Usage:
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 0.15]
+
+Prints the p50 change per scenario and tier and exits with status 1 if any
+scenario got slower by more than the threshold (default 15%).
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report["meta"], {(r["scenario"], r["tier"]): r for r in report["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    base_meta, baseline = load(args.baseline)
+    cand_meta, candidate = load(args.candidate)
+    if (base_meta["dialect"], base_meta["profile"]) != (cand_meta["dialect"], cand_meta["profile"]):
+        print("warning: comparing different dialects or profiles", file=sys.stderr)
+
+    regressions = 0
+    print(f"{'scenario':<14} {'tier':<7} {'base p50':>10} {'cand p50':>10} {'change':>8}")
+    for key in sorted(set(baseline) & set(candidate), key=lambda k: (k[0], k[1] or "")):
+        before, after = baseline[key]["p50_ms"], candidate[key]["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key[0]:<14} {key[1] or '-':<7} {before:10.2f} {after:10.2f} {change:+8.1%}{flag}")
+
+    for key in sorted(set(baseline) ^ set(candidate), key=lambda k: (k[0], k[1] or "")):
+        print(f"{key[0]:<14} {key[1] or '-':<7} only in {'baseline' if key in baseline else 'candidate'}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Seeded synthetic library generator.
+
+Library sizes follow a Pareto distribution between --min-books and
+--max-books, so most users have a few hundred books and a few have huge
+libraries (the largest user always gets --max-books). Authors, tags and
+locations are drawn with Zipf-like skew from fixed pools, which gives the
+long-tailed GROUP BY results the stats endpoints see in production.
+Most books link to a shared edition drawn with the same skew, so popular
+ISBNs are owned by many users; the rest carry their own metadata.
+
+Rows are bulk-inserted with explicit ids through SQLAlchemy Core, so the same
+seed produces the same database on SQLite and PostgreSQL.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import json
+import random
+
+from sqlalchemy import text
+
+from database import Base
+from models import User, Book, Tag, Location, Edition, book_tags
+from tag_counts import recount
+
+WORDS = (
+    "Night Garden River Shadow Empire Silent Winter House Glass Stone Fire "
+    "Letters Island Last City Memory Light Secret Kingdom Road Forest Sea "
+    "Summer Iron Song Crown Dream Storm Clock Mountain Bridge Dark Golden "
+    "Lost Northern Hidden Second Burning Paper Wolf Orchard Harbor Tower"
+).split()
+FIRST_NAMES = (
+    "Anna Ben Clara David Elena Felix Greta Hans Ida Jonas Karin Lukas Marie "
+    "Nora Oskar Paula Quentin Rosa Stefan Tilda Ulrich Vera Walter Yara Zoe"
+).split()
+LAST_NAMES = (
+    "Adler Becker Claes Dietrich Eco Fontane Grass Hesse Ibsen Jelinek Kafka "
+    "Lenz Mann Nabokov Orwell Pratchett Quinn Rilke Schiller Tolkien Undset "
+    "Vonnegut Woolf Xu Yeats Zweig"
+).split()
+TAG_ROOTS = (
+    "roman krimi fantasy sci-fi sachbuch biografie geschichte lyrik klassiker "
+    "thriller kinderbuch reise kochen philosophie kunst wissenschaft comic "
+    "horror humor politik"
+).split()
+LOCATION_NAMES = (
+    "Wohnzimmer Regal", "Arbeitszimmer", "Schlafzimmer", "Keller Karton",
+    "Flur", "Dachboden", "Büro", "Ferienhaus", "Kinderzimmer", "Küche",
+)
+CONDITIONS = ("new", "very_good", "good", "acceptable", None)
+
+METADATA_COLUMNS = ("title", "authors", "cover_url", "publisher", "published_year", "page_count", "description")
+
+BATCH_SIZE = 5000
+PASSWORD = "benchmark-password"
+
+
+@dataclass
+class GeneratedLibrary:
+    user_id: int
+    username: str
+    book_count: int
+    is_public: bool
+
+
+@dataclass
+class GeneratedDataset:
+    seed: int
+    libraries: List[GeneratedLibrary] = field(default_factory=list)
+    tag_names: List[str] = field(default_factory=list)
+    author_names: List[str] = field(default_factory=list)
+
+    @property
+    def total_books(self) -> int:
+        return sum(lib.book_count for lib in self.libraries)
+
+    def tiers(self, public_only: bool = False) -> Dict[str, GeneratedLibrary]:
+        """Representative libraries: smallest, median and largest"""
+        ordered = sorted(
+            (lib for lib in self.libraries if lib.is_public or not public_only),
+            key=lambda lib: lib.book_count
+        )
+        return {
+            "small": ordered[0],
+            "median": ordered[len(ordered) // 2],
+            "huge": ordered[-1],
+        }
+
+
+def isbn13(n: int) -> str:
+    """Deterministic, checksum-valid ISBN-13 for a running number"""
+    body = f"978{n % 10**9:09d}"
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+def _zipf_index(rng: random.Random, size: int, skew: float = 1.2) -> int:
+    """Index into a pool of `size` with a heavy head"""
+    return min(int(rng.paretovariate(skew)) - 1, size - 1)
+
+
+def _edition_row(rng: random.Random, dataset: GeneratedDataset, edition_id: int, now) -> dict:
+    authors = [
+        dataset.author_names[_zipf_index(rng, len(dataset.author_names))]
+        for _ in range(rng.choice((1, 1, 1, 2, 3)))
+    ]
+    return {
+        "id": edition_id,
+        "isbn": isbn13(edition_id),
+        "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))),
+        "authors": json.dumps(authors),
+        "cover_url": f"https://covers.openlibrary.org/b/id/{edition_id}-L.jpg" if rng.random() < 0.7 else None,
+        "publisher": rng.choice(LAST_NAMES) + " Verlag",
+        "published_year": rng.randint(1900, 2025),
+        "page_count": rng.randint(40, 1200),
+        "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 300))) or None,
+        "created_at": now,
+    }
+
+
+def _pick_edition(rng: random.Random, edition_count: int, owned: set) -> int:
+    """Popular editions first; a user owns each edition at most once"""
+    edition_id = _zipf_index(rng, edition_count, 1.1) + 1
+    while edition_id in owned:
+        edition_id = rng.randrange(edition_count) + 1
+    owned.add(edition_id)
+    return edition_id
+
+
+def library_sizes(rng: random.Random, users: int, min_books: int, max_books: int) -> List[int]:
+    sizes = [min(max_books, int(min_books * rng.paretovariate(1.16))) for _ in range(users)]
+    sizes[rng.randrange(users)] = max_books
+    return sizes
+
+
+def load(engine) -> GeneratedDataset:
+    """Describe a previously generated database without regenerating it"""
+    from sqlalchemy import func
+    from sqlalchemy.orm import Session
+
+    dataset = GeneratedDataset(seed=-1)
+    with Session(engine) as db:
+        counts = dict(db.query(Book.user_id, func.count(Book.id)).group_by(Book.user_id).all())
+        for user in db.query(User).filter(User.username.like("bench%")).order_by(User.id):
+            dataset.libraries.append(GeneratedLibrary(
+                user.id, user.username, counts.get(user.id, 0), bool(user.is_library_public)
+            ))
+        dataset.tag_names = [name for (name,) in db.query(Tag.name).order_by(Tag.id)]
+        authors = db.query(Edition.authors).filter(Edition.authors.isnot(None)).limit(1).scalar()
+        dataset.author_names = json.loads(authors) if authors else ["Unknown"]
+    return dataset
+
+
+def generate(engine, seed: int = 42, users: int = 20, min_books: int = 100,
+             max_books: int = 20000, reset: bool = True,
+             sizes: Optional[List[int]] = None) -> GeneratedDataset:
+    """Create the schema and fill it with a reproducible synthetic dataset (sizes: fixed library sizes)"""
+    from auth import get_password_hash
+
+    rng = random.Random(seed)
+    if reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    dataset = GeneratedDataset(seed=seed)
+    dataset.author_names = [
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(5000)
+    ]
+    dataset.tag_names = [
+        f"{root}-{i}" if i else root
+        for i in range(10) for root in TAG_ROOTS
+    ]
+    hashed_password = get_password_hash(PASSWORD)
+    now = datetime.now(timezone.utc)
+    edition_count = 2 * max_books
+
+    with engine.begin() as conn:
+        conn.execute(Tag.__table__.insert(), [
+            {"id": i + 1, "name": name, "created_at": now}
+            for i, name in enumerate(dataset.tag_names)
+        ])
+        for start in range(0, edition_count, BATCH_SIZE):
+            conn.execute(Edition.__table__.insert(), [
+                _edition_row(rng, dataset, edition_id, now)
+                for edition_id in range(start + 1, min(start + BATCH_SIZE, edition_count) + 1)
+            ])
+
+        if sizes is None:
+            sizes = library_sizes(rng, users, min_books, max_books)
+        book_id = 0
+        location_id = 0
+        for index, size in enumerate(sizes):
+            user_id = index + 1
+            username = f"bench{user_id:04d}"
+            # The largest library is always public so the public scenarios hit it
+            is_public = size == max_books or rng.random() < 0.3
+            conn.execute(User.__table__.insert(), [{
+                "id": user_id,
+                "email": f"{username}@example.com",
+                "username": username,
+                "hashed_password": hashed_password,
+                "display_name": username,
+                "is_library_public": is_public,
+                "show_tags_public": True,
+                "show_notes_public": False,
+                "show_condition_public": True,
+                "change_seq": size,
+                "created_at": now,
+            }])
+            dataset.libraries.append(GeneratedLibrary(user_id, username, size, is_public))
+
+            location_ids = []
+            for name in rng.sample(LOCATION_NAMES, rng.randint(1, len(LOCATION_NAMES))):
+                location_id += 1
+                location_ids.append(location_id)
+                conn.execute(Location.__table__.insert(), [{
+                    "id": location_id, "user_id": user_id, "name": name, "created_at": now,
+                }])
+
+            books, links, owned = [], [], set()
+            for position in range(size):
+                book_id += 1
+                edition_id = _pick_edition(rng, edition_count, owned) if rng.random() < 0.9 else None
+                if edition_id is not None:
+                    # Metadata comes from the shared edition
+                    book = {"isbn": isbn13(edition_id), "isbn13": isbn13(edition_id), "edition_id": edition_id}
+                    book.update({name: None for name in METADATA_COLUMNS})
+                else:
+                    book = _edition_row(rng, dataset, book_id, now)
+                    book.update(isbn=None, isbn13=None, edition_id=None)
+                    del book["id"]
+                books.append({
+                    **book,
+                    "id": book_id,
+                    "user_id": user_id,
+                    "location_id": location_ids[_zipf_index(rng, len(location_ids))] if rng.random() < 0.8 else None,
+                    "condition": rng.choice(CONDITIONS),
+                    "notes": "Signiert." if rng.random() < 0.05 else None,
+                    "is_pinned": rng.random() < 0.01,
+                    "show_in_public": rng.random() < 0.95,
+                    "created_at": now - timedelta(minutes=rng.randint(0, 5 * 365 * 24 * 60)),
+                    "change_seq": position + 1,
+                    # As if looked up when added
+                    "metadata_fetched_at": now if edition_id is not None else None,
+                })
+                tag_ids = {_zipf_index(rng, len(dataset.tag_names), 1.05) + 1 for _ in range(rng.randint(0, 5))}
+                links.extend({"book_id": book_id, "tag_id": tag_id, "user_id": user_id} for tag_id in tag_ids)
+
+                if len(books) >= BATCH_SIZE:
+                    conn.execute(Book.__table__.insert(), books)
+                    books = []
+            if books:
+                conn.execute(Book.__table__.insert(), books)
+            for start in range(0, len(links), BATCH_SIZE):
+                conn.execute(book_tags.insert(), links[start:start + BATCH_SIZE])
+
+        # Tag usage counts are kept by a flush listener, which the bulk inserts bypass
+        recount(conn)
+
+        if engine.dialect.name == "postgresql":
+            for table in ("users", "locations", "tags", "editions", "books"):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                ))
+
+    # The bulk inserts bypass the ORM listeners that keep this index current
+    from sqlalchemy.orm import Session
+    from similarity import refresh_user
+    with Session(engine) as db:
+        for library in dataset.libraries:
+            refresh_user(db, library.user_id)
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("ANALYZE"))
+
+    return dataset
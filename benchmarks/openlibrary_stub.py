@@ -0,0 +1,141 @@
+"""
+Local stand-in for the Open Library API.
+
+Answers /isbn/<isbn>.json, /authors/<key>.json and /search.json with
+deterministic data derived from the request, after an optional fixed latency,
+so import scenarios measure our code rather than the network. With
+redirect=True a known ISBN is answered like openlibrary.org does, with a 302
+to its edition at /books/<key>.json.
+
+Faults can be injected for resilience tests: a share of requests answers
+503 (or 429 with Retry-After), and another share is delayed by slow_ms.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import json
+import random
+import threading
+import time
+
+
+class _Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    slow_rate = 0.0
+    slow = 0.0
+    redirect = False
+    rng = random.Random(0)
+    lock = threading.Lock()
+    requests = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_edition(self, isbn):
+        self._send_json(200, {
+            "title": f"Stub Book {isbn}",
+            "authors": [{"key": f"/authors/OL{int(isbn[-4:]) % 500}A"}],
+            "publishers": ["Stub Press"],
+            "publish_date": "2001",
+            "number_of_pages": 320,
+            "covers": [int(isbn[-6:])],
+            "description": {"value": "A stub description. " * 10},
+        })
+
+    def _fault(self) -> bool:
+        """Apply injected faults; True if the request was answered with an error"""
+        with self.lock:
+            type(self).requests += 1
+            roll, slow_roll = self.rng.random(), self.rng.random()
+        if slow_roll < self.slow_rate:
+            time.sleep(self.slow)
+        if roll < self.error_rate:
+            if roll < self.error_rate / 4:
+                body = b'{"error": "rate limited"}'
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+            else:
+                body = b'{"error": "unavailable"}'
+                self.send_response(503)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return True
+        return False
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._fault():
+            return
+        path = urlparse(self.path).path
+
+        if path.startswith("/isbn/") and path.endswith(".json"):
+            isbn = path[len("/isbn/"):-len(".json")]
+            # Every tenth ISBN is unknown, which exercises the search fallback
+            if isbn.endswith("0"):
+                self._send_json(404, {"error": "notfound"})
+                return
+            if self.redirect:
+                self.send_response(302)
+                self.send_header("Location", f"/books/OL{isbn}M.json")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_edition(isbn)
+        elif path.startswith("/books/OL") and path.endswith("M.json"):
+            self._send_edition(path[len("/books/OL"):-len("M.json")])
+        elif path.startswith("/authors/") and path.endswith(".json"):
+            key = path[len("/authors/"):-len(".json")]
+            self._send_json(200, {"name": f"Author {key}"})
+        elif path == "/search.json":
+            self._send_json(200, {"docs": []})
+        else:
+            self._send_json(404, {"error": "notfound"})
+
+
+class OpenLibraryStub:
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_ms: float = 0.0, redirect: bool = False, seed: int = 0):
+        handler = type("Handler", (_Handler,), {
+            "latency": latency_ms / 1000,
+            "error_rate": error_rate,
+            "slow_rate": slow_rate,
+            "slow": slow_ms / 1000,
+            "redirect": redirect,
+            "rng": random.Random(seed),
+            "lock": threading.Lock(),
+        })
+        self.handler = handler
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def requests(self) -> int:
+        return self.handler.requests
+
+    def set_faults(self, error_rate: float = 0.0, slow_rate: float = 0.0, slow_ms: float = 0.0):
+        self.handler.error_rate = error_rate
+        self.handler.slow_rate = slow_rate
+        self.handler.slow = slow_ms / 1000
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
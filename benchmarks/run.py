@@ -0,0 +1,168 @@
+"""
+Run the benchmark scenarios and write machine-readable results.
+
+Usage (from the repository root):
+    python benchmarks/run.py --database-url sqlite:////tmp/mylibrary-bench.db --profile ci
+    python benchmarks/run.py --database-url postgresql://user:pw@localhost/mylibrary_bench \\
+        --profile default --output results/postgres.json
+
+The database is dropped and regenerated from --seed unless --reuse is given.
+Compare two result files with benchmarks/compare.py.
+"""
+from datetime import datetime, timezone
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+
+PROFILES = {
+    # users, min_books, max_books
+    "ci": (5, 100, 2000),
+    "default": (50, 100, 20000),
+    "large": (200, 100, 100000),
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(scenario, ctx, library, repeat, warmup):
+    for _ in range(warmup):
+        scenario.run(ctx, library)
+    timings, sizes, statuses = [], [], set()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = scenario.run(ctx, library)
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(response.num_bytes_downloaded)
+        statuses.add(response.status_code)
+    return {
+        "scenario": scenario.name,
+        "tier": None,
+        "books": library.book_count if library else 0,
+        "n": repeat,
+        "status": sorted(statuses),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "min_ms": round(min(timings), 3),
+        "wire_bytes": int(statistics.median(sizes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///" + os.path.join(tempfile.gettempdir(), "mylibrary-bench.db"))
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="ci")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reuse", action="store_true", help="benchmark an already generated database")
+    parser.add_argument("--scenarios", default="all", help="comma-separated names, see scenarios.py")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--import-rows", type=int, default=100)
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="simulated Open Library latency")
+    parser.add_argument("--output", default=None, help="result file (default: stdout)")
+    args = parser.parse_args()
+
+    # The backend reads its configuration at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="mylibrary-bench-uploads-"))
+    os.environ.setdefault("STATIC_DIR", os.path.join(REPO_DIR, "frontend"))
+    # Every scenario comes from one client IP; the limiter would turn them into 429s
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    # Background index rebuilds after the import scenario would skew later timings
+    os.environ.setdefault("SIMILARITY_REFRESH_DELAY", "-1")
+    os.environ.setdefault("METADATA_REFRESH_INTERVAL", "0")
+
+    from fastapi.testclient import TestClient
+
+    import generator
+    from database import engine
+    from main import app
+    from openlibrary_stub import OpenLibraryStub
+    from scenarios import SCENARIOS, Context
+    from services import openlibrary_service
+
+    # The stub has no cover images; failed cover downloads are expected
+    logging.getLogger("covers").setLevel(logging.ERROR)
+
+    users, min_books, max_books = PROFILES[args.profile]
+    started = time.perf_counter()
+    if args.reuse:
+        dataset = generator.load(engine)
+    else:
+        dataset = generator.generate(engine, seed=args.seed, users=users,
+                                     min_books=min_books, max_books=max_books)
+    generate_seconds = time.perf_counter() - started
+    print(f"{len(dataset.libraries)} libraries, {dataset.total_books} books "
+          f"({generate_seconds:.1f}s)", file=sys.stderr)
+
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    results = []
+    with OpenLibraryStub(latency_ms=args.stub_latency_ms) as stub, TestClient(app) as client:
+        openlibrary_service.BASE_URL = stub.url
+        ctx = Context(client=client, dataset=dataset, import_rows=args.import_rows)
+        for name in names:
+            scenario = SCENARIOS[name]
+            if not scenario.per_tier:
+                result = measure(scenario, ctx, None, args.repeat, args.warmup)
+                results.append(result)
+                print(f"{name:<14} {'-':<7} p50 {result['p50_ms']:9.2f} ms", file=sys.stderr)
+                continue
+            for tier, library in dataset.tiers(public_only=scenario.public).items():
+                result = measure(scenario, ctx, library, args.repeat, args.warmup)
+                result["tier"] = tier
+                results.append(result)
+                print(f"{name:<14} {tier:<7} p50 {result['p50_ms']:9.2f} ms  "
+                      f"({library.book_count} books)", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "dialect": engine.dialect.name,
+            "profile": args.profile,
+            "seed": args.seed,
+            "libraries": len(dataset.libraries),
+            "total_books": dataset.total_books,
+            "repeat": args.repeat,
+            "import_rows": args.import_rows,
+            "stub_latency_ms": args.stub_latency_ms,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
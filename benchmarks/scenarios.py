@@ -0,0 +1,175 @@
+"""
+Benchmark scenarios.
+
+Each scenario issues one HTTP request through the in-process ASGI client.
+Scenarios with per_tier=True run once per representative library size
+(small, median, huge); the rest run against a fresh user.
+"""
+from dataclasses import dataclass, field
+from typing import Callable
+import io
+import itertools
+import uuid
+
+from generator import isbn13
+
+_fresh_users = itertools.count(1)
+# Keeps fresh usernames unique when --reuse runs against an earlier database
+_run_id = uuid.uuid4().hex[:8]
+
+
+@dataclass
+class Context:
+    client: object
+    dataset: object
+    import_rows: int
+    _book_ids: dict = field(default_factory=dict)
+    _exports: dict = field(default_factory=dict)
+
+    def headers(self, library) -> dict:
+        from auth import create_access_token
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(library.user_id)})}"}
+
+    def search_term(self) -> str:
+        return self.dataset.author_names[0].split()[-1]
+
+    def popular_tag(self) -> str:
+        return self.dataset.tag_names[0]
+
+    def book_id(self, library) -> int:
+        """The library's first book, looked up once"""
+        if library.user_id not in self._book_ids:
+            from sqlalchemy import func
+            from database import SessionLocal
+            from models import Book
+            with SessionLocal() as db:
+                self._book_ids[library.user_id] = db.query(func.min(Book.id)).filter(
+                    Book.user_id == library.user_id
+                ).scalar()
+        return self._book_ids[library.user_id]
+
+    def export(self, library) -> bytes:
+        """The library's JSON Lines export, fetched once"""
+        if library.user_id not in self._exports:
+            self._exports[library.user_id] = self.client.get(
+                "/api/books/export/jsonl", headers=self.headers(library)
+            ).content
+        return self._exports[library.user_id]
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable
+    per_tier: bool = True
+    # Scenarios that need a public library skip private tiers
+    public: bool = False
+
+
+def list_books(ctx, library):
+    return ctx.client.get("/api/books/?limit=100", headers=ctx.headers(library))
+
+
+def list_books_full(ctx, library):
+    return ctx.client.get("/api/books/?limit=100&fields=full", headers=ctx.headers(library))
+
+
+def search_books(ctx, library):
+    return ctx.client.get(f"/api/books/?search={ctx.search_term()}&limit=100", headers=ctx.headers(library))
+
+
+def filter_by_tag(ctx, library):
+    return ctx.client.get(f"/api/books/?tag={ctx.popular_tag()}&limit=100", headers=ctx.headers(library))
+
+
+def list_with_facets(ctx, library):
+    return ctx.client.get(
+        f"/api/books/?search={ctx.search_term()}&limit=100&facets=tag,author,location,condition",
+        headers=ctx.headers(library)
+    )
+
+
+def suggest_tags(ctx, library):
+    return ctx.client.get(f"/api/tags/suggest?prefix={ctx.popular_tag()[:2]}", headers=ctx.headers(library))
+
+
+def similar_books(ctx, library):
+    return ctx.client.get(f"/api/books/{ctx.book_id(library)}/similar", headers=ctx.headers(library))
+
+
+def stats(ctx, library):
+    return ctx.client.get("/api/stats/", headers=ctx.headers(library))
+
+
+def public_books(ctx, library):
+    return ctx.client.get(f"/api/public/library/{library.username}/books?limit=100")
+
+
+def public_stats(ctx, library):
+    return ctx.client.get(f"/api/public/library/{library.username}/stats")
+
+
+def export_csv(ctx, library):
+    return ctx.client.get("/api/books/export/csv", headers=ctx.headers(library))
+
+
+def export_jsonl(ctx, library):
+    return ctx.client.get("/api/books/export/jsonl", headers=ctx.headers(library))
+
+
+def export_parquet(ctx, library):
+    return ctx.client.get("/api/books/export/parquet", headers=ctx.headers(library))
+
+
+def restore_jsonl(ctx, library):
+    """The library's export imported into a fresh user"""
+    from services import openlibrary_service
+    # Uncached covers are fetched after the import; from the stub, not openlibrary.org
+    content = ctx.export(library).replace(b"https://covers.openlibrary.org", openlibrary_service.BASE_URL.encode())
+    return ctx.client.post(
+        "/api/books/import/jsonl",
+        files={"file": ("library.jsonl", io.BytesIO(content), "application/x-ndjson")},
+        headers=_fresh_user_headers(ctx),
+    )
+
+
+def _fresh_user_headers(ctx) -> dict:
+    n = next(_fresh_users)
+    username = f"import{_run_id}{n:05d}"
+    response = ctx.client.post("/api/auth/register", json={
+        "email": f"{username}@example.com", "username": username, "password": "benchmark-password",
+    })
+    from auth import create_access_token
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(response.json()['id'])})}"}
+
+
+def import_csv(ctx, library=None):
+    headers = _fresh_user_headers(ctx)
+    rows = "\n".join(isbn13(10**8 + i) for i in range(ctx.import_rows))
+    content = f"ISBN\n{rows}\n".encode()
+    return ctx.client.post(
+        "/api/books/import/csv",
+        files={"file": ("import.csv", io.BytesIO(content), "text/csv")},
+        headers=headers,
+    )
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario("list", list_books),
+        Scenario("list_full", list_books_full),
+        Scenario("search", search_books),
+        Scenario("filter_tag", filter_by_tag),
+        Scenario("facets", list_with_facets),
+        Scenario("similar", similar_books),
+        Scenario("tag_suggest", suggest_tags),
+        Scenario("stats", stats),
+        Scenario("public_books", public_books, public=True),
+        Scenario("public_stats", public_stats, public=True),
+        Scenario("export", export_csv),
+        Scenario("export_jsonl", export_jsonl),
+        Scenario("export_parquet", export_parquet),
+        Scenario("restore_jsonl", restore_jsonl),
+        Scenario("import", import_csv, per_tier=False),
+    )
+}
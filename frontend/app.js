@@ -49,7 +49,11 @@ async function apiCall(endpoint, options = {}) {
         
         if (!response.ok) {
             const error = await response.json().catch(() => ({detail: 'Unbekannter Fehler'}));
-            throw new Error(error.detail || 'Request fehlgeschlagen');
+            const message = typeof error.detail === 'object' ? error.detail.message : error.detail;
+            const failure = new Error(message || 'Request fehlgeschlagen');
+            failure.status = response.status;
+            failure.detail = error.detail;
+            throw failure;
         }
         
         return await response.json().catch(() => null);
@@ -64,6 +68,7 @@ async function apiCall(endpoint, options = {}) {
 function logout() {
     authToken = null;
     currentUser = null;
+    resetBookSync();
     localStorage.removeItem('authToken');
     showLoginView();
 }
@@ -247,12 +252,37 @@ async function handleRegister() {
 let currentBooks = [];
 let currentLocations = [];
 
+// Local copy of the library, kept current through /books/changes
+const SYNC_FIELDS = 'id,isbn,title,authors,cover_url,cover_thumb_url,is_pinned,location_id,tags,created_at';
+let bookStore = new Map();
+let syncToken = 0;
+
+function resetBookSync() {
+    bookStore = new Map();
+    syncToken = 0;
+}
+
+async function syncBooks() {
+    let hasMore = true;
+    while (hasMore) {
+        const delta = await apiCall(`/books/changes?since=${syncToken}&fields=${SYNC_FIELDS}`);
+        delta.changed.forEach(book => bookStore.set(book.id, book));
+        delta.deleted.forEach(id => bookStore.delete(id));
+        syncToken = delta.next_token;
+        hasMore = delta.has_more;
+    }
+    // Pinned first, then newest
+    return [...bookStore.values()].sort((a, b) =>
+        (b.is_pinned - a.is_pinned) || b.created_at.localeCompare(a.created_at)
+    );
+}
+
 async function renderLibraryView() {
     showLoading();
     const content = document.getElementById('mainContent');
     
     try {
-        currentBooks = await apiCall('/books/');
+        currentBooks = await syncBooks();
         currentLocations = await apiCall('/locations/');
         
         content.innerHTML = `
@@ -330,8 +360,8 @@ function renderBooks(books) {
         return `
             <div class="book-card bg-gray-800 rounded-lg overflow-hidden cursor-pointer" onclick="showBookDetails(${book.id})">
                 ${book.is_pinned ? '<div class="bg-yellow-500 text-xs px-2 py-1 text-center">⭐ Angepinnt</div>' : ''}
-                <img src="${book.cover_url || '/static/placeholder.png'}" 
-                    alt="${book.title}" 
+                <img src="${book.cover_thumb_url || book.cover_url || '/static/placeholder.png'}" 
+                    alt="${book.title}" loading="lazy"
                     class="w-full h-64 object-cover bg-gray-700">
                 <div class="p-4">
                     <h3 class="font-bold text-sm mb-1 truncate" title="${book.title}">${book.title}</h3>
@@ -451,7 +481,9 @@ function showAddBookModal() {
             <div>
                 <label class="block text-sm font-medium mb-2">Tags (mit Komma trennen)</label>
                 <input type="text" id="bookTags" placeholder="Krimi, Signiert, Erstausgabe"
+                    list="tagSuggestions" autocomplete="off" oninput="suggestTags(this)"
                     class="w-full px-4 py-2 bg-gray-700 rounded-lg focus:ring-2 focus:ring-blue-500 outline-none">
+                <datalist id="tagSuggestions"></datalist>
             </div>
             
             <div>
@@ -501,6 +533,32 @@ async function lookupISBN() {
     }
 }
 
+// Tag autocomplete: suggestions for the tag currently being typed
+let tagSuggestTimer = null;
+
+function suggestTags(input) {
+    clearTimeout(tagSuggestTimer);
+    tagSuggestTimer = setTimeout(async () => {
+        const parts = input.value.split(',');
+        const prefix = parts.pop().trim();
+        const typed = parts.map(t => t.trim()).filter(Boolean);
+        try {
+            const suggestions = await apiCall(`/tags/suggest?prefix=${encodeURIComponent(prefix)}`);
+            const list = document.getElementById('tagSuggestions');
+            list.replaceChildren(...suggestions
+                .filter(tag => !typed.includes(tag.name))
+                .map(tag => {
+                    const option = document.createElement('option');
+                    option.value = [...typed, tag.name].join(', ');
+                    option.label = `${tag.name} (${tag.count})`;
+                    return option;
+                }));
+        } catch (error) {
+            // Suggestions are optional
+        }
+    }, 150);
+}
+
 async function saveBook() {
     showLoading();
     try {
@@ -520,10 +578,21 @@ async function saveBook() {
             tag_names: tags
         };
         
-        await apiCall('/books/', {
-            method: 'POST',
-            body: JSON.stringify(bookData)
-        });
+        try {
+            await apiCall('/books/', {
+                method: 'POST',
+                body: JSON.stringify(bookData)
+            });
+        } catch (error) {
+            // Books without ISBN: the server reports near-duplicates
+            if (error.status !== 409) throw error;
+            const titles = error.detail.duplicates.map(d => `„${d.title}“`).join(', ');
+            if (!confirm(`Ähnliches Buch bereits vorhanden: ${titles}. Trotzdem hinzufügen?`)) return;
+            await apiCall('/books/?allow_duplicate=true', {
+                method: 'POST',
+                body: JSON.stringify(bookData)
+            });
+        }
         
         showToast('Buch hinzugefügt!', 'success');
         closeModal();
@@ -534,7 +603,8 @@ async function saveBook() {
 }
 
 async function showBookDetails(bookId) {
-    const book = currentBooks.find(b => b.id === bookId);
+    // List views only carry the card fields; load the full book for details
+    const book = await apiCall(`/books/${bookId}`);
     if (!book) return;
     
     const authors = book.authors ? JSON.parse(book.authors).join(', ') : 'Unbekannt';
@@ -743,13 +813,24 @@ async function handleCSVUpload(event) {
     document.getElementById('importProgress').classList.remove('hidden');
     
     try {
+        // Progress is streamed as server-sent events while the import runs
         const response = await fetch(API_BASE + '/books/import/csv', {
             method: 'POST',
-            headers: {'Authorization': `Bearer ${authToken}`},
+            headers: {
+                'Authorization': `Bearer ${authToken}`,
+                'Accept': 'text/event-stream'
+            },
             body: formData
         });
         
-        const result = await response.json();
+        if (!response.ok) throw new Error('Import fehlgeschlagen');
+        
+        let result;
+        if ((response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+            result = await readImportEvents(response, showImportProgress);
+        } else {
+            result = await response.json();
+        }
         
         document.getElementById('importResults').innerHTML = `
             <div class="bg-gray-700 rounded p-4">
@@ -767,6 +848,7 @@ async function handleCSVUpload(event) {
             </div>
         `;
         document.getElementById('importResults').classList.remove('hidden');
+        showImportProgress(result);
         
         showToast(`${result.successful} Bücher importiert!`, 'success');
         
@@ -780,6 +862,40 @@ async function handleCSVUpload(event) {
     }
 }
 
+function showImportProgress(progress) {
+    const percent = progress.total ? Math.round(progress.processed / progress.total * 100) : 100;
+    document.getElementById('progressBar').style.width = `${percent}%`;
+    document.getElementById('progressText').textContent =
+        `${progress.processed} / ${progress.total} verarbeitet (${progress.successful} importiert, ${progress.failed} Fehler)`;
+}
+
+async function readImportEvents(response, onProgress) {
+    // Minimal text/event-stream parser; resolves with the "done" payload
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) throw new Error('Import-Stream abgebrochen');
+        buffer += decoder.decode(value, {stream: true});
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let type = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event: ')) type = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (!data) continue;
+            const payload = JSON.parse(data);
+            if (type === 'done') return payload;
+            if (type === 'progress') onProgress(payload);
+        }
+    }
+}
+
 // ==================== LOCATIONS ====================
 
 function showAddLocationModal() {
@@ -925,8 +1041,8 @@ async function renderStatsView() {
                             return `
                                 <div class="flex items-center gap-3 cursor-pointer hover:bg-gray-700 p-2 rounded" 
                                     onclick="showBookDetails(${book.id})">
-                                    <img src="${book.cover_url || '/static/placeholder.png'}" 
-                                        class="w-12 h-16 object-cover rounded">
+                                    <img src="${book.cover_thumb_url ? book.cover_thumb_url.replace('/medium.webp', '/small.webp') : (book.cover_url || '/static/placeholder.png')}" 
+                                        loading="lazy" class="w-12 h-16 object-cover rounded">
                                     <div class="flex-1 min-w-0">
                                         <p class="font-medium truncate">${book.title}</p>
                                         <p class="text-sm text-gray-400 truncate">${authors}</p>